@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from app_branch.models import BranchModel
+from app_branch.models import BranchDeliveryZone, BranchModel
 
 
-admin.site.register(BranchModel)
\ No newline at end of file
+admin.site.register(BranchModel)
+admin.site.register(BranchDeliveryZone)
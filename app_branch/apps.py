@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AppBranchConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app_branch'
+
+    def ready(self):
+        from app_branch import signals  # noqa: F401
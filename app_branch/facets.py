@@ -0,0 +1,128 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+
+from app_branch.models import BranchCategoryCount, BranchModel
+from app_common.bulk import chunked, in_batch_size, insert_ignoring_conflicts
+from app_company.models import RestaurantCategoryCount
+from app_products.models import ProductsModel
+
+# Seconds a cached category count list lives. Changes delete it on commit; the timeout
+# only bounds how long a read racing with a change can keep serving the old counts.
+CATEGORY_COUNTS_TIMEOUT = 60
+
+# For each scope: the count model, its owner field and the lookup from a product to the owners listing it.
+SCOPES = {
+    'branch': (BranchCategoryCount, 'branch_id', 'restaurants__branch_products__branch_id'),
+    'restaurant': (RestaurantCategoryCount, 'restaurant_id', 'restaurants__restaurant_id'),
+}
+
+
+def counts_key(scope, owner_id):
+    return f'category-counts:{scope}:{owner_id}'
+
+
+def forget_counts(scope, owner_ids):
+    """
+    Drop the owners' cached category counts once the current transaction commits.
+    """
+    keys = [counts_key(scope, owner_id) for owner_id in set(owner_ids)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def get_category_counts(scope, owner_id):
+    """
+    Return [{"id", "name", "count"}] of the active categories with active products on the owner's menu, by name.
+    """
+    key = counts_key(scope, owner_id)
+    counts = cache.get(key)
+    if counts is None:
+        model, owner_field, _ = SCOPES[scope]
+        counts = [
+            {'id': category_id, 'name': name, 'count': count}
+            for category_id, name, count in model.objects.filter(
+                **{owner_field: owner_id}, count__gt=0, category__status=True,
+            ).order_by('category__name', 'category_id').values_list('category_id', 'category__name', 'count')
+        ]
+        cache.set(key, counts, CATEGORY_COUNTS_TIMEOUT)
+    return counts
+
+
+def refresh_counts(scope, owner_ids):
+    """
+    Recount the categories of the owners' menus, with one grouped query per batch, and store what changed.
+
+    Call it after changing which products a menu lists. The owners' count rows are
+    locked first, so a concurrent shift_counts() is either counted or applied on top.
+    """
+    model, owner_field, lookup = SCOPES[scope]
+    owner_ids = sorted(set(owner_ids))
+    with transaction.atomic(savepoint=False):
+        for chunk in chunked(owner_ids, in_batch_size()):
+            stored = {
+                (owner_id, category_id): (pk, count)
+                for pk, owner_id, category_id, count in model.objects.select_for_update().filter(
+                    **{f'{owner_field}__in': chunk}).values_list('pk', owner_field, 'category_id', 'count')
+            }
+            counted = dict(
+                ((owner_id, category_id), count)
+                for owner_id, category_id, count in ProductsModel.objects.filter(
+                    **{f'{lookup}__in': chunk}, status=True, is_deleted=False,
+                ).values_list(lookup, 'category_id').annotate(count=Count('id', distinct=True)).order_by()
+            )
+            insert_ignoring_conflicts(model, [
+                {owner_field: owner_id, 'category_id': category_id, 'count': count}
+                for (owner_id, category_id), count in counted.items() if (owner_id, category_id) not in stored
+            ])
+            model.objects.bulk_update([
+                model(pk=stored[key][0], count=count)
+                for key, count in counted.items() if key in stored and stored[key][1] != count
+            ], ['count'])
+            model.objects.filter(pk__in=[pk for key, (pk, _) in stored.items() if key not in counted]).delete()
+    forget_counts(scope, owner_ids)
+
+
+def refresh_restaurant_branch_counts(restaurant_id):
+    """
+    Recount the categories of every branch of the restaurant.
+    """
+    refresh_counts('branch', BranchModel.objects.filter(restaurant_id=restaurant_id).values_list('id', flat=True))
+
+
+def product_owners(product_id):
+    """
+    Return {scope: [owner ids]} of the branches and restaurants listing the product.
+    """
+    return {
+        scope: list(ProductsModel.objects.filter(pk=product_id, **{f'{lookup}__isnull': False}).values_list(
+            lookup, flat=True).distinct())
+        for scope, (_, _, lookup) in SCOPES.items()
+    }
+
+
+def shift_counts(owners, category_id, delta):
+    """
+    Add delta (+1 or -1) to the category's count of each owner in {scope: [owner ids]}.
+
+    This is how a product that starts or stops being counted, or moves to another category,
+    updates the counts: one or two statements per scope, whatever the size of the menus.
+    """
+    for scope, owner_ids in owners.items():
+        model, owner_field, _ = SCOPES[scope]
+        for chunk in chunked(sorted(set(owner_ids)), in_batch_size()):
+            rows = model.objects.filter(**{f'{owner_field}__in': chunk}, category_id=category_id)
+            if delta > 0:
+                insert_ignoring_conflicts(model, [{owner_field: owner_id} for owner_id in chunk], category_id=category_id)
+            else:
+                rows = rows.filter(count__gte=-delta)
+            rows.update(count=F('count') + delta)
+        forget_counts(scope, owner_ids)
+
+
+def forget_category_counts(category_id):
+    """
+    Drop the cached counts listing the category, whose name or status is part of them.
+    """
+    for scope, (model, owner_field, _) in SCOPES.items():
+        forget_counts(scope, model.objects.filter(category_id=category_id).values_list(owner_field, flat=True))
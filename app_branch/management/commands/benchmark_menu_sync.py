@@ -0,0 +1,74 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from app_branch.models import BranchModel, BranchProductsModel
+from app_branch.views import AddOrRemoveBranchProducts
+from app_company.models import RestaurantModel, RestaurantProductsModel
+from app_products.models import CategoryModel, ProductsModel
+from app_users.models import UserModel, UserRoleChoice
+
+
+class Command(BaseCommand):
+    """
+    Time setting a large branch menu through the view: from empty, with some churn, and unchanged.
+
+    A restaurant with --products products and one branch are created for the run and
+    deleted afterwards. Each step reports its time and query count, request parsing included.
+    """
+    help = "Benchmark the diff-based 'set menu' operation on a large branch menu."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10_000, help="Products on the restaurant's menu.")
+        parser.add_argument('--churn', type=float, default=0.1, help="Share of the menu swapped in the churn step.")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        restaurant_user = UserModel.objects.create(
+            username='benchmark-menu-restaurant', phone_number='benchmark-mr', role=UserRoleChoice.RESTAURANT)
+        branch_user = UserModel.objects.create(
+            username='benchmark-menu-branch', phone_number='benchmark-mb', role=UserRoleChoice.BRANCH)
+        category = CategoryModel.objects.create(name='benchmark-menu')
+        try:
+            restaurant = RestaurantModel.objects.create(user=restaurant_user, name='benchmark-menu', logo='logo.png')
+            branch = BranchModel.objects.create(
+                user=branch_user, name='benchmark-menu', address='Benchmark street', restaurant=restaurant)
+            products = ProductsModel.objects.bulk_create([
+                ProductsModel(name=f'Dish {n}', description='Dish', price=n % 50 + 1, category=category)
+                for n in range(options['products'] * 2)
+            ])
+            product_ids = [product.pk for product in products]
+            RestaurantProductsModel.objects.bulk_create([
+                RestaurantProductsModel(restaurant=restaurant, product_id=product_id) for product_id in product_ids])
+
+            menu = rng.sample(product_ids, options['products'])
+            outside = list(set(product_ids) - set(menu))
+            swapped = int(len(menu) * options['churn'])
+            churned = menu[swapped:] + rng.sample(outside, swapped)
+            for step, ids in (('from empty', menu), (f'churn {swapped} in/out', churned), ('unchanged', churned)):
+                self.set_menu(step, branch_user, ids)
+            if BranchProductsModel.objects.filter(branch=branch).count() != len(churned):
+                raise CommandError("The branch menu doesn't match the last set.")
+        finally:
+            ProductsModel.objects.filter(category=category).delete()
+            category.delete()
+            UserModel.objects.filter(pk__in=[restaurant_user.pk, branch_user.pk]).delete()
+
+    def set_menu(self, step, user, product_ids):
+        request = APIRequestFactory().post('/', {'product_ids': product_ids, 'action': 'set'}, format='json')
+        force_authenticate(request, user=user)
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = AddOrRemoveBranchProducts.as_view()(request)
+            elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            raise CommandError(f"Unexpected response: {response.status_code} {response.data}")
+        self.stdout.write(
+            f"{step}: {elapsed * 1e3:.0f}ms queries={len(queries)} "
+            f"added={response.data['added']} removed={response.data['removed']} unchanged={response.data['unchanged']}"
+        )
@@ -0,0 +1,154 @@
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import parse_etags
+
+from app_branch.models import BranchMenuDocument, BranchModel, BranchProductsModel
+from app_common.images import variant_urls
+from app_products.models import ProductImageModel, ProductsModel
+
+# Seconds a branch's cached (version, ETag) pointer lives. Changes delete it on commit; the
+# timeout only bounds how long a read racing with a change can keep serving the old menu.
+MENU_POINTER_TIMEOUT = 60
+
+# Seconds a cached menu document lives. Its key holds the version, so it never goes stale.
+MENU_DOCUMENT_TIMEOUT = 24 * 60 * 60
+
+
+def pointer_key(branch_id):
+    return f'branch-menu:{branch_id}'
+
+
+def document_key(branch_id, version):
+    return f'branch-menu:{branch_id}:{version}'
+
+
+def etag_matches(etag, if_none_match):
+    """
+    Tell whether an If-None-Match header value matches etag, using the weak comparison RFC 9110 asks for.
+    """
+    if not if_none_match:
+        return False
+    tags = parse_etags(if_none_match)
+    return '*' in tags or etag.removeprefix('W/') in (tag.removeprefix('W/') for tag in tags)
+
+
+def cached_etag(branch_id):
+    """
+    Return the ETag of the branch's current menu if the cache knows it, without querying the database.
+    """
+    pointer = cache.get(pointer_key(branch_id))
+    return pointer[1] if pointer is not None else None
+
+
+def build_menu_document(branch_id):
+    """
+    Return the menu document of an active branch, or None.
+
+    The document lists the branch's active products by category, each with its main image
+    (see ProductsModel.main_image) and that image's thumbnail URLs by format, once generated.
+    Costs two queries whatever the size of the menu.
+    """
+    branch = BranchModel.objects.filter(pk=branch_id, is_active=True, is_deleted=False).values(
+        'id', 'name', 'address').first()
+    if branch is None:
+        return None
+    products = ProductsModel.objects.filter(
+        restaurants__branch_products__branch_id=branch_id, status=True, is_deleted=False, category__status=True,
+    ).order_by('category__name', 'category_id', 'name', 'id').values(
+        'id', 'name', 'description', 'price', 'category_id', 'category__name',
+        'main_image__image', 'main_image__image_variants')
+
+    storage = ProductImageModel._meta.get_field('image').storage
+    categories = {}
+    seen = set()
+    for product in products:
+        if product['id'] in seen:
+            continue
+        seen.add(product['id'])
+        category = categories.get(product['category_id'])
+        if category is None:
+            category = categories[product['category_id']] = {
+                'id': product['category_id'], 'name': product['category__name'], 'products': [],
+            }
+        image = product['main_image__image']
+        category['products'].append({
+            'id': product['id'],
+            'name': product['name'],
+            'description': product['description'],
+            'price': str(product['price']),
+            'image': storage.url(image) if image else None,
+            'thumbnail': variant_urls(product['main_image__image_variants'], storage, 'thumb'),
+        })
+    return {'branch': branch, 'categories': list(categories.values())}
+
+
+def get_menu(branch_id):
+    """
+    Return the (ETag, encoded JSON document) of the branch's menu, or None if the branch isn't active.
+
+    The cache holds a (version, ETag) pointer per branch and the documents under versioned
+    keys. On a miss the stored document is read, and rebuilt only if a change made it stale;
+    a document built while the menu changed again is served but neither stored nor cached.
+    """
+    pointer = cache.get(pointer_key(branch_id))
+    if pointer is not None:
+        body = cache.get(document_key(branch_id, pointer[0]))
+        if body is not None:
+            return pointer[1], body
+
+    stored = BranchMenuDocument.objects.filter(branch_id=branch_id).values(
+        'version', 'built_version', 'etag', 'document').first()
+    if stored is not None and stored['built_version'] == stored['version']:
+        version, etag, body = stored['version'], stored['etag'], stored['document'].encode('utf-8')
+    else:
+        version = stored['version'] if stored is not None else 0
+        document = build_menu_document(branch_id)
+        if document is None:
+            return None
+        body = json.dumps(document, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        if not BranchMenuDocument.store(branch_id, version, etag, body.decode('utf-8')):
+            return etag, body
+
+    cache.set(document_key(branch_id, version), body, MENU_DOCUMENT_TIMEOUT)
+    cache.set(pointer_key(branch_id), (version, etag), MENU_POINTER_TIMEOUT)
+    return etag, body
+
+
+def forget_menus(branch_ids):
+    """
+    Drop the branches' cache pointers once the current transaction commits.
+    """
+    keys = [pointer_key(branch_id) for branch_id in set(branch_ids)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_menus(branch_ids):
+    """
+    Mark the branches' menus changed: their documents are rebuilt on the next read.
+
+    Call it in the transaction making the change, so a concurrent rebuild can't store the old menu.
+    """
+    branch_ids = set(branch_ids)
+    if not branch_ids:
+        return
+    BranchMenuDocument.mark_stale(branch_ids)
+    forget_menus(branch_ids)
+
+
+def invalidate_menus_selling(**filters):
+    """
+    Invalidate the menus of the branches selling a product matching the BranchProductsModel filters.
+    """
+    invalidate_menus(BranchProductsModel.objects.filter(**filters).values_list('branch_id', flat=True).distinct())
+
+
+def invalidate_restaurant_menus(restaurant_id):
+    """
+    Invalidate the menus of every branch of the restaurant.
+    """
+    invalidate_menus(BranchModel.objects.filter(restaurant_id=restaurant_id).values_list('id', flat=True))
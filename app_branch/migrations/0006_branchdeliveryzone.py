@@ -0,0 +1,35 @@
+# Generated by Django 5.1.3 on 2026-10-17 19:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_branch', '0005_branchmodel_latitude_branchmodel_longitude'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BranchDeliveryZone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+                ('is_deleted', models.BooleanField(default=False, verbose_name='Is Deleted')),
+                ('name', models.CharField(max_length=64, verbose_name='Name')),
+                ('polygon', models.JSONField(verbose_name='Polygon')),
+                ('min_latitude', models.FloatField(editable=False)),
+                ('min_longitude', models.FloatField(editable=False)),
+                ('max_latitude', models.FloatField(editable=False)),
+                ('max_longitude', models.FloatField(editable=False)),
+                ('is_active', models.BooleanField(default=True, verbose_name='Is Active')),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='delivery_zones', to='app_branch.branchmodel')),
+            ],
+            options={
+                'verbose_name': 'Branch Delivery Zone',
+                'verbose_name_plural': 'Branch Delivery Zones',
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.3 on 2026-10-17 19:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_branch', '0006_branchdeliveryzone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BranchMenuDocument',
+            fields=[
+                ('branch', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='menu_document', serialize=False, to='app_branch.branchmodel', verbose_name='Branch')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='Version')),
+                ('built_version', models.PositiveBigIntegerField(blank=True, null=True, verbose_name='Built Version')),
+                ('etag', models.CharField(blank=True, max_length=66, verbose_name='ETag')),
+                ('document', models.TextField(blank=True, verbose_name='Document')),
+                ('built_at', models.DateTimeField(auto_now=True, verbose_name='Built At')),
+            ],
+            options={
+                'verbose_name': 'Branch Menu Document',
+                'verbose_name_plural': 'Branch Menu Documents',
+            },
+        ),
+    ]
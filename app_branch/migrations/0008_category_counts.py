@@ -0,0 +1,52 @@
+# Generated by Django 5.1.3 on 2026-10-17 20:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_category_counts(apps, schema_editor):
+    """
+    Count the active products of each category on every branch and restaurant menu.
+    """
+    ProductsModel = apps.get_model('app_products', 'ProductsModel')
+    scopes = [
+        (apps.get_model('app_branch', 'BranchCategoryCount'), 'branch_id', 'restaurants__branch_products__branch_id'),
+        (apps.get_model('app_company', 'RestaurantCategoryCount'), 'restaurant_id', 'restaurants__restaurant_id'),
+    ]
+    for model, owner_field, lookup in scopes:
+        counts = ProductsModel.objects.filter(
+            **{f'{lookup}__isnull': False}, status=True, is_deleted=False,
+        ).values_list(lookup, 'category_id').annotate(count=Count('id', distinct=True)).order_by()
+        model.objects.bulk_create(
+            (model(**{owner_field: owner_id}, category_id=category_id, count=count)
+             for owner_id, category_id, count in counts.iterator()),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_branch', '0007_branchmenudocument'),
+        ('app_company', '0005_restaurantcategorycount'),
+        ('app_products', '0005_main_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BranchCategoryCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_counts', to='app_branch.branchmodel')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='branch_counts', to='app_products.categorymodel')),
+            ],
+            options={
+                'verbose_name': 'Branch Category Count',
+                'verbose_name_plural': 'Branch Category Counts',
+                'unique_together': {('branch', 'category')},
+            },
+        ),
+        migrations.RunPython(fill_category_counts, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,15 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
+from app_common.bulk import chunked, in_batch_size, insert_ignoring_conflicts
+from app_common.geo import polygon_bounds
 from app_common.models import BaseModel
 from app_company.models import RestaurantModel, RestaurantProductsModel
+from app_products.models import CategoryModel
 
 User = get_user_model()
 
@@ -13,6 +20,15 @@ class ActionChoice(models.TextChoices):
     """
     ADD = "add", "Add"
     REMOVE = "remove", "Remove"
+    SET = "set", "Set"
+
+
+class OrderActionChoice(models.TextChoices):
+    """
+    OrderActionChoice contains the decisions a branch can take on a pending order.
+    """
+    ACCEPT = "accept", "Accept"
+    REJECT = "reject", "Reject"
 
 
 class BranchModel(BaseModel):
@@ -22,6 +38,8 @@ class BranchModel(BaseModel):
         name (str): Name of the branch unique.
         address (str): Address of the branch.
         restaurant (RestaurantModel): Restaurant the branch belongs to.
+        latitude (float): Latitude of the branch in degrees, if known.
+        longitude (float): Longitude of the branch in degrees, if known.
         is_active (bool): Indicates whether the branch is active or not.
     """
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="branches", null=True)
@@ -33,6 +51,10 @@ class BranchModel(BaseModel):
         related_name="branches",
         verbose_name="Restaurant"
     )
+    latitude = models.FloatField(
+        null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)], verbose_name="Latitude")
+    longitude = models.FloatField(
+        null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)], verbose_name="Longitude")
     is_active = models.BooleanField(default=True, verbose_name="Is Active")
 
     class Meta:
@@ -60,4 +82,124 @@ class BranchProductsModel(models.Model):
         unique_together = (('branch','restaurant'),)
 
     def __str__(self):
-        return f"{self.branch.name} - {self.restaurant.name}"
\ No newline at end of file
+        return f"{self.branch.name} - {self.restaurant.name}"
+
+
+class BranchMenuDocument(models.Model):
+    """
+    BranchMenuDocument is the materialized menu of one branch, as served by the menu endpoint.
+    version: Incremented whenever the branch's menu or anything shown in it changes.
+    built_version: The version the stored document was built at; the document is stale when it differs.
+    etag: Strong ETag of the stored document.
+    document: The encoded JSON document.
+    """
+    branch = models.OneToOneField(
+        BranchModel,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='menu_document',
+        verbose_name='Branch'
+    )
+    version = models.PositiveBigIntegerField(default=0, verbose_name='Version')
+    built_version = models.PositiveBigIntegerField(null=True, blank=True, verbose_name='Built Version')
+    etag = models.CharField(max_length=66, blank=True, verbose_name='ETag')
+    document = models.TextField(blank=True, verbose_name='Document')
+    built_at = models.DateTimeField(auto_now=True, verbose_name='Built At')
+
+    class Meta:
+        verbose_name = 'Branch Menu Document'
+        verbose_name_plural = 'Branch Menu Documents'
+
+    def __str__(self):
+        return f"{self.branch_id}: {self.version}"
+
+    @classmethod
+    def mark_stale(cls, branch_ids):
+        """
+        Increment the version of the branches' menus, so their stored documents are rebuilt on the next read.
+        """
+        for chunk in chunked(sorted(set(branch_ids)), in_batch_size()):
+            insert_ignoring_conflicts(cls, [{'branch_id': branch_id} for branch_id in chunk])
+            cls.objects.filter(branch_id__in=chunk).update(version=F('version') + 1)
+
+    @classmethod
+    def store(cls, branch_id, version, etag, document):
+        """
+        Save a document built at version and return True, or False if the menu changed meanwhile.
+        """
+        if version == 0:
+            try:
+                with transaction.atomic():
+                    cls.objects.create(branch_id=branch_id, built_version=0, etag=etag, document=document)
+                return True
+            except IntegrityError:
+                # the menu changed, or another request stored it first
+                return False
+        return bool(cls.objects.filter(branch_id=branch_id, version=version).update(
+            built_version=version, etag=etag, document=document, built_at=timezone.now()))
+
+
+class BranchCategoryCount(models.Model):
+    """
+    Represents the number of active products of one category on a branch's menu.
+    Maintained by app_branch.facets as menus and products change; a row may hold 0.
+    Attributes:
+        branch (BranchModel): The branch.
+        category (CategoryModel): The category.
+        count (int): Active, non-deleted products of the category on the branch's menu.
+    """
+    branch = models.ForeignKey(BranchModel, on_delete=models.CASCADE, related_name="category_counts")
+    category = models.ForeignKey(CategoryModel, on_delete=models.CASCADE, related_name="branch_counts")
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Branch Category Count"
+        verbose_name_plural = "Branch Category Counts"
+        unique_together = (('branch', 'category'),)
+
+    def __str__(self):
+        return f"{self.branch_id} - {self.category_id}: {self.count}"
+
+
+class BranchDeliveryZone(BaseModel):
+    """
+    Represents an area a branch delivers to.
+    Attributes:
+        branch (BranchModel): Branch that delivers to the zone.
+        name (str): Name of the zone.
+        polygon (list): Outline of the zone as [[latitude, longitude], ...] in degrees.
+        min_latitude, min_longitude, max_latitude, max_longitude (float): Bounding box of
+            the polygon, filled in on save.
+        is_active (bool): Indicates whether the branch currently delivers to the zone.
+    """
+    branch = models.ForeignKey(BranchModel, on_delete=models.CASCADE, related_name="delivery_zones")
+    name = models.CharField(max_length=64, verbose_name="Name")
+    polygon = models.JSONField(verbose_name="Polygon")
+    min_latitude = models.FloatField(editable=False)
+    min_longitude = models.FloatField(editable=False)
+    max_latitude = models.FloatField(editable=False)
+    max_longitude = models.FloatField(editable=False)
+    is_active = models.BooleanField(default=True, verbose_name="Is Active")
+
+    class Meta:
+        verbose_name = "Branch Delivery Zone"
+        verbose_name_plural = "Branch Delivery Zones"
+
+    def __str__(self):
+        return f"{self.branch.name} - {self.name}"
+
+    def clean(self):
+        polygon = self.polygon
+        if not isinstance(polygon, list) or len(polygon) < 3:
+            raise ValidationError({'polygon': 'A polygon needs at least three [latitude, longitude] points.'})
+        for point in polygon:
+            if (not isinstance(point, (list, tuple)) or len(point) != 2
+                    or not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in point)
+                    or not (-90 <= point[0] <= 90 and -180 <= point[1] <= 180)):
+                raise ValidationError({'polygon': f'Invalid point {point!r}: expected [latitude, longitude].'})
+
+    def save(self, *args, **kwargs):
+        # the bounds and the zone index can't be built from a malformed polygon
+        self.clean()
+        self.min_latitude, self.min_longitude, self.max_latitude, self.max_longitude = polygon_bounds(self.polygon)
+        super().save(*args, **kwargs)
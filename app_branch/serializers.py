@@ -1,6 +1,10 @@
 from rest_framework import serializers
 
-from app_branch.models import ActionChoice
+from app_branch.models import ActionChoice, BranchModel, OrderActionChoice
+from app_common.images import image_urls
+
+# Most orders one bulk accept or reject request may decide on.
+MAX_BULK_ORDERS = 100
 
 
 class AcceptSerializers(serializers.Serializer):
@@ -10,16 +14,80 @@ class AcceptSerializers(serializers.Serializer):
     order_id = serializers.IntegerField()
 
 
+class BulkOrderActionSerializer(serializers.Serializer):
+    """
+    Serializer for accepting or rejecting several orders at once.
+    """
+    order_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        min_length=1,
+        max_length=MAX_BULK_ORDERS,
+        help_text="IDs of the orders to accept or reject."
+    )
+    action = serializers.ChoiceField(
+        choices=OrderActionChoice.choices,
+        default=OrderActionChoice.ACCEPT,
+        help_text="Action to perform: 'accept' or 'reject'."
+    )
+
+    def validate_order_ids(self, value):
+        return list(dict.fromkeys(value))
+
+
+class KitchenQueueQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of the kitchen queue: the version the client last synced to.
+    """
+    since = serializers.IntegerField(min_value=0, required=False)
+
+
+class CategoryCountsQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of the category counts: the branch or the restaurant whose menu to count.
+    """
+    branch = serializers.IntegerField(min_value=1, required=False)
+    restaurant = serializers.IntegerField(min_value=1, required=False)
+
+    def validate(self, attrs):
+        if len(attrs) != 1:
+            raise serializers.ValidationError("Pass exactly one of branch and restaurant.")
+        return attrs
+
+
 class AddOrRemoveProductsSerializer(serializers.Serializer):
     """
     Serializer for adding or removing products from an order.
     """
     product_ids = serializers.ListField(
         child=serializers.IntegerField(),
-        help_text="List of product IDs to add or remove."
+        help_text="List of product IDs to add or remove, or the whole menu for 'set'."
     )
     action = serializers.ChoiceField(
         choices=ActionChoice.choices,
         default=ActionChoice.ADD,
-        help_text="Action to perform: 'add' or 'remove'."
-    )
\ No newline at end of file
+        help_text="Action to perform: 'add', 'remove' or 'set' (replace the menu with product_ids)."
+    )
+
+
+class ServiceableBranchSerializer(serializers.ModelSerializer):
+    """
+    Serializer for a branch that delivers to a location, with its distance in meters and
+    its restaurant's logo.
+
+    Distances are read from the `distances` context entry: {branch_id: meters or None}.
+    `restaurant_logo` is {"url", "variants": {size: {format: url} or null}}; select the
+    branch's restaurant with it.
+    """
+    distance = serializers.SerializerMethodField()
+    restaurant_logo = serializers.SerializerMethodField()
+
+    class Meta:
+        model = BranchModel
+        fields = ['id', 'name', 'address', 'restaurant', 'restaurant_logo', 'latitude', 'longitude', 'distance']
+
+    def get_distance(self, obj):
+        distance = self.context.get('distances', {}).get(obj.pk)
+        return round(distance) if distance is not None else None
+
+    def get_restaurant_logo(self, obj):
+        return image_urls(obj.restaurant.logo, obj.restaurant.logo_variants)
@@ -0,0 +1,159 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from app_branch.facets import (
+    forget_category_counts, forget_counts, product_owners, refresh_counts, shift_counts,
+)
+from app_branch.menus import forget_menus, invalidate_menus, invalidate_menus_selling, invalidate_restaurant_menus
+from app_branch.models import BranchModel, BranchProductsModel
+from app_company.models import RestaurantModel, RestaurantProductsModel
+from app_products.models import CategoryModel, ProductImageModel, ProductsModel
+
+# Deleting BranchProductsModel and RestaurantProductsModel rows has no receivers here: a
+# delete receiver makes Django load and signal every row of a bulk delete. The views that
+# delete them invalidate the menus and recount the categories themselves, and cascades from a deleted product,
+# category or branch are covered by the receivers below.
+
+
+@receiver(post_save, sender=BranchModel)
+def branch_menu_saved(sender, instance, **kwargs):
+    """
+    Rebuild the menu of a saved branch: its name, address and status are part of it.
+    """
+    invalidate_menus([instance.pk])
+
+
+@receiver(post_delete, sender=BranchModel)
+def branch_menu_deleted(sender, instance, **kwargs):
+    """
+    Stop serving the cached menu of a deleted branch.
+    """
+    forget_menus([instance.pk])
+
+
+@receiver(post_save, sender=BranchProductsModel)
+def branch_product_saved(sender, instance, **kwargs):
+    invalidate_menus([instance.branch_id])
+
+
+@receiver(post_save, sender=RestaurantProductsModel)
+def restaurant_product_saved(sender, instance, **kwargs):
+    invalidate_restaurant_menus(instance.restaurant_id)
+
+
+@receiver(post_save, sender=ProductsModel)
+def product_saved(sender, instance, **kwargs):
+    invalidate_menus_selling(restaurant__product_id=instance.pk)
+
+
+@receiver(post_save, sender=ProductImageModel)
+def product_image_saved(sender, instance, **kwargs):
+    invalidate_menus_selling(restaurant__product_id=instance.product_id)
+
+
+@receiver(post_save, sender=CategoryModel)
+def category_saved(sender, instance, **kwargs):
+    invalidate_menus_selling(restaurant__product__category_id=instance.pk)
+
+
+@receiver(pre_delete, sender=ProductsModel)
+@receiver(pre_delete, sender=ProductImageModel)
+@receiver(pre_delete, sender=CategoryModel)
+def catalog_pre_delete(sender, instance, **kwargs):
+    """
+    Remember the branches selling a product, image or category before the cascade removes the links.
+    """
+    if sender is CategoryModel:
+        lookup = {'restaurant__product__category_id': instance.pk}
+    elif sender is ProductImageModel:
+        lookup = {'restaurant__product_id': instance.product_id}
+    else:
+        lookup = {'restaurant__product_id': instance.pk}
+    instance._menu_branch_ids = list(
+        BranchProductsModel.objects.filter(**lookup).values_list('branch_id', flat=True).distinct())
+
+
+@receiver(post_delete, sender=ProductsModel)
+@receiver(post_delete, sender=ProductImageModel)
+@receiver(post_delete, sender=CategoryModel)
+def catalog_deleted(sender, instance, **kwargs):
+    invalidate_menus(getattr(instance, '_menu_branch_ids', []))
+
+
+def counted_category(product):
+    """
+    Return the category a product is counted in, or None if it isn't counted (inactive or deleted).
+    """
+    return product.category_id if product.status and not product.is_deleted else None
+
+
+@receiver(post_save, sender=BranchProductsModel)
+def branch_product_counted(sender, instance, **kwargs):
+    refresh_counts('branch', [instance.branch_id])
+
+
+@receiver(post_save, sender=RestaurantProductsModel)
+def restaurant_product_counted(sender, instance, **kwargs):
+    refresh_counts('restaurant', [instance.restaurant_id])
+
+
+@receiver(pre_save, sender=ProductsModel)
+def product_pre_save(sender, instance, **kwargs):
+    """
+    Remember the category a saved product was counted in.
+    """
+    if instance.pk is None:
+        instance._counted_category = None
+        return
+    before = ProductsModel.objects.filter(pk=instance.pk).values('category_id', 'status', 'is_deleted').first()
+    instance._counted_category = (
+        before['category_id'] if before is not None and before['status'] and not before['is_deleted'] else None)
+
+
+@receiver(post_save, sender=ProductsModel)
+def product_counted(sender, instance, created, **kwargs):
+    """
+    Move the product's count on the menus listing it when its status, deletion or category changed.
+    """
+    before, after = getattr(instance, '_counted_category', None), counted_category(instance)
+    if created or before == after:
+        return
+    owners = product_owners(instance.pk)
+    if before is not None:
+        shift_counts(owners, before, -1)
+    if after is not None:
+        shift_counts(owners, after, 1)
+
+
+@receiver(pre_delete, sender=ProductsModel)
+def product_pre_delete(sender, instance, **kwargs):
+    """
+    Remember the menus listing a counted product before the cascade removes the links.
+    """
+    if counted_category(instance) is not None:
+        instance._count_owners = product_owners(instance.pk)
+
+
+@receiver(post_delete, sender=ProductsModel)
+def product_uncounted(sender, instance, **kwargs):
+    if getattr(instance, '_count_owners', None):
+        shift_counts(instance._count_owners, instance.category_id, -1)
+
+
+@receiver(post_save, sender=CategoryModel)
+@receiver(pre_delete, sender=CategoryModel)
+def category_counts_changed(sender, instance, **kwargs):
+    """
+    Drop the cached counts showing a renamed, re-flagged or deleted category.
+    """
+    forget_category_counts(instance.pk)
+
+
+@receiver(post_delete, sender=BranchModel)
+def branch_counts_deleted(sender, instance, **kwargs):
+    forget_counts('branch', [instance.pk])
+
+
+@receiver(post_delete, sender=RestaurantModel)
+def restaurant_counts_deleted(sender, instance, **kwargs):
+    forget_counts('restaurant', [instance.pk])
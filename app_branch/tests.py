@@ -1,3 +1,319 @@
+import json
+
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from app_branch.models import BranchMenuDocument, BranchModel, BranchProductsModel
+from app_branch.views import AddOrRemoveBranchProducts, BranchMenu, BulkAcceptOrders, CategoryCounts, KitchenQueue
+from app_company.models import RestaurantProductsModel
+from app_deliveries.models import KitchenQueueVersion, OrderHourlyRollup, OrderModel, OrderStatus
+from app_deliveries.services import transition_order
+from app_deliveries.tests import OrderFixturesMixin
+from app_products.models import CategoryModel, ProductImageModel, ProductsModel
+from app_users.models import UserModel, UserRoleChoice
+
+
+class KitchenQueueTest(OrderFixturesMixin, TestCase):
+    """
+    The kitchen queue only lists the branch's orders, and a refresh only returns what changed.
+    """
+
+    def get(self, **params):
+        request = APIRequestFactory().get('/', params)
+        force_authenticate(request, user=self.branch_user)
+        return KitchenQueue.as_view()(request)
+
+    def test_full_and_delta_sync(self):
+        other_user = UserModel.objects.create(username='branch-2', phone_number='201', role=UserRoleChoice.BRANCH)
+        other_branch = BranchModel.objects.create(
+            user=other_user, name='Other branch', address='Street 3', restaurant=self.restaurant)
+        waiting = self.create_order(order_status=OrderStatus.PENDING_RESTAURANT)
+        cooking = self.create_order(order_status=OrderStatus.CONFIRMED_RESTAURANT)
+        self.create_order(order_status=OrderStatus.DELIVERED)
+        elsewhere = self.create_order(order_status=OrderStatus.PENDING_RESTAURANT)
+        OrderModel.objects.filter(pk=elsewhere.pk).update(branch=other_branch)
+
+        response = self.get()
+        self.assertTrue(response.data['full'])
+        self.assertEqual([order['id'] for order in response.data['orders']], [waiting.pk, cooking.pk])
+        version = response.data['version']
+        self.assertEqual(version, KitchenQueueVersion.current(self.branch.pk))
+
+        # nothing changed: one range scan, no prefetches
+        with self.assertNumQueries(1):
+            response = self.get(since=version)
+        self.assertEqual(
+            (response.data['orders'], response.data['removed'], response.data['version']), ([], [], version))
+
+        transition_order(waiting.pk, OrderStatus.PENDING_RESTAURANT, OrderStatus.CONFIRMED_RESTAURANT)
+        transition_order(cooking.pk, OrderStatus.CONFIRMED_RESTAURANT, OrderStatus.DELIVERING)
+        added = self.create_order(order_status=OrderStatus.PENDING_RESTAURANT)
+
+        response = self.get(since=version)
+        self.assertFalse(response.data['full'])
+        self.assertEqual(
+            [(order['id'], order['order_status']) for order in response.data['orders']],
+            [(waiting.pk, OrderStatus.CONFIRMED_RESTAURANT), (added.pk, OrderStatus.PENDING_RESTAURANT)],
+        )
+        self.assertEqual(response.data['removed'], [cooking.pk])
+        self.assertEqual(response.data['version'], KitchenQueueVersion.current(self.branch.pk))
+        self.assertGreater(response.data['version'], version)
+
+    def test_invalid_version(self):
+        self.assertEqual(self.get(since=-1).status_code, 400)
+        self.assertEqual(self.get(since='latest').status_code, 400)
+
+
+class BulkAcceptOrdersTest(OrderFixturesMixin, TestCase):
+    """
+    Branches accept or reject many pending orders in one request, with a result per order.
+    """
+
+    def post(self, order_ids, action='accept'):
+        request = APIRequestFactory().post('/', {'order_ids': order_ids, 'action': action}, format='json')
+        force_authenticate(request, user=self.branch_user)
+        return BulkAcceptOrders.as_view()(request)
+
+    def test_accept_reports_each_order(self):
+        pending = [self.create_order(items=2, order_status=OrderStatus.PENDING_RESTAURANT) for _ in range(3)]
+        delivered = self.create_order()
+        response = self.post([pending[0].pk, delivered.pk, pending[1].pk, pending[2].pk, 0, pending[0].pk])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(result['order_id'], result['success']) for result in response.data['results']],
+            [(pending[0].pk, True), (delivered.pk, False), (pending[1].pk, True), (pending[2].pk, True), (0, False)],
+        )
+        self.assertEqual(sorted(order['id'] for order in response.data['data']), sorted(order.pk for order in pending))
+        self.assertEqual(
+            set(OrderModel.objects.filter(pk__in=[order.pk for order in pending]).values_list('order_status', flat=True)),
+            {OrderStatus.CONFIRMED_RESTAURANT},
+        )
+        totals = OrderHourlyRollup.status_totals(branch=self.branch)
+        self.assertEqual(totals[OrderStatus.CONFIRMED_RESTAURANT]['orders_count'], 3)
+        self.assertEqual(totals[OrderStatus.CONFIRMED_RESTAURANT]['items_count'], 12)
+        self.assertEqual(totals[OrderStatus.PENDING_RESTAURANT]['orders_count'], 0)
+
+        # already decided orders are not rejected afterwards
+        response = self.post([pending[0].pk], action='reject')
+        self.assertFalse(response.data['success'])
+
+    def test_query_count_does_not_grow_with_orders(self):
+        def queries_for(count):
+            order_ids = [self.create_order(order_status=OrderStatus.PENDING_RESTAURANT).pk for _ in range(count)]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.post(order_ids, action='reject')
+            self.assertEqual(len(response.data['data']), count)
+            return len(queries)
+
+        queries_for(1)  # creates the rollup bucket the later calls update
+        self.assertEqual(queries_for(2), queries_for(10))
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.post([]).status_code, 400)
+        self.assertEqual(self.post([1], action='cook').status_code, 400)
+
+
+class BranchMenuSyncTest(OrderFixturesMixin, TestCase):
+    """
+    Setting a branch menu only inserts and deletes the rows that differ.
+    """
+
+    def set_menu(self, product_ids):
+        request = APIRequestFactory().post('/', {'product_ids': product_ids, 'action': 'set'}, format='json')
+        force_authenticate(request, user=self.branch_user)
+        return AddOrRemoveBranchProducts.as_view()(request)
+
+    def menu(self):
+        return set(BranchProductsModel.objects.filter(branch=self.branch).values_list('restaurant__product_id', flat=True))
+
+    def test_set_menu(self):
+        products = ProductsModel.objects.bulk_create([
+            ProductsModel(name=f'Dish {n}', description='Dish', price=n, category=self.category) for n in range(5)])
+        RestaurantProductsModel.objects.bulk_create([
+            RestaurantProductsModel(restaurant=self.restaurant, product=product) for product in products[:4]])
+        ids = [product.pk for product in products]
+
+        response = self.set_menu(ids[:3] + [ids[4]])
+        self.assertEqual((response.data['added'], response.data['removed']), (3, 0))
+        self.assertEqual(response.data['unknown_product_ids'], [ids[4]])
+        self.assertEqual(self.menu(), set(ids[:3]))
+        kept = BranchProductsModel.objects.get(branch=self.branch, restaurant__product_id=ids[1]).pk
+
+        # one query for each of: branch, restaurant menu, current menu, savepoint, insert, delete,
+        # menu document version (insert and increment), category counts (stored and counted), release
+        with self.assertNumQueries(11):
+            response = self.set_menu(ids[1:4])
+        self.assertEqual(
+            (response.data['added'], response.data['removed'], response.data['unchanged']), (1, 1, 2))
+        self.assertEqual(self.menu(), set(ids[1:4]))
+        self.assertTrue(BranchProductsModel.objects.filter(pk=kept).exists())
+
+        self.set_menu([])
+        self.assertEqual(self.menu(), set())
+
+
+class BranchMenuTest(OrderFixturesMixin, TestCase):
+    """
+    The branch menu document is rebuilt only after a change to that branch's menu, and
+    a matching If-None-Match is answered from the cache alone.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.restaurant_product = RestaurantProductsModel.objects.create(restaurant=cls.restaurant, product=cls.product)
+        BranchProductsModel.objects.create(branch=cls.branch, restaurant=cls.restaurant_product)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, branch_id=None, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        request = APIRequestFactory().get('/', **headers)
+        return BranchMenu.as_view()(request, branch_id=branch_id or self.branch.pk)
+
+    def built_version(self):
+        return BranchMenuDocument.objects.get(branch=self.branch).built_version
+
+    def test_document_and_not_modified(self):
+        ProductImageModel.objects.create(product=self.product, image='products/tea.jpg', is_main_image=True)
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"'))
+        menu = json.loads(response.content)
+        self.assertEqual(menu['branch']['name'], 'Branch')
+        self.assertEqual(menu['categories'], [{'id': self.category.pk, 'name': 'Drinks', 'products': [{
+            'id': self.product.pk, 'name': 'Tea', 'description': 'Green tea', 'price': '5.00',
+            'image': '/media/products/tea.jpg', 'thumbnail': None,
+        }]}])
+
+        with self.assertNumQueries(0):
+            response = self.get(etag=etag)
+        self.assertEqual((response.status_code, response['ETag']), (304, etag))
+        self.assertEqual(self.get(etag=f'W/{etag}').status_code, 304)
+
+        # a cold cache serves the stored document without rebuilding it
+        cache.clear()
+        with self.assertNumQueries(1):
+            response = self.get()
+        self.assertEqual(response['ETag'], etag)
+
+    def test_rebuilt_only_for_changed_branches(self):
+        etag = self.get()['ETag']
+        version = self.built_version()
+
+        # a product only another branch sells
+        other_user = UserModel.objects.create(username='branch-2', phone_number='201', role=UserRoleChoice.BRANCH)
+        other_branch = BranchModel.objects.create(
+            user=other_user, name='Other branch', address='Street 3', restaurant=self.restaurant)
+        other_product = ProductsModel.objects.create(name='Soup', description='Soup', price=9, category=self.category)
+        BranchProductsModel.objects.create(
+            branch=other_branch,
+            restaurant=RestaurantProductsModel.objects.create(restaurant=self.restaurant, product=other_product))
+        with self.captureOnCommitCallbacks(execute=True):
+            other_product.price = 10
+            other_product.save()
+        self.assertGreater(BranchMenuDocument.objects.get(branch=other_branch).version, 0)
+        self.assertEqual(self.get(etag=etag).status_code, 304)
+        self.assertEqual(self.built_version(), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = 'Hot drinks'
+            self.category.save()
+        response = self.get(etag=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(json.loads(response.content)['categories'][0]['name'], 'Hot drinks')
+        self.assertGreater(self.built_version(), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.delete()
+        self.assertEqual(json.loads(self.get().content)['categories'], [])
+
+    def test_menu_edits_invalidate(self):
+        etag = self.get()['ETag']
+        request = APIRequestFactory().post('/', {'product_ids': [], 'action': 'set'}, format='json')
+        force_authenticate(request, user=self.branch_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            AddOrRemoveBranchProducts.as_view()(request)
+        response = self.get(etag=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['categories'], [])
+
+    def test_inactive_branch(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.branch.is_active = False
+            self.branch.save()
+        self.assertEqual(self.get().status_code, 404)
+        self.assertEqual(self.get(branch_id=self.branch.pk + 100).status_code, 404)
+
+
+class CategoryCountsTest(OrderFixturesMixin, TestCase):
+    """
+    Category counts follow menu and product changes, and are served from the cache.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.meals = CategoryModel.objects.create(name='Meals')
+        cls.soup = ProductsModel.objects.create(name='Soup', description='Soup', price=9, category=cls.meals)
+        cls.coffee = ProductsModel.objects.create(name='Coffee', description='Coffee', price=6, category=cls.category)
+        for product in (cls.product, cls.soup, cls.coffee):
+            BranchProductsModel.objects.create(
+                branch=cls.branch,
+                restaurant=RestaurantProductsModel.objects.create(restaurant=cls.restaurant, product=product))
+
+    def setUp(self):
+        cache.clear()
+
+    def counts(self, **params):
+        response = CategoryCounts.as_view()(APIRequestFactory().get('/', params))
+        return [(category['name'], category['count']) for category in response.data['categories']]
+
+    def set_menu(self, product_ids):
+        request = APIRequestFactory().post('/', {'product_ids': product_ids, 'action': 'set'}, format='json')
+        force_authenticate(request, user=self.branch_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            AddOrRemoveBranchProducts.as_view()(request)
+
+    def test_counts_follow_changes(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.counts(branch=self.branch.pk), [('Drinks', 2), ('Meals', 1)])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.counts(branch=self.branch.pk), [('Drinks', 2), ('Meals', 1)])
+        self.assertEqual(self.counts(restaurant=self.restaurant.pk), [('Drinks', 2), ('Meals', 1)])
+
+        self.set_menu([self.product.pk, self.soup.pk])
+        self.assertEqual(self.counts(branch=self.branch.pk), [('Drinks', 1), ('Meals', 1)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.coffee.category = self.meals
+            self.coffee.save()
+        self.assertEqual(self.counts(branch=self.branch.pk), [('Drinks', 1), ('Meals', 1)])
+        self.assertEqual(self.counts(restaurant=self.restaurant.pk), [('Drinks', 1), ('Meals', 2)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.status = False
+            self.product.save()
+            self.soup.delete()
+        self.assertEqual(self.counts(branch=self.branch.pk), [])
+        self.assertEqual(self.counts(restaurant=self.restaurant.pk), [('Meals', 1)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.status = True
+            self.product.save()
+            self.meals.name = 'Hot meals'
+            self.meals.save()
+        self.assertEqual(self.counts(branch=self.branch.pk), [('Drinks', 1)])
+        self.assertEqual(self.counts(restaurant=self.restaurant.pk), [('Drinks', 1), ('Hot meals', 1)])
 
-# Create your tests here.
+    def test_needs_one_owner(self):
+        response = CategoryCounts.as_view()(APIRequestFactory().get('/', {
+            'branch': self.branch.pk, 'restaurant': self.restaurant.pk}))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(CategoryCounts.as_view()(APIRequestFactory().get('/')).status_code, 400)
@@ -6,8 +6,11 @@ from app_branch import views
 app_name = 'app_branch'
 
 urlpatterns = [
-    path('pending-for-restaurant-orders/', views.PendingForRestaurantOrders.as_view(), name='pending_for_restaurant_orders'),
+    path('<int:branch_id>/menu/', views.BranchMenu.as_view(), name='menu'),
+    path('category-counts/', views.CategoryCounts.as_view(), name='category_counts'),
+    path('kitchen-queue/', views.KitchenQueue.as_view(), name='kitchen_queue'),
     path('accept-orders/', views.AcceptOrders.as_view(), name='accept_orders'),
+    path('bulk-accept-orders/', views.BulkAcceptOrders.as_view(), name='bulk_accept_orders'),
     path('add-or-remove/', views.AddOrRemoveBranchProducts.as_view(), name='add_or_remove'),
     path('branch-statistics/', views.BranchStatistics.as_view(), name='branch-statistics'),
 ]
\ No newline at end of file
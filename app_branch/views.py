@@ -1,29 +1,189 @@
 from datetime import timedelta
 
+from django.db import transaction
+from django.http import HttpResponse
 from django.utils import timezone
 
-from rest_framework import generics, status
-from rest_framework.pagination import PageNumberPagination
-from rest_framework.permissions import IsAuthenticated
+from rest_framework import status
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from app_branch.models import BranchProductsModel, ActionChoice
-from app_branch.serializers import AcceptSerializers, AddOrRemoveProductsSerializer
+from app_branch.facets import get_category_counts, refresh_counts
+from app_branch.menus import cached_etag, etag_matches, get_menu, invalidate_menus
+from app_branch.models import BranchModel, BranchProductsModel, ActionChoice, OrderActionChoice
+from app_branch.serializers import (
+    AcceptSerializers, AddOrRemoveProductsSerializer, BulkOrderActionSerializer, CategoryCountsQuerySerializer,
+    KitchenQueueQuerySerializer,
+)
+from app_common.bulk import sync_rows
+from app_common.pagination import KeysetPagination
 from app_common.premissions import IsBranch
-from app_deliveries.models import OrderModel, OrderStatus
+from app_common.statistics import statistics_from_counts
+from app_company.models import RestaurantProductsModel
+from app_deliveries.models import (
+    KITCHEN_QUEUE_STATUSES, KitchenQueueVersion, OrderHourlyRollup, OrderModel, OrderStatus,
+)
 from app_deliveries.serializers import OrderSerializer
+from app_deliveries.services import transition_order, transition_orders
 
 
-class PendingForRestaurantOrders(generics.ListAPIView):
+class BranchMenu(APIView):
     """
-    Returns a list of pending orders for restaurant.
+    Returns a branch's menu: its active products by category.
+
+    The menu is a precomputed document, rebuilt only after the branch's menu, products,
+    categories or product images changed, and served from cache with a strong ETag.
+    Send it back in `If-None-Match` to get a 304 while the menu is unchanged; that answer
+    comes from the cache alone, without a database query.
+
+    ### Example Response
+    ```
+    GET /api/branch/3/menu/
+    ETag: "9c1185a5c5e9fc54612808977ee8f548"
+    {
+        "branch": {"id": 3, "name": "Chilonzor", "address": "..."},
+        "categories": [
+            {"id": 1, "name": "Drinks", "products": [
+                {"id": 7, "name": "Tea", "description": "...", "price": "5.00", "image": "/media/products/tea.jpg",
+                 "thumbnail": {"webp": "/media/products/variants/tea-thumb.webp", "jpeg": "..."}}
+            ]}
+        ]
+    }
+    ```
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request, branch_id):
+        if_none_match = request.headers.get('If-None-Match')
+        etag = cached_etag(branch_id)
+        if etag is None or not etag_matches(etag, if_none_match):
+            menu = get_menu(branch_id)
+            if menu is None:
+                return HttpResponse(
+                    b'{"success":false,"message":"Branch not found"}', status=status.HTTP_404_NOT_FOUND,
+                    content_type='application/json')
+            etag, body = menu
+            if not etag_matches(etag, if_none_match):
+                response = HttpResponse(body, content_type='application/json')
+                response['ETag'] = etag
+                response['Cache-Control'] = 'no-cache'
+                return response
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+
+class CategoryCounts(APIView):
+    """
+    Returns how many active products each category of a branch's or a restaurant's menu has.
+
+    Pass exactly one of `branch` and `restaurant`. The counts are maintained as menus and
+    products change, so this is one query, and none while the cached answer lasts.
+    Categories without active products, and inactive categories, are left out.
+
+    ### Example Request
+    ```
+    GET /api/branch/category-counts/?branch=3
+    ```
+
+    ### Example Response
+    ```
+    {
+        "success": true,
+        "categories": [
+            {"id": 1, "name": "Drinks", "count": 24},
+            {"id": 4, "name": "Soups", "count": 6}
+        ]
+    }
+    ```
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        query = CategoryCountsQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(data={
+                "success": False,
+                "message": "Invalid data",
+                "errors": query.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+        scope, owner_id = next(iter(query.validated_data.items()))
+        return Response(data={
+            "success": True,
+            "categories": get_category_counts(scope, owner_id)
+        }, status=status.HTTP_200_OK)
+
+
+class KitchenQueue(APIView):
+    """
+    Returns the branch's kitchen queue: its orders pending for or confirmed by the restaurant.
+
+    Without `since` the whole queue is returned with the queue's current version. With
+    `?since=<version>` only the orders changed after that version are returned: the ones
+    still in the queue under `orders`, the ones that left it under `removed`. Store the
+    returned `version` and pass it as `since` on the next refresh.
+
+    ### Example Response
+    ```
+    GET /api/branch/kitchen-queue/?since=41
+    {
+        "success": true,
+        "full": false,
+        "version": 43,
+        "orders": [{"id": 12, "order_status": "confirmed_by_restaurant", ...}],
+        "removed": [9]
+    }
+    ```
     """
     permission_classes = [IsAuthenticated, IsBranch]
     serializer_class = OrderSerializer
 
-    def get_queryset(self):
-        return OrderModel.objects.filter(order_status=OrderStatus.PENDING_RESTAURANT)
+    def get_queryset(self, since=None):
+        """
+        Return the queue's orders, or with since, every order of the branch changed after that version.
+        """
+        orders = OrderModel.objects.filter(branch__user=self.request.user)
+        if since is None:
+            return orders.filter(order_status__in=KITCHEN_QUEUE_STATUSES, is_deleted=False).order_by('created_at', 'id')
+        return orders.filter(queue_version__gt=since).order_by('queue_version')
+
+    def get(self, request):
+        query = KitchenQueueQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(data={
+                "success": False,
+                "message": "Invalid data",
+                "errors": query.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        since = query.validated_data.get('since')
+        removed = []
+        if since is None:
+            # read before the orders: a change committed in between is sent again, never missed
+            version = KitchenQueueVersion.objects.filter(
+                branch__user=request.user).values_list('version', flat=True).first() or 0
+            orders = list(self.serializer_class.setup_eager_loading(self.get_queryset()))
+        else:
+            version = since
+            orders = []
+            for order in self.serializer_class.setup_eager_loading(self.get_queryset(since)):
+                version = max(version, order.queue_version)
+                if order.order_status in KITCHEN_QUEUE_STATUSES and not order.is_deleted:
+                    orders.append(order)
+                else:
+                    removed.append(order.pk)
+
+        return Response(data={
+            "success": True,
+            "full": since is None,
+            "version": version,
+            "orders": self.serializer_class(orders, many=True).data,
+            "removed": removed
+        }, status=status.HTTP_200_OK)
 
 
 class AcceptOrders(APIView):
@@ -39,17 +199,20 @@ class AcceptOrders(APIView):
         """
         serializer = AcceptSerializers(data=request.data)
         if serializer.is_valid():
-            order = self.queryset.objects.filter(id=serializer.validated_data.get('order_id'))
-            if order.exists():
-                order = order.first()
-                order.order_status = OrderStatus.CONFIRMED_RESTAURANT
-                order.save()
+            order_id = serializer.validated_data.get('order_id')
+            if transition_order(order_id, OrderStatus.PENDING_RESTAURANT, OrderStatus.CONFIRMED_RESTAURANT,
+                                branch__user=request.user):
+                order = OrderSerializer.setup_eager_loading(self.queryset.objects.filter(pk=order_id)).get()
                 data = OrderSerializer(order).data
                 return Response(data={
                     "success": True,
                     "message": "Order accepted",
                     "data": data
                 }, status=status.HTTP_201_CREATED)
+            return Response(data={
+                "success": False,
+                "message": "No pending order found for this branch"
+            }, status=status.HTTP_400_BAD_REQUEST)
         return Response(data={
             "success": False,
             "message": "Invalid data",
@@ -57,9 +220,63 @@ class AcceptOrders(APIView):
         }, status=status.HTTP_400_BAD_REQUEST)
 
 
+class BulkAcceptOrders(APIView):
+    """
+    Accept or reject several of the branch's pending orders at once.
+
+    The orders are moved with one UPDATE restricted to the branch's own orders pending for
+    the restaurant, and the changed orders are serialized from one batched fetch. Every
+    requested ID gets a result; IDs that weren't pending for this branch are left alone.
+
+    ### Example Request
+    ```
+    POST /api/branch/bulk-accept-orders/
+    {"order_ids": [12, 13, 99], "action": "accept"}
+    ```
+    """
+    permission_classes = [IsAuthenticated, IsBranch]
+    serializer_class = BulkOrderActionSerializer
+    queryset = OrderModel.objects.all()
+
+    targets = {
+        OrderActionChoice.ACCEPT: OrderStatus.CONFIRMED_RESTAURANT,
+        OrderActionChoice.REJECT: OrderStatus.CANCELED,
+    }
+
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        if not serializer.is_valid():
+            return Response(data={
+                "success": False,
+                "message": "Invalid data",
+                "errors": serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        order_ids = serializer.validated_data['order_ids']
+        target = self.targets[serializer.validated_data['action']]
+        changed = set(transition_orders(order_ids, OrderStatus.PENDING_RESTAURANT, target, branch__user=request.user))
+        orders = OrderSerializer.setup_eager_loading(self.queryset.filter(pk__in=changed)) if changed else []
+
+        return Response(data={
+            "success": bool(changed),
+            "message": f"{len(changed)} of {len(order_ids)} orders updated",
+            "results": [
+                {"order_id": order_id, "success": True} if order_id in changed else
+                {"order_id": order_id, "success": False, "message": "No pending order found for this branch"}
+                for order_id in order_ids
+            ],
+            "data": OrderSerializer(orders, many=True).data
+        }, status=status.HTTP_200_OK)
+
+
 class AddOrRemoveBranchProducts(APIView):
     """
     Add or remove products from the branch's order list.
+
+    With `"action": "set"`, product_ids is the branch's whole menu: products of the
+    restaurant missing from the menu are added and the others removed, in one bulk
+    insert and one bulk delete. Product IDs the restaurant doesn't sell are ignored
+    and listed in the response.
     """
     permission_classes = [IsAuthenticated, IsBranch]
     queryset = BranchProductsModel.objects.all()
@@ -82,6 +299,8 @@ class AddOrRemoveBranchProducts(APIView):
 
         product_ids = serializer.validated_data['product_ids']
         action = serializer.validated_data['action']
+        if action == ActionChoice.SET:
+            return self.set_menu(request, product_ids)
         branch = request.user.branch  # Assuming the user is linked to a branch.
         products = self.queryset.filter(restaurant__product_id__in=product_ids, branch=branch)
 
@@ -106,6 +325,8 @@ class AddOrRemoveBranchProducts(APIView):
                 data={"success": False, "message": "Invalid action."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
+        invalidate_menus([branch.pk])
+        refresh_counts('branch', [branch.pk])
 
         return Response(
             data={
@@ -115,6 +336,40 @@ class AddOrRemoveBranchProducts(APIView):
             status=status.HTTP_200_OK,
         )
 
+    def set_menu(self, request, product_ids):
+        """
+        Replace the branch's menu with the given products of its restaurant.
+        """
+        branch = BranchModel.objects.filter(user=request.user).values('id', 'restaurant_id').first()
+        if branch is None:
+            return Response(
+                data={"success": False, "message": "No branch found for this user."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        # the restaurant's whole menu in one query: {product id: restaurant product id}
+        available = dict(RestaurantProductsModel.objects.filter(
+            restaurant_id=branch['restaurant_id']).values_list('product_id', 'id'))
+        with transaction.atomic():
+            result = sync_rows(
+                BranchProductsModel, 'branch_id', branch['id'], 'restaurant_id',
+                [available[product_id] for product_id in product_ids if product_id in available],
+            )
+            if result.added or result.removed:
+                invalidate_menus([branch['id']])
+                refresh_counts('branch', [branch['id']])
+        return Response(
+            data={
+                "success": True,
+                "message": "Menu updated successfully.",
+                "added": result.added,
+                "removed": result.removed,
+                "unchanged": result.unchanged,
+                "unknown_product_ids": list(dict.fromkeys(
+                    product_id for product_id in product_ids if product_id not in available)),
+            },
+            status=status.HTTP_200_OK,
+        )
+
 
 class BranchStatistics(APIView):
     """
@@ -190,6 +445,8 @@ class BranchStatistics(APIView):
     """
     permission_classes = [IsAuthenticated, IsBranch]
     queryset = OrderModel.objects.all()
+    pagination_class = KeysetPagination
+    owner_lookup = 'branch__user'
     fbd_filters = {
         'weekly': timedelta(days=7),
         'monthly': timedelta(days=30),
@@ -201,6 +458,12 @@ class BranchStatistics(APIView):
         'pending': OrderStatus.PENDING_RESTAURANT,
         'canceled': OrderStatus.CANCELED,
     }
+    stats_keys = {
+        'delivered': OrderStatus.DELIVERED,
+        'confirmed_orders': OrderStatus.CONFIRMED_RESTAURANT,
+        'pending_to_accept': OrderStatus.PENDING_RESTAURANT,
+        'canceled': OrderStatus.CANCELED,
+    }
     fbm_filters = {
         'price_high_to_low': '-total_price',
         'price_low_to_high': 'total_price',
@@ -212,48 +475,56 @@ class BranchStatistics(APIView):
         """
         Get branch statistics.
         """
-        orders = self.queryset.filter(branch__user=request.user)
+        orders = self.get_queryset()
         fbd = request.GET.get('fbd')
         fbt = request.GET.get('fbt')
         fbm = request.GET.get('fbm')
 
         # Apply date filter
-        orders = self.apply_date_filter(orders, fbd)
+        start = self.get_start_date(fbd)
+        orders = self.apply_date_filter(orders, start)
 
         # Apply status filter
+        status_filter = {}
         if fbt in self.fbt_filters:
-            orders = orders.filter(order_status=self.fbt_filters[fbt])
+            status_filter['order_status'] = self.fbt_filters[fbt]
+            orders = orders.filter(**status_filter)
 
         # Apply sorting filter
         if fbm in self.fbm_filters:
             orders = orders.order_by(self.fbm_filters[fbm])
 
         # Paginate the orders
-        paginator = PageNumberPagination()
-        paginated_orders = paginator.paginate_queryset(orders, request)
-
-        # Aggregate statistics
-        stats = {
-            "delivered": orders.filter(order_status=OrderStatus.DELIVERED).count(),
-            "confirmed_orders": orders.filter(order_status=OrderStatus.CONFIRMED_RESTAURANT).count(),
-            "pending_to_accept": orders.filter(order_status=OrderStatus.PENDING_RESTAURANT).count(),
-            "canceled": orders.filter(order_status=OrderStatus.CANCELED).count(),
-            "total_orders": orders.count(),
-        }
+        paginator = self.pagination_class()
+        paginated_orders = paginator.paginate_queryset(OrderSerializer.setup_eager_loading(orders), request)
+
+        # Aggregate statistics from the hourly rollups
+        totals = OrderHourlyRollup.status_totals(start, **{self.owner_lookup: request.user}, **status_filter)
+        stats = statistics_from_counts(
+            {order_status: total['orders_count'] for order_status, total in totals.items()}, self.stats_keys)
 
         # Return paginated response
         return paginator.get_paginated_response({
             "success": True,
-            "data": paginated_orders,
+            "data": OrderSerializer(paginated_orders, many=True).data,
             **stats,
         })
 
-    def apply_date_filter(self, orders, fbd: str):
-        """Apply the date filter to the orders queryset."""
+    def get_queryset(self):
+        """Return the orders of the requesting branch."""
+        return self.queryset.filter(**{self.owner_lookup: self.request.user})
+
+    def get_start_date(self, fbd: str):
+        """Return the start of the date filter range, or None for all orders."""
         if fbd == 'today':
-            start_of_today = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
-            return orders.filter(created_at__gte=start_of_today)
+            return timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
 
         elif fbd in self.fbd_filters:
-            return orders.filter(created_at__gte=timezone.now() - self.fbd_filters[fbd])
+            return timezone.now() - self.fbd_filters[fbd]
+        return None
+
+    def apply_date_filter(self, orders, start):
+        """Apply the date filter to the orders queryset."""
+        if start is not None:
+            return orders.filter(created_at__gte=start)
         return orders
\ No newline at end of file
@@ -0,0 +1,83 @@
+from collections import namedtuple
+
+from django.db import connection, transaction
+from django.db.models.constants import OnConflict
+
+SyncResult = namedtuple('SyncResult', ['added', 'removed', 'unchanged'])
+
+
+def chunked(values, size):
+    """
+    Split a list into lists of at most size values.
+    """
+    return [values[start:start + size] for start in range(0, len(values), size)]
+
+
+def in_batch_size():
+    """
+    Return how many values one `__in` lookup may take next to a few other parameters.
+    """
+    return (connection.features.max_query_params or 10000) - 10
+
+
+def existing_ids(model, ids):
+    """
+    Return the subset of ids that are primary keys of model rows.
+    """
+    found = set()
+    for chunk in chunked(sorted(set(ids)), in_batch_size()):
+        found.update(model.objects.filter(pk__in=chunk).values_list('pk', flat=True))
+    return found
+
+
+def insert_ignoring_conflicts(model, rows, **values):
+    """
+    Insert rows into model's table with one executemany(), skipping rows that violate a unique constraint.
+
+    rows are (field name: value) dicts holding the same fields; values are the fields shared
+    by every row. The other fields get their defaults, including auto_now_add timestamps.
+    Like LocationBuffer, this skips model instantiation and per-row SQL compilation, which
+    dominate bulk_create() for thousands of rows.
+    """
+    if not rows:
+        return
+    row_fields = list(rows[0])
+    template = model(**values)
+    shared = [
+        (field, field.get_db_prep_save(field.pre_save(template, add=True), connection))
+        for field in model._meta.concrete_fields
+        if not field.primary_key and field.name not in row_fields and field.attname not in row_fields
+    ]
+    fields = [model._meta.get_field(name) for name in row_fields] + [field for field, _ in shared]
+    shared_values = tuple(value for _, value in shared)
+    qn = connection.ops.quote_name
+    sql = '{} {} ({}) VALUES ({}) {}'.format(
+        connection.ops.insert_statement(on_conflict=OnConflict.IGNORE),
+        qn(model._meta.db_table),
+        ', '.join(qn(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+        connection.ops.on_conflict_suffix_sql(fields, OnConflict.IGNORE, None, None),
+    )
+    with transaction.atomic(savepoint=False), connection.cursor() as cursor:
+        cursor.executemany(sql, [tuple(row.values()) + shared_values for row in rows])
+
+
+def sync_rows(model, owner_field: str, owner_id, item_field: str, item_ids) -> SyncResult:
+    """
+    Make the model rows of one owner link exactly the given items.
+
+    The owner's current items are read with one query, then the difference is applied
+    with one bulk insert (ignoring rows another request inserted meanwhile) and one bulk
+    delete, so rows that stay are never touched. Deletes are split into batches of the
+    database's parameter limit.
+    """
+    desired = set(item_ids)
+    current = set(model.objects.filter(**{owner_field: owner_id}).values_list(item_field, flat=True))
+    added = desired - current
+    removed = current - desired
+    with transaction.atomic(savepoint=False):
+        insert_ignoring_conflicts(
+            model, [{item_field: item_id} for item_id in sorted(added)], **{owner_field: owner_id})
+        for chunk in chunked(sorted(removed), in_batch_size()):
+            model.objects.filter(**{owner_field: owner_id, f'{item_field}__in': chunk}).delete()
+    return SyncResult(len(added), len(removed), len(desired & current))
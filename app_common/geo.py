@@ -0,0 +1,318 @@
+import heapq
+import math
+import threading
+from collections import defaultdict
+
+EARTH_RADIUS = 6371008.8  # meters
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS / 180
+
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    """
+    Return the great-circle distance in meters between two points given in degrees.
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (
+        math.sin((phi2 - phi1) / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+
+class SpatialIndex:
+    """
+    In-memory grid index of keyed points for k-nearest and radius queries.
+
+    Points are bucketed into square cells of `cell_size` degrees. set() and remove()
+    only touch the point's own cell, so the index is maintained incrementally as points
+    move instead of being rebuilt. Queries scan the cells around the query point ring by
+    ring and stop as soon as no unscanned cell can hold a closer point.
+
+    Pick a cell size that keeps cells to a few dozen points: 0.01 degrees (about
+    1.1 km) suits 100k points spread over a city. Distances are great-circle distances in meters; queries
+    do not wrap around the antimeridian.
+    """
+
+    def __init__(self, cell_size=0.01):
+        self.cell_size = cell_size
+        self._cells = defaultdict(dict)
+        self._points = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, key):
+        return key in self._points
+
+    def get(self, key):
+        """
+        Return the (latitude, longitude) of a key, or None if it is not indexed.
+        """
+        point = self._points.get(key)
+        return point[:2] if point is not None else None
+
+    def set(self, key, latitude, longitude):
+        """
+        Insert a point or move an existing one.
+        """
+        cell = self._cell(latitude, longitude)
+        with self._lock:
+            previous = self._points.get(key)
+            if previous is not None and previous[2] != cell:
+                self._discard(key, previous[2])
+            self._points[key] = (latitude, longitude, cell)
+            phi = math.radians(latitude)
+            self._cells[cell][key] = (phi, math.radians(longitude), math.cos(phi))
+
+    def remove(self, key):
+        """
+        Remove a point; unknown keys are ignored.
+        """
+        with self._lock:
+            previous = self._points.pop(key, None)
+            if previous is not None:
+                self._discard(key, previous[2])
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            self._points.clear()
+
+    def nearest(self, latitude, longitude, k=1, max_distance=None, accept=None):
+        """
+        Return up to k (distance, key) pairs closest to the point, nearest first.
+
+        max_distance limits the search radius in meters; accept(key) may reject keys
+        (e.g. busy couriers) without ending the search early.
+        """
+        if k <= 0:
+            return []
+        query = self._query(latitude, longitude)
+        limit = _haversine_term(max_distance) if max_distance is not None else 1.0
+        cx, cy = self._cell(latitude, longitude)
+        best = []  # max-heap of (-haversine term, key) holding the k nearest so far
+        with self._lock:
+            cells = self._cells
+            ring = 0
+            while True:
+                if 8 * ring >= len(cells):
+                    # fewer occupied cells than cells in the ring: finish with one pass over them
+                    candidates = (
+                        cell for cell in cells if max(abs(cell[0] - cx), abs(cell[1] - cy)) >= ring
+                    )
+                    self._collect(best, k, query, candidates, limit, accept)
+                    break
+                self._collect(best, k, query, self._ring(cx, cy, ring), limit, accept)
+                bound = _haversine_term(self._ring_bound(latitude, longitude, ring))
+                if bound > limit or (len(best) == k and bound >= -best[0][0]):
+                    break
+                ring += 1
+        return sorted((_distance(-term), key) for term, key in best)
+
+    def within(self, latitude, longitude, radius, accept=None):
+        """
+        Return every (distance, key) pair within radius meters of the point, nearest first.
+        """
+        query = self._query(latitude, longitude)
+        limit = _haversine_term(radius)
+        dlat = radius / METERS_PER_DEGREE
+        dlon = radius / (METERS_PER_DEGREE * max(math.cos(math.radians(min(abs(latitude) + dlat, 89.9))), 1e-6))
+        x0, y0 = self._cell(latitude - dlat, longitude - dlon)
+        x1, y1 = self._cell(latitude + dlat, longitude + dlon)
+        found = []
+        with self._lock:
+            if (x1 - x0 + 1) * (y1 - y0 + 1) > len(self._cells):
+                cells = [cell for cell in self._cells if x0 <= cell[0] <= x1 and y0 <= cell[1] <= y1]
+            else:
+                cells = [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+            phi0, lam0, cos0 = query
+            sin = math.sin
+            for cell in cells:
+                for key, (phi, lam, cos_phi) in self._cells.get(cell, {}).items():
+                    term = sin((phi - phi0) / 2) ** 2 + cos0 * cos_phi * sin((lam - lam0) / 2) ** 2
+                    if term <= limit and (accept is None or accept(key)):
+                        found.append((term, key))
+        found.sort()
+        return [(_distance(term), key) for term, key in found]
+
+    def _cell(self, latitude, longitude):
+        return math.floor(latitude / self.cell_size), math.floor(longitude / self.cell_size)
+
+    def _discard(self, key, cell):
+        # Called with the lock held.
+        bucket = self._cells[cell]
+        bucket.pop(key, None)
+        if not bucket:
+            del self._cells[cell]
+
+    def _collect(self, best, k, query, cells, limit, accept):
+        # Called with the lock held. Points are ranked by the haversine term, which
+        # orders them exactly like the distance without the square root and arcsine.
+        phi0, lam0, cos0 = query
+        sin = math.sin
+        for cell in cells:
+            bucket = self._cells.get(cell)
+            if not bucket:
+                continue
+            for key, (phi, lam, cos_phi) in bucket.items():
+                term = sin((phi - phi0) / 2) ** 2 + cos0 * cos_phi * sin((lam - lam0) / 2) ** 2
+                if term > limit:
+                    continue
+                if len(best) == k and term >= -best[0][0]:
+                    continue
+                if accept is not None and not accept(key):
+                    continue
+                if len(best) < k:
+                    heapq.heappush(best, (-term, key))
+                else:
+                    heapq.heapreplace(best, (-term, key))
+
+    @staticmethod
+    def _query(latitude, longitude):
+        phi = math.radians(latitude)
+        return phi, math.radians(longitude), math.cos(phi)
+
+    @staticmethod
+    def _ring(cx, cy, ring):
+        if ring == 0:
+            yield cx, cy
+            return
+        for x in range(cx - ring, cx + ring + 1):
+            yield x, cy - ring
+            yield x, cy + ring
+        for y in range(cy - ring + 1, cy + ring):
+            yield cx - ring, y
+            yield cx + ring, y
+
+    def _ring_bound(self, latitude, longitude, ring):
+        """
+        Lower bound in meters on the distance to any point outside the first `ring` rings.
+
+        The scanned rings form a square of cells around the query point; anything outside
+        it is at least as far as the nearest edge of that square. A degree of longitude is
+        shortest at the highest latitude the square reaches.
+        """
+        size = self.cell_size
+        lat_offset = latitude / size - math.floor(latitude / size)
+        lon_offset = longitude / size - math.floor(longitude / size)
+        lat_edge = (ring + min(lat_offset, 1 - lat_offset)) * size
+        lon_edge = (ring + min(lon_offset, 1 - lon_offset)) * size
+        highest = min(abs(latitude) + (ring + 1) * size, 90)
+        return METERS_PER_DEGREE * min(lat_edge, lon_edge * math.cos(math.radians(highest)))
+
+
+def _haversine_term(distance):
+    # The haversine term sin²(d / 2R) of a distance in meters, capped at half the globe.
+    return math.sin(min(distance / EARTH_RADIUS, math.pi) / 2) ** 2
+
+
+def _distance(term):
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(term)))
+
+
+def polygon_bounds(polygon):
+    """
+    Return (min_latitude, min_longitude, max_latitude, max_longitude) of a [[latitude, longitude], ...] ring.
+    """
+    latitudes = [point[0] for point in polygon]
+    longitudes = [point[1] for point in polygon]
+    return min(latitudes), min(longitudes), max(latitudes), max(longitudes)
+
+
+def point_in_polygon(latitude, longitude, polygon):
+    """
+    Return True if the point lies inside the [[latitude, longitude], ...] ring (even-odd rule).
+
+    Coordinates are treated as planar, which is accurate for delivery-zone sized polygons.
+    """
+    inside = False
+    previous_lat, previous_lon = polygon[-1][0], polygon[-1][1]
+    for point in polygon:
+        lat, lon = point[0], point[1]
+        if (lat > latitude) != (previous_lat > latitude):
+            crossing = lon + (latitude - lat) * (previous_lon - lon) / (previous_lat - lat)
+            if longitude < crossing:
+                inside = not inside
+        previous_lat, previous_lon = lat, lon
+    return inside
+
+
+class PolygonIndex:
+    """
+    In-memory grid index of keyed polygons for "which polygons contain this point" lookups.
+
+    Every polygon is registered in each `cell_size`-degree cell its bounding box overlaps.
+    A lookup reads the point's cell, rejects polygons by bounding box and runs the
+    point-in-polygon test only on the few left. set() and remove() touch only the cells
+    of that polygon.
+    """
+
+    def __init__(self, cell_size=0.05):
+        self.cell_size = cell_size
+        self._cells = defaultdict(set)
+        self._polygons = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._polygons)
+
+    def __contains__(self, key):
+        return key in self._polygons
+
+    def set(self, key, polygon):
+        """
+        Insert a polygon or replace an existing one.
+        """
+        polygon = tuple((float(point[0]), float(point[1])) for point in polygon)
+        bounds = polygon_bounds(polygon)
+        with self._lock:
+            self._discard(key)
+            self._polygons[key] = (bounds, polygon)
+            for cell in self._cells_of(bounds):
+                self._cells[cell].add(key)
+
+    def remove(self, key):
+        """
+        Remove a polygon; unknown keys are ignored.
+        """
+        with self._lock:
+            self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            self._polygons.clear()
+
+    def containing(self, latitude, longitude):
+        """
+        Return the keys of every polygon that contains the point.
+        """
+        cell = math.floor(latitude / self.cell_size), math.floor(longitude / self.cell_size)
+        found = []
+        with self._lock:
+            for key in self._cells.get(cell, ()):
+                (min_lat, min_lon, max_lat, max_lon), polygon = self._polygons[key]
+                if min_lat <= latitude <= max_lat and min_lon <= longitude <= max_lon \
+                        and point_in_polygon(latitude, longitude, polygon):
+                    found.append(key)
+        return found
+
+    def _cells_of(self, bounds):
+        min_lat, min_lon, max_lat, max_lon = bounds
+        size = self.cell_size
+        for x in range(math.floor(min_lat / size), math.floor(max_lat / size) + 1):
+            for y in range(math.floor(min_lon / size), math.floor(max_lon / size) + 1):
+                yield x, y
+
+    def _discard(self, key):
+        # Called with the lock held.
+        previous = self._polygons.pop(key, None)
+        if previous is None:
+            return
+        for cell in self._cells_of(previous[0]):
+            keys = self._cells.get(cell)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._cells[cell]
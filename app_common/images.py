@@ -0,0 +1,208 @@
+import io
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Bounding boxes of the generated variants; an image is scaled down to fit, never up.
+VARIANT_SIZES = {
+    'thumb': (160, 160),
+    'medium': (480, 480),
+    'large': (1080, 1080),
+}
+
+# Pillow format and save options of each variant format, by file extension.
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# EXIF orientations that swap the width and height of the stored pixels.
+_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+logger = logging.getLogger(__name__)
+
+
+def render_variants(file):
+    """
+    Return the (width, height) of an image file and its encoded variants.
+
+    The variants are {(size, extension): (data, width, height)} for every VARIANT_SIZES and
+    VARIANT_FORMATS pair. EXIF rotation is applied; JPEG variants of transparent images are
+    flattened on white. Each size is scaled from the next bigger one, and JPEG sources are
+    decoded at the smallest scale the largest variant allows.
+    """
+    image = Image.open(file)
+    width, height = image.size
+    if image.getexif().get(0x0112) in _TRANSPOSED_ORIENTATIONS:
+        width, height = height, width
+    largest = max(VARIANT_SIZES.values())
+    image.draft('RGB', (max(largest), max(largest)))
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    variants = {}
+    for size, box in sorted(VARIANT_SIZES.items(), key=lambda item: item[1], reverse=True):
+        image = image.copy()
+        image.thumbnail(box, Image.Resampling.LANCZOS)
+        for extension, (image_format, options) in VARIANT_FORMATS.items():
+            frame = image
+            if has_alpha and image_format == 'JPEG':
+                frame = Image.new('RGB', image.size, 'white')
+                frame.paste(image, mask=image.getchannel('A'))
+            buffer = io.BytesIO()
+            frame.save(buffer, image_format, **options)
+            variants[size, extension] = (buffer.getvalue(), *image.size)
+    return (width, height), variants
+
+
+def generate_variants(storage, name):
+    """
+    Render the variants of the stored image `name` and save them next to it, under variants/.
+
+    Returns the description stored on the model:
+    {"source": name, "width": ..., "height": ..., "sizes": {size: {extension:
+    {"name": ..., "width": ..., "height": ..., "bytes": ...}}}}, or with an "error"
+    instead of sizes when the file can't be read as an image.
+    """
+    try:
+        with storage.open(name, 'rb') as file:
+            (width, height), variants = render_variants(file)
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as error:
+        return {'source': name, 'error': str(error)}
+
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    sizes = {}
+    for (size, extension), (data, variant_width, variant_height) in variants.items():
+        target = posixpath.join(directory, 'variants', f'{stem}-{size}.{extension}')
+        saved = storage.save(target, ContentFile(data))
+        sizes.setdefault(size, {})[extension] = {
+            'name': saved, 'width': variant_width, 'height': variant_height, 'bytes': len(data),
+        }
+    return {'source': name, 'width': width, 'height': height, 'sizes': sizes}
+
+
+def variant_names(variants):
+    return [
+        variant['name'] for formats in variants.get('sizes', {}).values() for variant in formats.values()]
+
+
+def _delete_files(storage, names):
+    for name in names:
+        storage.delete(name)
+
+
+def variant_urls(variants, storage, size):
+    """
+    Return {extension: url} of one variant size from a stored description, or None if it isn't generated yet.
+    """
+    formats = variants.get('sizes', {}).get(size) if variants else None
+    if not formats:
+        return None
+    return {extension: storage.url(variant['name']) for extension, variant in formats.items()}
+
+
+def variant_urls_by_size(variants, storage):
+    """
+    Return {size: {extension: url} or None} for every VARIANT_SIZES size of a stored description.
+    """
+    return {size: variant_urls(variants, storage, size) for size in VARIANT_SIZES}
+
+
+def image_urls(file, variants):
+    """
+    Return {"url": ..., "variants": {size: {extension: url} or None}} of a stored image, or None without a file.
+    """
+    if not file:
+        return None
+    return {'url': file.url, 'variants': variant_urls_by_size(variants, file.storage)}
+
+
+def variants_stale(instance, field_name, variants_field):
+    """
+    Tell whether the instance's image has no variants generated from its current file.
+    """
+    name = getattr(instance, field_name).name
+    return bool(name) and (getattr(instance, variants_field) or {}).get('source') != name
+
+
+class ImageVariantWorker:
+    """
+    Generates image variants in background threads, once the upload's transaction has committed.
+
+    Each process has its own small thread pool, so uploads never wait on Pillow. A job
+    re-reads the row and saves the variants only if the image is still the one it rendered;
+    the files of the replaced variants are then deleted. Jobs pending when the process
+    dies are lost: `manage.py generate_image_variants` catches up on those.
+
+    With settings.IMAGE_VARIANTS_IN_BACKGROUND = False, jobs run inline on commit instead.
+    """
+
+    def __init__(self, max_workers=2):
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def schedule(self, model, pk, field_name, variants_field):
+        job = partial(self.run, model, pk, field_name, variants_field)
+        if getattr(settings, 'IMAGE_VARIANTS_IN_BACKGROUND', True):
+            transaction.on_commit(partial(self._submit, job))
+        else:
+            transaction.on_commit(job)
+
+    def _submit(self, job):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='image-variants')
+        self._executor.submit(self._run_in_background, job)
+
+    @staticmethod
+    def _run_in_background(job):
+        try:
+            job()
+        except Exception:
+            # nobody waits on the job's future, so this log is the only trace of the failure
+            model, pk = job.args[:2]
+            logger.exception("Generating image variants of %s %s failed.", model.__name__, pk)
+        finally:
+            # the worker thread opened a connection of its own; don't leak it
+            connection.close()
+
+    @staticmethod
+    def run(model, pk, field_name, variants_field, force=False):
+        """
+        Generate and save the variants of one row's image, unless they are up to date (or force).
+
+        Returns the generated description, or None when there was nothing to do.
+        """
+        instance = model.objects.filter(pk=pk).first()
+        if instance is None or not getattr(instance, field_name).name:
+            return None
+        if not force and not variants_stale(instance, field_name, variants_field):
+            return None
+        name = getattr(instance, field_name).name
+        storage = model._meta.get_field(field_name).storage
+        variants = generate_variants(storage, name)
+
+        with transaction.atomic():
+            instance = model.objects.select_for_update().filter(pk=pk, **{field_name: name}).first()
+            if instance is None:
+                # the image was replaced or deleted meanwhile
+                obsolete = variant_names(variants)
+            else:
+                obsolete = variant_names(getattr(instance, variants_field) or {})
+                setattr(instance, variants_field, variants)
+                instance.save(update_fields=[variants_field])
+        transaction.on_commit(partial(_delete_files, storage, obsolete))
+        return variants
+
+
+image_variants = ImageVariantWorker()
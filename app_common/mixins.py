@@ -0,0 +1,14 @@
+class EagerLoadingMixin:
+    """
+    Applies the serializer's eager-loading plan to the view's queryset.
+
+    Serializers opt in by defining a `setup_eager_loading(queryset)` classmethod.
+    The plan is applied in filter_queryset so views can keep overriding get_queryset.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, 'setup_eager_loading'):
+            queryset = serializer_class.setup_eager_loading(queryset)
+        return queryset
@@ -1,4 +1,12 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class CustomPagination(pagination.PageNumberPagination):
@@ -9,3 +17,148 @@ class CustomPagination(pagination.PageNumberPagination):
     page_size_query_param = 'page_size'
     max_page_size = 20
     page_query_param = 'page'
+
+
+class KeysetPagination(pagination.BasePagination):
+    """
+    Keyset (cursor) pagination.
+
+    Pages are fetched with `WHERE (ordering fields) after (last row seen)` instead of
+    OFFSET, and no COUNT(*) is run, so every page costs the same however deep it is.
+    The queryset's own order_by() is used when it has one (with `id` appended as a
+    tie-breaker), otherwise `ordering`.
+
+    Passing `?page=<n>` switches to page-number pagination for clients that need
+    numbered pages, such as the admin UI.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 20
+    cursor_query_param = 'cursor'
+    ordering = ('-created_at', '-id')
+    page_number_pagination_class = CustomPagination
+
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(queryset)
+        queryset = queryset.order_by(*self.ordering)
+
+        self.page_number_paginator = None
+        page_query_param = self.page_number_pagination_class.page_query_param
+        if page_query_param in request.query_params:
+            self.page_number_paginator = self.page_number_pagination_class()
+            return self.page_number_paginator.paginate_queryset(queryset, request, view)
+
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        position, reverse = self.decode_cursor(request)
+
+        ordering = self.reverse_ordering(self.ordering) if reverse else self.ordering
+        if reverse:
+            queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.after_position(queryset.model, ordering, position))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.page = results
+        self.has_next = has_more if not reverse else position is not None
+        self.has_previous = position is not None if not reverse else has_more
+        return results
+
+    def get_paginated_response(self, data):
+        if self.page_number_paginator is not None:
+            return self.page_number_paginator.get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, queryset):
+        """
+        Return the ordering of the page: the queryset's own order_by() or the default, ending with `id`.
+        """
+        ordering = tuple(field for field in queryset.query.order_by if isinstance(field, str)) or self.ordering
+        if ordering[-1].lstrip('-') not in ('id', 'pk'):
+            ordering += ('-id' if ordering[-1].startswith('-') else 'id',)
+        return ordering
+
+    @staticmethod
+    def reverse_ordering(ordering):
+        return tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
+
+    def after_position(self, model, ordering, position):
+        """
+        Build the lexicographic `(f1, f2, ...) > (v1, v2, ...)` filter for the given ordering.
+        """
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            try:
+                value = model._meta.get_field('id' if name == 'pk' else name).to_python(value)
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            position, reverse = cursor['p'], bool(cursor.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if (not isinstance(position, list) or len(position) != len(self.ordering)
+                or not all(isinstance(value, str) for value in position)):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, instance, reverse):
+        position = [str(getattr(instance, field.lstrip('-'))) for field in self.ordering]
+        cursor = {'p': position, 'r': 1} if reverse else {'p': position}
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
@@ -0,0 +1,194 @@
+import asyncio
+import threading
+from collections import defaultdict
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+# Events a slow subscriber may fall behind by before its oldest events are dropped.
+SUBSCRIPTION_QUEUE_SIZE = 100
+
+
+class Subscription:
+    """
+    An asyncio-side handle on one or more broker topics.
+
+    Events are queued on the subscriber's event loop. A subscriber that falls more than
+    `maxsize` events behind loses the oldest ones; `dropped` counts them so streams can
+    tell the client to resynchronize.
+    """
+
+    def __init__(self, broker, topics, maxsize=SUBSCRIPTION_QUEUE_SIZE):
+        self.broker = broker
+        self.topics = set(topics)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+        self.closed = False
+
+    async def get(self):
+        """
+        Wait for the next event.
+        """
+        return await self.queue.get()
+
+    def get_nowait(self):
+        return self.queue.get_nowait()
+
+    def deliver(self, event):
+        """
+        Queue an event from any thread.
+        """
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # the subscriber's loop is closed; it will never read again
+            self.broker.unsubscribe(self)
+
+    def add_topic(self, topic):
+        """
+        Also receive the events of another topic from now on.
+        """
+        self.broker.add_topic(self, topic)
+
+    def remove_topic(self, topic):
+        self.broker.remove_topic(self, topic)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.broker.unsubscribe(self)
+
+    def _put(self, event):
+        # Runs on the subscriber's loop.
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+
+class Broker:
+    """
+    Publish/subscribe interface for pushing events to open streams.
+
+    publish() may be called from any thread, including sync views; subscribe() is called
+    from the event loop that will read the events. Implementations decide how far events
+    travel: InMemoryBroker reaches the subscribers of this process only.
+    """
+
+    def publish(self, topic, event):
+        raise NotImplementedError
+
+    def subscribe(self, *topics, maxsize=SUBSCRIPTION_QUEUE_SIZE):
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+    def add_topic(self, subscription, topic):
+        raise NotImplementedError
+
+    def remove_topic(self, subscription, topic):
+        raise NotImplementedError
+
+    def subscriber_count(self, topic=None):
+        raise NotImplementedError
+
+
+class InMemoryBroker(Broker):
+    """
+    Broker that fans events out to the subscriptions of the current process.
+
+    Publishing to a topic without subscribers costs one dictionary lookup.
+    """
+
+    def __init__(self):
+        self._topics = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, topic, event):
+        with self._lock:
+            subscriptions = tuple(self._topics.get(topic, ()))
+        if len(subscriptions) == 1:
+            subscriptions[0].deliver(event)
+        elif subscriptions:
+            # one wake-up per event loop rather than one per subscriber
+            by_loop = defaultdict(list)
+            for subscription in subscriptions:
+                by_loop[subscription.loop].append(subscription)
+            for loop, group in by_loop.items():
+                try:
+                    loop.call_soon_threadsafe(_put_all, group, event)
+                except RuntimeError:
+                    for subscription in group:
+                        self.unsubscribe(subscription)
+        return len(subscriptions)
+
+    def subscribe(self, *topics, maxsize=SUBSCRIPTION_QUEUE_SIZE):
+        subscription = Subscription(self, topics, maxsize)
+        with self._lock:
+            for topic in subscription.topics:
+                self._topics[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                self._discard(subscription, topic)
+
+    def add_topic(self, subscription, topic):
+        with self._lock:
+            if not subscription.closed:
+                subscription.topics.add(topic)
+                self._topics[topic].add(subscription)
+
+    def remove_topic(self, subscription, topic):
+        with self._lock:
+            subscription.topics.discard(topic)
+            self._discard(subscription, topic)
+
+    def _discard(self, subscription, topic):
+        subscriptions = self._topics.get(topic)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._topics[topic]
+
+    def subscriber_count(self, topic=None):
+        with self._lock:
+            if topic is not None:
+                return len(self._topics.get(topic, ()))
+            return len({subscription for subscriptions in self._topics.values() for subscription in subscriptions})
+
+
+def _put_all(subscriptions, event):
+    for subscription in subscriptions:
+        subscription._put(event)
+
+
+_broker = None
+
+
+def get_broker() -> Broker:
+    """
+    Return the process-wide broker, an instance of settings.EVENT_BROKER (InMemoryBroker by default).
+    """
+    global _broker
+    if _broker is None:
+        _broker = import_string(getattr(settings, 'EVENT_BROKER', 'app_common.pubsub.InMemoryBroker'))()
+    return _broker
+
+
+def publish_on_commit(topic, event):
+    """
+    Publish the event once the current transaction commits, so streams never see rolled back changes.
+    """
+    transaction.on_commit(partial(get_broker().publish, topic, event))
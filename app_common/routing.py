@@ -0,0 +1,93 @@
+import math
+from functools import lru_cache
+
+from app_common.geo import haversine_distance
+
+
+@lru_cache(maxsize=1024)
+def distance_matrix(points):
+    """
+    Return the haversine distance matrix in meters of a tuple of (latitude, longitude) points.
+
+    Cached per tuple of points: planning the same batch again (another courier asking,
+    a retried claim) reuses the matrix instead of recomputing n² distances.
+    """
+    return tuple(
+        tuple(haversine_distance(*a, *b) for b in points)
+        for a in points
+    )
+
+
+def route_length(route, matrix):
+    """
+    Return the length of an open route (a sequence of matrix indexes) in meters.
+    """
+    return sum(matrix[a][b] for a, b in zip(route, route[1:]))
+
+
+def nearest_neighbour_route(matrix, start=0):
+    """
+    Return an open route from start that always moves to the closest unvisited stop.
+    """
+    unvisited = set(range(len(matrix))) - {start}
+    route = [start]
+    while unvisited:
+        last = matrix[route[-1]]
+        stop = min(unvisited, key=lambda candidate: (last[candidate], candidate))
+        unvisited.remove(stop)
+        route.append(stop)
+    return route
+
+
+def two_opt(route, matrix, max_passes=50):
+    """
+    Improve an open route by reversing segments while that shortens it; the first stop stays fixed.
+
+    Reversing route[i:j + 1] replaces the edges (i-1, i) and (j, j+1) with (i-1, j) and
+    (i, j+1); the last stop has no outgoing edge, so reversing a tail only swaps one edge.
+    """
+    route = list(route)
+    n = len(route)
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, n - 1):
+            for j in range(i + 1, n):
+                a, b = route[i - 1], route[i]
+                c = route[j]
+                before = matrix[a][b]
+                after = matrix[a][c]
+                if j + 1 < n:
+                    d = route[j + 1]
+                    before += matrix[c][d]
+                    after += matrix[b][d]
+                if after < before - 1e-9:
+                    route[i:j + 1] = reversed(route[i:j + 1])
+                    improved = True
+        if not improved:
+            break
+    return route
+
+
+def plan_route(origin, stops):
+    """
+    Return (stop order, length in meters) of a near-optimal open route from origin through every stop.
+
+    origin and stops are (latitude, longitude) pairs; the order lists indexes into stops.
+    Built with nearest-neighbour and refined with 2-opt.
+    """
+    if not stops:
+        return [], 0.0
+    matrix = distance_matrix((tuple(origin), *map(tuple, stops)))
+    route = two_opt(nearest_neighbour_route(matrix), matrix)
+    return [stop - 1 for stop in route[1:]], route_length(route, matrix)
+
+
+def bearing(origin, destination):
+    """
+    Return the initial compass bearing in degrees (0-360) from origin to destination.
+    """
+    phi1, phi2 = math.radians(origin[0]), math.radians(destination[0])
+    delta = math.radians(destination[1] - origin[1])
+    x = math.sin(delta) * math.cos(phi2)
+    y = math.cos(phi1) * math.sin(phi2) - math.sin(phi1) * math.cos(phi2) * math.cos(delta)
+    return math.degrees(math.atan2(x, y)) % 360
@@ -0,0 +1,166 @@
+import asyncio
+import json
+import re
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+# Seconds between keep-alive comments on an idle stream, so proxies don't close it.
+HEARTBEAT_INTERVAL = 15
+
+SSE_HEADERS = [
+    (b'content-type', b'text/event-stream'),
+    (b'cache-control', b'no-cache'),
+    (b'x-accel-buffering', b'no'),
+]
+
+
+def path_router(routes, default):
+    """
+    Return an ASGI application serving the given {path regex: ASGI app} routes and `default` for everything else.
+
+    The named groups of the matching regex are passed to the app in scope['url_route']['kwargs'].
+    Streams are mounted next to Django this way so an idle connection is only a
+    coroutine waiting on its subscription, not a request held inside Django's handler.
+    """
+    patterns = [(re.compile(pattern), app) for pattern, app in routes.items()]
+
+    async def application(scope, receive, send):
+        if scope['type'] == 'http':
+            for pattern, app in patterns:
+                match = pattern.fullmatch(scope['path'])
+                if match:
+                    scope = {**scope, 'url_route': {'kwargs': match.groupdict()}}
+                    return await app(scope, receive, send)
+        return await default(scope, receive, send)
+
+    return application
+
+
+def encode_event(event, event_id=None):
+    """
+    Encode one event dict as a Server-Sent Events message named after its `type`.
+    """
+    lines = [f"event: {event.get('type', 'message')}"]
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f"data: {json.dumps(event, separators=(',', ':'), default=str)}")
+    return ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+
+async def send_json(send, status, data):
+    body = json.dumps(data).encode('utf-8')
+    await send({'type': 'http.response.start', 'status': status, 'headers': [(b'content-type', b'application/json')]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def authenticate(scope):
+    """
+    Return the active user of the request's JWT access token, or None.
+
+    The token is read from the Authorization header or, for EventSource clients that
+    can't set headers, from the `token` query parameter. Costs one query per connection.
+    """
+    token = None
+    for name, value in scope.get('headers', ()):
+        if name == b'authorization':
+            parts = value.decode('latin-1').split()
+            if len(parts) == 2 and parts[0] in api_settings.AUTH_HEADER_TYPES:
+                token = parts[1]
+            break
+    if token is None:
+        token = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('token', [None])[0]
+    if not token:
+        return None
+    try:
+        user_id = AccessToken(token)[api_settings.USER_ID_CLAIM]
+    except (TokenError, KeyError):
+        return None
+    users = get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id, 'is_active': True})
+    return await sync_to_async(users.first)()
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+# Queued on an idle subscription to wake its stream up: time for a keep-alive, or the client left.
+_WAKE_UP = object()
+
+
+async def stream_events(receive, send, subscription, initial=(), heartbeat=HEARTBEAT_INTERVAL, transform=None):
+    """
+    Send the initial events, then every event of the subscription, until the client disconnects.
+
+    Events that arrive together go out in one write. If the subscriber fell behind and
+    events were dropped, a `resync` event tells the client to reload its state.
+    transform, if given, is called with each subscription event and returns the event
+    to send, or None to skip it.
+
+    The stream only ever waits on its subscription queue: the heartbeat timer and the
+    disconnect watcher wake it up through the queue, so delivering an event costs one
+    queue wake-up rather than a new wait on several futures.
+    """
+    await send({'type': 'http.response.start', 'status': 200, 'headers': SSE_HEADERS})
+    event_id = 0
+    dropped = 0
+    body = b': connected\n\n'
+    for event in initial:
+        event_id += 1
+        body += encode_event(event, event_id)
+    await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+
+    loop = asyncio.get_running_loop()
+    queue = subscription.queue
+    disconnected = False
+
+    def wake_up():
+        # an event already waiting wakes the stream anyway
+        if queue.empty():
+            queue.put_nowait(_WAKE_UP)
+
+    async def watch_disconnect():
+        nonlocal disconnected
+        await _wait_for_disconnect(receive)
+        disconnected = True
+        wake_up()
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    timer = loop.call_later(heartbeat, wake_up)
+    try:
+        while True:
+            events = [await subscription.get()]
+            while not queue.empty():
+                events.append(queue.get_nowait())
+            if disconnected:
+                break
+            events = [event for event in events if event is not _WAKE_UP]
+            if transform is not None:
+                events = [event for event in map(transform, events) if event is not None]
+            if subscription.dropped != dropped:
+                dropped = subscription.dropped
+                events.append({'type': 'resync'})
+            if events:
+                body = b''
+                for event in events:
+                    event_id += 1
+                    body += encode_event(event, event_id)
+            elif timer.when() <= loop.time():
+                body = b': keepalive\n\n'
+            else:
+                continue
+            try:
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+            except OSError:
+                break
+            timer.cancel()
+            timer = loop.call_later(heartbeat, wake_up)
+    finally:
+        timer.cancel()
+        watcher.cancel()
+        subscription.close()
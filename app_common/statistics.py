@@ -0,0 +1,28 @@
+from django.db.models import Count
+
+
+def count_by_status(queryset, field: str = 'order_status') -> dict:
+    """
+    Return a {status: count} mapping for the queryset with a single GROUP BY query.
+    """
+    rows = queryset.order_by().values(field).annotate(count=Count('pk'))
+    return {row[field]: row['count'] for row in rows}
+
+
+def status_statistics(queryset, status_keys: dict, total_key: str = 'total_orders', field: str = 'order_status') -> dict:
+    """
+    Build a statistics dict from one GROUP BY query.
+
+    status_keys maps each response key to the status it counts; total_key receives the
+    number of rows in the queryset.
+    """
+    return statistics_from_counts(count_by_status(queryset, field), status_keys, total_key)
+
+
+def statistics_from_counts(counts: dict, status_keys: dict, total_key: str = 'total_orders') -> dict:
+    """
+    Build a statistics dict from a {status: count} mapping.
+    """
+    stats = {key: counts.get(status, 0) for key, status in status_keys.items()}
+    stats[total_key] = sum(counts.values())
+    return stats
@@ -1,3 +1,243 @@
-from django.test import TestCase
+import asyncio
+import base64
+import json
+import random
 
-# Create your tests here.
+from django.utils import timezone
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from app_common.geo import PolygonIndex, SpatialIndex, haversine_distance, point_in_polygon
+from app_common.pubsub import InMemoryBroker
+from app_common.routing import bearing, distance_matrix, plan_route, route_length, two_opt
+from app_common.sse import encode_event, stream_events
+from app_branch.views import BranchStatistics
+from app_courier.views import MyDeliveredDeliveries
+from app_deliveries.models import OrderModel
+from app_deliveries.tests import OrderFixturesMixin
+
+
+class KeysetPaginationTest(OrderFixturesMixin, TestCase):
+    """
+    Keyset pagination walks an order feed without gaps or duplicates.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for _ in range(25):
+            cls.create_order()
+        # identical timestamps force the id tie-breaker to do the work
+        OrderModel.objects.update(created_at=timezone.now())
+        cls.expected = list(OrderModel.objects.order_by('-id').values_list('id', flat=True))
+
+    def get(self, url):
+        request = APIRequestFactory().get(url)
+        force_authenticate(request, user=self.courier_user)
+        response = MyDeliveredDeliveries.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_walk_forward_and_back(self):
+        pages = []
+        data = self.get('/')
+        self.assertIsNone(data['previous'])
+        while True:
+            pages.append([order['id'] for order in data['results']])
+            if data['next'] is None:
+                break
+            data = self.get(data['next'])
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(sum(pages, []), self.expected)
+
+        data = self.get(data['previous'])
+        self.assertEqual([order['id'] for order in data['results']], pages[1])
+        data = self.get(data['previous'])
+        self.assertEqual([order['id'] for order in data['results']], pages[0])
+
+    def test_page_number_opt_in(self):
+        data = self.get('/?page=2')
+        self.assertEqual(data['count'], 25)
+        self.assertEqual([order['id'] for order in data['results']], self.expected[10:20])
+
+    def test_invalid_cursor(self):
+        def encode(cursor):
+            return base64.urlsafe_b64encode(json.dumps(cursor).encode('utf-8')).decode('ascii')
+
+        cursors = ['not-a-cursor', encode({'p': ['abc', '1']}), encode({'p': [{'x': 1}, '1']}),
+                   encode({'p': [timezone.now().isoformat(), 'x']})]
+        for view_class, user in ((MyDeliveredDeliveries, self.courier_user), (BranchStatistics, self.branch_user)):
+            for cursor in cursors:
+                request = APIRequestFactory().get('/', {'cursor': cursor})
+                force_authenticate(request, user=user)
+                with self.subTest(view=view_class.__name__, cursor=cursor):
+                    self.assertEqual(view_class.as_view()(request).status_code, 404)
+
+
+class SpatialIndexTest(SimpleTestCase):
+    """
+    The grid index answers k-nearest and radius queries exactly like a brute-force scan.
+    """
+
+    def setUp(self):
+        rng = random.Random(7)
+        self.points = {key: (41.2 + rng.random() * 0.2, 69.2 + rng.random() * 0.2) for key in range(2000)}
+        self.index = SpatialIndex(cell_size=0.01)
+        for key, (latitude, longitude) in self.points.items():
+            self.index.set(key, latitude, longitude)
+
+    def brute_force(self, latitude, longitude):
+        return sorted(
+            (haversine_distance(latitude, longitude, *point), key) for key, point in self.points.items())
+
+    def test_queries_match_brute_force(self):
+        for latitude, longitude in ((41.3, 69.3), (41.2, 69.2), (41.45, 69.1), (40.0, 70.0)):
+            expected = self.brute_force(latitude, longitude)
+            self.assertEqual([key for _, key in self.index.nearest(latitude, longitude, k=7)],
+                             [key for _, key in expected[:7]])
+            self.assertEqual([key for _, key in self.index.within(latitude, longitude, 800)],
+                             [key for distance, key in expected if distance <= 800])
+
+        distance, key = self.index.nearest(41.3, 69.3)[0]
+        self.assertAlmostEqual(distance, haversine_distance(41.3, 69.3, *self.points[key]), places=3)
+
+    def test_incremental_updates(self):
+        self.index.set(0, 41.5, 69.5)
+        self.index.set(1, 41.5001, 69.5)
+        self.assertEqual([key for _, key in self.index.nearest(41.5, 69.5, k=2)], [0, 1])
+        self.index.remove(0)
+        self.assertNotIn(0, self.index)
+        self.assertEqual(len(self.index), 1999)
+        self.assertEqual(self.index.nearest(41.5, 69.5)[0][1], 1)
+
+    def test_filters(self):
+        even = [key for _, key in self.index.nearest(41.3, 69.3, k=5, accept=lambda key: key % 2 == 0)]
+        self.assertEqual(len(even), 5)
+        self.assertTrue(all(key % 2 == 0 for key in even))
+        self.assertEqual(self.index.nearest(40.0, 70.0, k=3, max_distance=1000), [])
+
+
+class PolygonIndexTest(SimpleTestCase):
+    """
+    The polygon index finds the same containing polygons as testing every one of them.
+    """
+    square = [[41.30, 69.20], [41.30, 69.30], [41.40, 69.30], [41.40, 69.20]]
+    # an L shape whose bounding box contains points outside the polygon
+    ell = [[41.30, 69.30], [41.30, 69.50], [41.35, 69.50], [41.35, 69.35], [41.50, 69.35], [41.50, 69.30]]
+
+    def test_point_in_polygon(self):
+        self.assertTrue(point_in_polygon(41.35, 69.25, self.square))
+        self.assertFalse(point_in_polygon(41.45, 69.25, self.square))
+        self.assertTrue(point_in_polygon(41.45, 69.32, self.ell))
+        self.assertFalse(point_in_polygon(41.45, 69.45, self.ell))
+
+    def test_containing(self):
+        index = PolygonIndex(cell_size=0.05)
+        index.set('square', self.square)
+        index.set('ell', self.ell)
+        self.assertEqual(index.containing(41.35, 69.25), ['square'])
+        self.assertEqual(index.containing(41.45, 69.45), [])
+        self.assertEqual(index.containing(41.32, 69.40), ['ell'])
+
+        index.set('ell', self.square)
+        self.assertEqual(sorted(index.containing(41.35, 69.25)), ['ell', 'square'])
+        self.assertEqual(index.containing(41.32, 69.40), [])
+        index.remove('square')
+        self.assertEqual(index.containing(41.35, 69.25), ['ell'])
+        self.assertEqual(len(index), 1)
+
+
+class RoutingTest(SimpleTestCase):
+    """
+    The route solver finds short open routes from the first stop.
+    """
+
+    def test_two_opt_removes_crossings(self):
+        origin = (41.30, 69.20)
+        stops = [(41.30, 69.22), (41.30, 69.21), (41.30, 69.24), (41.30, 69.23)]
+        order, length = plan_route(origin, stops)
+        self.assertEqual(order, [1, 0, 3, 2])
+        self.assertAlmostEqual(length, haversine_distance(*origin, *stops[2]), delta=1)
+
+        matrix = distance_matrix((origin, *stops))
+        crossed = [0, 3, 2, 1, 4]
+        self.assertLess(route_length(two_opt(crossed, matrix), matrix), route_length(crossed, matrix))
+        self.assertEqual(two_opt(crossed, matrix)[0], 0)
+
+    def test_bearing(self):
+        self.assertAlmostEqual(bearing((41.3, 69.2), (41.4, 69.2)), 0, places=3)
+        self.assertAlmostEqual(bearing((41.3, 69.2), (41.3, 69.3)), 90, delta=0.1)
+        self.assertAlmostEqual(bearing((41.3, 69.2), (41.2, 69.2)), 180, places=3)
+
+
+class PubSubTest(SimpleTestCase):
+    """
+    Events reach every subscription of their topic, and streams release their subscription.
+    """
+
+    def test_fan_out_and_drop_oldest(self):
+        async def scenario():
+            broker = InMemoryBroker()
+            first = broker.subscribe('a', 'b')
+            second = broker.subscribe('a', maxsize=2)
+            self.assertEqual(broker.publish('a', {'n': 1}), 2)
+            self.assertEqual(broker.publish('b', {'n': 2}), 1)
+            self.assertEqual(broker.publish('c', {'n': 3}), 0)
+            broker.publish('a', {'n': 4})
+            broker.publish('a', {'n': 5})
+            await asyncio.sleep(0)
+            self.assertEqual([first.get_nowait()['n'] for _ in range(4)], [1, 2, 4, 5])
+            self.assertEqual([second.get_nowait()['n'] for _ in range(2)], [4, 5])
+            self.assertEqual((first.dropped, second.dropped), (0, 1))
+            first.close()
+            self.assertEqual(broker.subscriber_count(), 1)
+            self.assertEqual(broker.subscriber_count('b'), 0)
+
+        asyncio.run(scenario())
+
+    def test_add_and_remove_topics(self):
+        async def scenario():
+            broker = InMemoryBroker()
+            subscription = broker.subscribe('a')
+            subscription.add_topic('b')
+            self.assertEqual(broker.publish('b', {'n': 1}), 1)
+            subscription.remove_topic('a')
+            self.assertEqual(broker.publish('a', {'n': 2}), 0)
+            subscription.close()
+            subscription.add_topic('c')
+            self.assertEqual(broker.subscriber_count(), 0)
+
+        asyncio.run(scenario())
+
+    def test_stream_events(self):
+        async def scenario():
+            broker = InMemoryBroker()
+            subscription = broker.subscribe('a', maxsize=1)
+            hang_up = asyncio.Event()
+            bodies = []
+
+            async def receive():
+                await hang_up.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                bodies.append(message.get('body'))
+
+            stream = asyncio.ensure_future(stream_events(
+                receive, send, subscription, initial=[{'type': 'state'}], heartbeat=0.05))
+            await asyncio.sleep(0)
+            broker.publish('a', {'type': 'offer', 'order_id': 1})
+            broker.publish('a', {'type': 'offer', 'order_id': 2})
+            await asyncio.sleep(0.08)
+            hang_up.set()
+            await stream
+            self.assertEqual(broker.subscriber_count(), 0)
+            return bodies
+
+        bodies = asyncio.run(scenario())
+        self.assertEqual(bodies[0], None)
+        self.assertEqual(bodies[1], b': connected\n\n' + encode_event({'type': 'state'}, 1))
+        # the first offer was dropped from the full queue, so the client is told to resync
+        self.assertEqual(
+            bodies[2], encode_event({'type': 'offer', 'order_id': 2}, 2) + encode_event({'type': 'resync'}, 3))
+        self.assertIn(b': keepalive\n\n', bodies[3:])
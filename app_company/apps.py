@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AppCompanyConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app_company'
+
+    def ready(self):
+        from app_company import signals  # noqa: F401
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-17 20:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_company', '0003_restaurantproductsmodel'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurantmodel',
+            name='logo_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Logo Variants'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.3 on 2026-10-17 20:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_company', '0004_image_variants'),
+        ('app_products', '0005_main_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RestaurantCategoryCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='restaurant_counts', to='app_products.categorymodel')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_counts', to='app_company.restaurantmodel')),
+            ],
+            options={
+                'verbose_name': 'Restaurant Category Count',
+                'verbose_name_plural': 'Restaurant Category Counts',
+                'unique_together': {('restaurant', 'category')},
+            },
+        ),
+    ]
@@ -2,7 +2,7 @@ from django.db import models
 from django.contrib.auth import get_user_model
 
 from app_common.models import BaseModel
-from app_products.models import ProductsModel
+from app_products.models import CategoryModel, ProductsModel
 
 User = get_user_model()
 
@@ -14,11 +14,14 @@ class RestaurantModel(BaseModel):
         name (str): The name of the restaurant unique.
         logo (ImageField): The logo of the restaurant.
         is_active (bool): Indicates whether the restaurant is active or not.
+        logo_variants (dict): The resized copies of the logo and their dimensions, filled in
+            after upload (see app_common.images.generate_variants).
     """
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="branch", null=True)
     name = models.CharField(max_length=100, verbose_name='Name', unique=True)
     logo = models.ImageField(upload_to="restaurant_logos/", verbose_name='Logo')
     is_active = models.BooleanField(default=True, verbose_name='Is Active')
+    logo_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name='Logo Variants')
 
     class Meta:
         verbose_name = "Restaurant"
@@ -46,3 +49,25 @@ class RestaurantProductsModel(models.Model):
 
     def __str__(self):
         return f"{self.restaurant.name} - {self.product.name}"
+
+
+class RestaurantCategoryCount(models.Model):
+    """
+    Represents the number of active products of one category on a restaurant's menu.
+    Maintained by app_branch.facets as menus and products change; a row may hold 0.
+    Attributes:
+        restaurant (RestaurantModel): The restaurant.
+        category (CategoryModel): The category.
+        count (int): Active, non-deleted products of the category on the restaurant's menu.
+    """
+    restaurant = models.ForeignKey(RestaurantModel, on_delete=models.CASCADE, related_name="category_counts")
+    category = models.ForeignKey(CategoryModel, on_delete=models.CASCADE, related_name="restaurant_counts")
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Restaurant Category Count"
+        verbose_name_plural = "Restaurant Category Counts"
+        unique_together = ('restaurant', 'category')
+
+    def __str__(self):
+        return f"{self.restaurant_id} - {self.category_id}: {self.count}"
@@ -14,10 +14,10 @@ class BranchSerializer(serializers.ModelSerializer):
 class CreateRestaurantProductSerializer(serializers.Serializer):
     product_ids = serializers.ListField(
         child=serializers.IntegerField(),
-        help_text="List of product IDs to add or remove."
+        help_text="List of product IDs to add or remove, or the whole menu for 'set'."
     )
     action = serializers.ChoiceField(
         choices=ActionChoice.choices,
         default=ActionChoice.ADD,
-        help_text="Action to perform: 'add' or 'remove'."
+        help_text="Action to perform: 'add', 'remove' or 'set' (replace the menu with product_ids)."
     )
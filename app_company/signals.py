@@ -0,0 +1,14 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from app_common.images import image_variants, variants_stale
+from app_company.models import RestaurantModel
+
+
+@receiver(post_save, sender=RestaurantModel)
+def restaurant_logo_uploaded(sender, instance, **kwargs):
+    """
+    Generate the variants of a new or replaced restaurant logo once the save commits.
+    """
+    if variants_stale(instance, 'logo', 'logo_variants'):
+        image_variants.schedule(RestaurantModel, instance.pk, 'logo', 'logo_variants')
@@ -1,3 +1,39 @@
 from django.test import TestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
 
-# Create your tests here.
+from app_branch.models import BranchProductsModel
+from app_company.models import RestaurantProductsModel
+from app_company.views import AddOrRemoveRestaurantProducts
+from app_deliveries.tests import OrderFixturesMixin
+from app_products.models import ProductsModel
+
+
+class RestaurantMenuSyncTest(OrderFixturesMixin, TestCase):
+    """
+    Setting a restaurant menu applies the difference, and removed products leave the branch menus.
+    """
+
+    def set_menu(self, product_ids):
+        request = APIRequestFactory().post('/', {'product_ids': product_ids, 'action': 'set'}, format='json')
+        force_authenticate(request, user=self.restaurant_user)
+        return AddOrRemoveRestaurantProducts.as_view()(request)
+
+    def test_set_menu(self):
+        products = ProductsModel.objects.bulk_create([
+            ProductsModel(name=f'Dish {n}', description='Dish', price=n, category=self.category) for n in range(3)])
+        ids = [product.pk for product in products]
+
+        response = self.set_menu(ids[:2] + [0])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['added'], response.data['removed']), (2, 0))
+        self.assertEqual(response.data['unknown_product_ids'], [0])
+        BranchProductsModel.objects.create(
+            branch=self.branch, restaurant=RestaurantProductsModel.objects.get(product_id=ids[0]))
+
+        response = self.set_menu(ids[1:])
+        self.assertEqual((response.data['added'], response.data['removed'], response.data['unchanged']), (1, 1, 1))
+        self.assertEqual(
+            set(RestaurantProductsModel.objects.filter(restaurant=self.restaurant).values_list('product_id', flat=True)),
+            set(ids[1:]),
+        )
+        self.assertFalse(BranchProductsModel.objects.filter(branch=self.branch).exists())
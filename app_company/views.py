@@ -1,20 +1,27 @@
 from datetime import timedelta
 
+from django.db import transaction
 from django.utils import timezone
 
 from rest_framework import viewsets, generics, status
 from rest_framework.exceptions import PermissionDenied
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.views import APIView
 
+from app_branch.facets import refresh_counts, refresh_restaurant_branch_counts
+from app_branch.menus import invalidate_restaurant_menus
 from app_branch.models import BranchModel, ActionChoice
+from app_common.bulk import existing_ids, sync_rows
+from app_common.pagination import KeysetPagination
 from app_common.premissions import IsRestaurant
+from app_common.statistics import statistics_from_counts
 from app_company.models import RestaurantModel, RestaurantProductsModel
 from app_company.serializers import BranchSerializer, CreateRestaurantProductSerializer
-from app_deliveries.models import OrderModel, OrderStatus
+from app_deliveries.models import OrderHourlyRollup, OrderModel, OrderStatus
+from app_deliveries.serializers import OrderSerializer
+from app_products.models import ProductsModel
 from app_users.models import UserRoleChoice
 
 
@@ -57,10 +64,59 @@ class BranchViewSet(viewsets.ModelViewSet):
 
 
 class AddOrRemoveRestaurantProducts(generics.CreateAPIView):
+    """
+    Add or remove products from the restaurant's menu.
+
+    With `"action": "set"`, product_ids is the restaurant's whole menu: missing products
+    are added and the others removed (from its branches' menus too), in one bulk insert
+    and one bulk delete. Unknown product IDs are ignored and listed in the response.
+    """
     serializer_class = CreateRestaurantProductSerializer
     permission_classes = [IsAuthenticated, IsRestaurant]
     queryset = RestaurantProductsModel.objects.all()
 
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if serializer.validated_data['action'] == ActionChoice.SET:
+            return self.set_menu(request, serializer.validated_data['product_ids'])
+        return super().create(request, *args, **kwargs)
+
+    def set_menu(self, request, product_ids):
+        """
+        Replace the restaurant's menu with the given products.
+        """
+        restaurant_id = RestaurantModel.objects.filter(user=request.user).values_list('id', flat=True).first()
+        if restaurant_id is None:
+            return Response(
+                data={"success": False, "message": "No restaurant found for this user."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        known = existing_ids(ProductsModel, product_ids)
+        with transaction.atomic():
+            result = sync_rows(
+                RestaurantProductsModel, 'restaurant_id', restaurant_id, 'product_id',
+                [product_id for product_id in product_ids if product_id in known],
+            )
+            if result.added or result.removed:
+                refresh_counts('restaurant', [restaurant_id])
+            if result.removed:
+                # removing products cascades to the branches' menus
+                invalidate_restaurant_menus(restaurant_id)
+                refresh_restaurant_branch_counts(restaurant_id)
+        return Response(
+            data={
+                "success": True,
+                "message": "Menu updated successfully.",
+                "added": result.added,
+                "removed": result.removed,
+                "unchanged": result.unchanged,
+                "unknown_product_ids": list(dict.fromkeys(
+                    product_id for product_id in product_ids if product_id not in known)),
+            },
+            status=status.HTTP_200_OK,
+        )
+
     def perform_create(self, serializer: CreateRestaurantProductSerializer):
         """
         Assign the product to the restaurant managed by the logged-in manager.
@@ -85,12 +141,15 @@ class AddOrRemoveRestaurantProducts(generics.CreateAPIView):
             message = f"Products added successfully."
         elif action == ActionChoice.REMOVE:
             restaurant.products.remove(*products)  # Remove products
+            invalidate_restaurant_menus(restaurant.pk)
+            refresh_restaurant_branch_counts(restaurant.pk)
             message = f"Products removed successfully."
         else:
             return Response(
                 data={"success": False, "message": "Invalid action."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
+        refresh_counts('restaurant', [restaurant.pk])
 
         return Response(
             data={
@@ -107,6 +166,8 @@ class RestaurantStatistics(APIView):
     """
     permission_classes = [IsAuthenticated, IsRestaurant]
     queryset = OrderModel.objects.all()
+    pagination_class = KeysetPagination
+    owner_lookup = 'restaurant__user'
     fbd_filters = {
         'weekly': timedelta(days=7),
         'monthly': timedelta(days=30),
@@ -116,6 +177,10 @@ class RestaurantStatistics(APIView):
         'delivered': OrderStatus.DELIVERED,
         'canceled': OrderStatus.CANCELED,
     }
+    stats_keys = {
+        'delivered': OrderStatus.DELIVERED,
+        'canceled': OrderStatus.CANCELED,
+    }
     fbm_filters = {
         'price_high_to_low': '-total_price',
         'price_low_to_high': 'total_price',
@@ -127,46 +192,56 @@ class RestaurantStatistics(APIView):
         """
         Get restaurant statistics.
         """
-        orders = self.queryset.filter(restaurant__user=request.user)
+        orders = self.get_queryset()
         fbd = request.GET.get('fbd')
         fbt = request.GET.get('fbt')
         fbm = request.GET.get('fbm')
 
         # Apply date filter
-        orders = self.apply_date_filter(orders, fbd)
+        start = self.get_start_date(fbd)
+        orders = self.apply_date_filter(orders, start)
 
         # Apply status filter
+        status_filter = {}
         if fbt in self.fbt_filters:
-            orders = orders.filter(order_status=self.fbt_filters[fbt])
+            status_filter['order_status'] = self.fbt_filters[fbt]
+            orders = orders.filter(**status_filter)
 
         # Apply sorting filter
         if fbm in self.fbm_filters:
             orders = orders.order_by(self.fbm_filters[fbm])
 
         # Paginate the orders
-        paginator = PageNumberPagination()
-        paginated_orders = paginator.paginate_queryset(orders, request)
+        paginator = self.pagination_class()
+        paginated_orders = paginator.paginate_queryset(OrderSerializer.setup_eager_loading(orders), request)
 
-        # Aggregate statistics
-        stats = {
-            "delivered": orders.filter(order_status=OrderStatus.DELIVERED).count(),
-            "canceled": orders.filter(order_status=OrderStatus.CANCELED).count(),
-            "total_orders": orders.count(),
-        }
+        # Aggregate statistics from the hourly rollups
+        totals = OrderHourlyRollup.status_totals(start, **{self.owner_lookup: request.user}, **status_filter)
+        stats = statistics_from_counts(
+            {order_status: total['orders_count'] for order_status, total in totals.items()}, self.stats_keys)
 
         # Return paginated response
         return paginator.get_paginated_response({
             "success": True,
-            "data": paginated_orders,
+            "data": OrderSerializer(paginated_orders, many=True).data,
             **stats,
         })
 
-    def apply_date_filter(self, orders, fbd: str):
-        """Apply the date filter to the orders queryset."""
+    def get_queryset(self):
+        """Return the orders of the requesting restaurant."""
+        return self.queryset.filter(**{self.owner_lookup: self.request.user})
+
+    def get_start_date(self, fbd: str):
+        """Return the start of the date filter range, or None for all orders."""
         if fbd == 'today':
-            start_of_today = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
-            return orders.filter(created_at__gte=start_of_today)
+            return timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
 
         elif fbd in self.fbd_filters:
-            return orders.filter(created_at__gte=timezone.now() - self.fbd_filters[fbd])
+            return timezone.now() - self.fbd_filters[fbd]
+        return None
+
+    def apply_date_filter(self, orders, start):
+        """Apply the date filter to the orders queryset."""
+        if start is not None:
+            return orders.filter(created_at__gte=start)
         return orders
\ No newline at end of file
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AppCourierConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app_courier'
+
+    def ready(self):
+        from app_courier import signals  # noqa: F401
@@ -0,0 +1,151 @@
+from collections import namedtuple
+
+from django.db import connection, transaction
+from django.db.models import Case, Exists, IntegerField, Value, When
+from django.utils import timezone
+
+from app_common.routing import bearing, plan_route
+from app_courier.dispatch import CLAIM_RETRIES, _claim_lock, active_orders, dispatch_queue, lock_idle_courier
+from app_deliveries.events import orders_claimed
+from app_deliveries.models import OrderHourlyRollup, OrderModel, OrderStatus
+
+# Most orders a courier carries in one batch.
+MAX_BATCH_ORDERS = 4
+
+# Orders are batched together when their bearings from the branch differ by at most this many degrees.
+MAX_BEARING_SPREAD = 45
+
+# How many of a branch's oldest waiting orders are considered when planning its batches.
+PLANNING_WINDOW = 50
+
+Batch = namedtuple('Batch', ['order_ids', 'route_length'])
+
+_PLAN_FIELDS = (
+    'id', 'restaurant_id', 'branch_id', 'created_at', 'total_price', 'total_items',
+    'branch__latitude', 'branch__longitude', 'delivery_address__latitude', 'delivery_address__longitude',
+)
+
+
+def group_by_direction(origin, destinations, max_orders=MAX_BATCH_ORDERS, max_spread=MAX_BEARING_SPREAD):
+    """
+    Split destinations into groups heading the same way from origin.
+
+    destinations is a list of (key, (latitude, longitude) or None), oldest first. The oldest
+    ungrouped destination seeds each group, which is filled with the ungrouped destinations
+    closest to its bearing (within max_spread / 2). Destinations without coordinates, or any
+    destination when origin is None, are grouped alone. Returns lists of keys, oldest seed first.
+    """
+    bearings = {}
+    if origin is not None:
+        bearings = {key: bearing(origin, point) for key, point in destinations if point is not None}
+    remaining = [key for key, _ in destinations]
+    groups = []
+    while remaining:
+        seed = remaining.pop(0)
+        if seed not in bearings:
+            groups.append([seed])
+            continue
+
+        def spread(key):
+            difference = abs(bearings[key] - bearings[seed]) % 360
+            return min(difference, 360 - difference)
+
+        companions = sorted(
+            (key for key in remaining if key in bearings and spread(key) <= max_spread / 2),
+            key=spread,
+        )[:max_orders - 1]
+        for key in companions:
+            remaining.remove(key)
+        groups.append([seed, *companions])
+    return groups
+
+
+def plan_batches(branch_id, max_orders=MAX_BATCH_ORDERS, max_spread=MAX_BEARING_SPREAD):
+    """
+    Return the Batch plan for the branch's oldest waiting orders, the batch of the oldest order first.
+
+    Each batch lists its orders in stop order along a nearest-neighbour + 2-opt route from
+    the branch; route_length is in meters, or None when the route can't be computed.
+    """
+    rows = list(dispatch_queue().filter(branch_id=branch_id).values(*_PLAN_FIELDS)[:PLANNING_WINDOW])
+    return [batch for batch, _ in _plan(rows, max_orders, max_spread)]
+
+
+def _plan(rows, max_orders, max_spread):
+    if not rows:
+        return []
+    first = rows[0]
+    origin = None
+    if first['branch__latitude'] is not None and first['branch__longitude'] is not None:
+        origin = (first['branch__latitude'], first['branch__longitude'])
+    by_id = {row['id']: row for row in rows}
+    destinations = [
+        (row['id'], (row['delivery_address__latitude'], row['delivery_address__longitude'])
+         if row['delivery_address__latitude'] is not None and row['delivery_address__longitude'] is not None else None)
+        for row in rows
+    ]
+    points = dict(destinations)
+    plan = []
+    for group in group_by_direction(origin, destinations, max_orders, max_spread):
+        if origin is None or points[group[0]] is None:
+            plan.append((Batch(group, None), [by_id[order_id] for order_id in group]))
+            continue
+        stops, length = plan_route(origin, [points[order_id] for order_id in group])
+        order_ids = [group[stop] for stop in stops]
+        plan.append((Batch(order_ids, length), [by_id[order_id] for order_id in order_ids]))
+    return plan
+
+
+def claim_next_batch(courier, max_orders=MAX_BATCH_ORDERS):
+    """
+    Assign the batch containing the oldest waiting order to the courier and return it, or None.
+
+    The orders get the courier and their stop_sequence in one conditional UPDATE; if another
+    courier took one of them in the meantime the claim is rolled back and planned again.
+    Locking, and CourierBusy for a courier with an order in progress, follow claim_next_order.
+    """
+    if connection.features.has_select_for_update_skip_locked:
+        return _claim_batch(courier, max_orders, skip_locked=True)
+    with _claim_lock:
+        return _claim_batch(courier, max_orders, skip_locked=False)
+
+
+def _claim_batch(courier, max_orders, skip_locked):
+    for _ in range(CLAIM_RETRIES):
+        with transaction.atomic():
+            lock_idle_courier(courier)
+            queue = dispatch_queue()
+            if skip_locked:
+                queue = queue.select_for_update(skip_locked=True, of=('self',))
+            head = queue.values_list('branch_id', flat=True)[:1]
+            if not head:
+                return None
+            rows = list(queue.filter(branch_id=head[0]).values(*_PLAN_FIELDS)[:PLANNING_WINDOW])
+            if not rows:
+                continue
+            batch, orders = _plan(rows, max_orders, MAX_BEARING_SPREAD)[0]
+            claimed = OrderModel.objects.filter(
+                ~Exists(active_orders(courier)), pk__in=batch.order_ids, order_status=OrderStatus.PENDING_COURIER,
+                courier__isnull=True,
+            ).update(
+                courier=courier,
+                stop_sequence=Case(
+                    *(When(pk=order_id, then=Value(position)) for position, order_id in enumerate(batch.order_ids, 1)),
+                    output_field=IntegerField(),
+                ),
+                updated_at=timezone.now(),
+            )
+            if claimed != len(batch.order_ids):
+                transaction.set_rollback(True)
+                continue
+            for order in orders:
+                hour = OrderHourlyRollup.hour_bucket(order['created_at'])
+                key = (order['restaurant_id'], order['branch_id'])
+                OrderHourlyRollup.move_order(
+                    (*key, None, OrderStatus.PENDING_COURIER, hour),
+                    (*key, courier.pk, OrderStatus.PENDING_COURIER, hour),
+                    order['total_price'], order['total_items'],
+                )
+            orders_claimed(batch.order_ids, courier.pk)
+            return batch
+    return None
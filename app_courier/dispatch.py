@@ -0,0 +1,135 @@
+import threading
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Exists
+from django.utils import timezone
+
+from app_deliveries.events import orders_claimed
+from app_deliveries.models import OrderHourlyRollup, OrderModel, OrderStatus
+from app_deliveries.proximity import nearest_couriers
+
+# Statuses in which an order keeps its courier busy.
+ACTIVE_ORDER_STATUSES = (
+    OrderStatus.PENDING_COURIER,
+    OrderStatus.PENDING_RESTAURANT,
+    OrderStatus.CONFIRMED_RESTAURANT,
+    OrderStatus.DELIVERING,
+)
+
+# How many candidates a claim tries before giving up when other couriers keep winning.
+CLAIM_RETRIES = 5
+
+# How many nearest couriers nearest_idle_couriers checks for every courier it returns.
+CANDIDATE_POOL_FACTOR = 4
+
+# Serializes claims inside one process on backends without row locks (SQLite).
+_claim_lock = threading.Lock()
+
+
+class CourierBusy(Exception):
+    """
+    Raised when a courier claims orders while it still has an order in progress.
+    """
+
+
+def dispatch_queue():
+    """
+    Return the unassigned orders waiting for a courier, oldest first.
+    """
+    return OrderModel.objects.filter(
+        order_status=OrderStatus.PENDING_COURIER,
+        courier__isnull=True,
+        is_deleted=False,
+    ).order_by('created_at', 'id')
+
+
+def active_orders(courier):
+    """
+    Return the courier's orders in progress.
+    """
+    return OrderModel.objects.filter(courier=courier, order_status__in=ACTIVE_ORDER_STATUSES)
+
+
+def is_idle(courier) -> bool:
+    """
+    Return True if the courier has no order in progress.
+    """
+    return not active_orders(courier).exists()
+
+
+def lock_idle_courier(courier):
+    """
+    Lock the courier's row for the current transaction, then raise CourierBusy unless it is idle.
+
+    Concurrent claims of one courier wait on the lock, so the second one sees the order
+    the first one took. Claiming UPDATEs also repeat the check as a NOT EXISTS, which
+    covers backends that ignore row locks.
+    """
+    list(get_user_model().objects.select_for_update().filter(pk=courier.pk).values_list('pk', flat=True))
+    if not is_idle(courier):
+        raise CourierBusy("Courier already has an order in progress")
+
+
+def nearest_idle_couriers(order_id, k=5, max_distance=None):
+    """
+    Return up to k (distance in meters, courier id) pairs of idle couriers nearest to the order's branch.
+
+    The nearest couriers come from the in-memory spatial index; the busy ones among
+    them are dropped with a single query. Returns [] if the branch has no coordinates.
+    """
+    branch = OrderModel.objects.filter(pk=order_id).values_list('branch__latitude', 'branch__longitude').first()
+    if branch is None or None in branch:
+        return []
+    candidates = nearest_couriers(*branch, k=k * CANDIDATE_POOL_FACTOR, max_distance=max_distance)
+    busy = set(OrderModel.objects.filter(
+        courier_id__in=[courier_id for _, courier_id in candidates], order_status__in=ACTIVE_ORDER_STATUSES,
+    ).values_list('courier_id', flat=True))
+    return [candidate for candidate in candidates if candidate[1] not in busy][:k]
+
+
+def claim_next_order(courier):
+    """
+    Assign the oldest unassigned order to the courier and return its id, or None if the queue is empty.
+
+    Where the database supports it the candidate row is locked with SELECT ... FOR UPDATE
+    SKIP LOCKED, so concurrent couriers each lock a different order instead of queueing on
+    the same one. Elsewhere claims are serialized in-process and the conditional UPDATE
+    on `courier IS NULL` guarantees an order is never assigned twice.
+
+    Raises CourierBusy if the courier has an order in progress. The check runs inside the
+    claiming transaction (see lock_idle_courier), so a courier can't claim two orders at once.
+    """
+    if connection.features.has_select_for_update_skip_locked:
+        return _claim(courier, skip_locked=True)
+    with _claim_lock:
+        return _claim(courier, skip_locked=False)
+
+
+def _claim(courier, skip_locked):
+    for _ in range(CLAIM_RETRIES):
+        with transaction.atomic():
+            lock_idle_courier(courier)
+            queue = dispatch_queue()
+            if skip_locked:
+                queue = queue.select_for_update(skip_locked=True)
+            candidate = queue.values_list(
+                'id', 'restaurant_id', 'branch_id', 'created_at', 'total_price', 'total_items').first()
+            if candidate is None:
+                return None
+            order_id, restaurant_id, branch_id, created_at, total_price, total_items = candidate
+            claimed = OrderModel.objects.filter(
+                ~Exists(active_orders(courier)), pk=order_id, order_status=OrderStatus.PENDING_COURIER,
+                courier__isnull=True,
+            ).update(courier=courier, updated_at=timezone.now())
+            if claimed:
+                # the order moves from the unassigned bucket to the courier's bucket
+                hour = OrderHourlyRollup.hour_bucket(created_at)
+                OrderHourlyRollup.move_order(
+                    (restaurant_id, branch_id, None, OrderStatus.PENDING_COURIER, hour),
+                    (restaurant_id, branch_id, courier.pk, OrderStatus.PENDING_COURIER, hour),
+                    total_price, total_items,
+                )
+                orders_claimed([order_id], courier.pk)
+                return order_id
+    return None
@@ -0,0 +1,192 @@
+import atexit
+import logging
+import threading
+from collections import namedtuple
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.utils import timezone
+
+from app_common.geo import SpatialIndex
+from app_courier.models import CourierLocationModel
+
+# A buffered batch is written once it holds this many points...
+FLUSH_SIZE = 1000
+# ...or once its oldest point has waited this many seconds.
+FLUSH_INTERVAL = 2.0
+
+Position = namedtuple('Position', ['latitude', 'longitude', 'accuracy', 'recorded_at'])
+
+logger = logging.getLogger(__name__)
+
+
+class LocationBuffer:
+    """
+    Collects courier location pings in memory and writes them in batched inserts.
+
+    Each worker process has its own buffer. A batch is written when it reaches
+    `flush_size` points or `flush_interval` seconds after its first point, whichever
+    comes first; the write happens outside the lock so new pings are never blocked
+    on the database. The latest position of every courier seen by this process is
+    kept in memory so position reads don't touch the database, and in a SpatialIndex
+    (`index`) for nearest-courier lookups.
+
+    Courier ids are checked against the user table the first time the buffer sees them, so
+    a bad id is refused with its own ping instead of failing a batch of other couriers'
+    points. A batch whose insert still fails (a courier deleted meanwhile, a database
+    error) is logged and retried once without the points of couriers that no longer
+    exist; points that can't be written are counted in `dropped_points`. A failed write
+    never raises into the request or timer that triggered it. Buffered points are lost
+    if the process dies before they are written; pings are frequent enough that the next
+    ones replace them.
+    """
+
+    def __init__(self, flush_size=FLUSH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending = []
+        self._latest = {}
+        self.index = SpatialIndex()
+        self._timer = None
+        self._couriers = set()
+        self.flushed_batches = 0
+        self.flushed_points = 0
+        self.dropped_points = 0
+
+    def add(self, courier_id, points, known=False):
+        """
+        Buffer the points of one courier and remember the most recent one as its position.
+
+        Points are (latitude, longitude, accuracy, recorded_at) tuples. Raises ValueError
+        if no user has the courier id; pass known=True when the id is the authenticated
+        user's, which skips the check.
+        """
+        if not points:
+            return
+        if known:
+            self._couriers.add(courier_id)
+        elif courier_id not in self._couriers:
+            if not get_user_model().objects.filter(pk=courier_id).exists():
+                raise ValueError(f"Unknown courier id {courier_id}.")
+            self._couriers.add(courier_id)
+        newest = max(points, key=lambda point: point[3])
+        with self._lock:
+            current = self._latest.get(courier_id)
+            if current is None or newest[3] >= current.recorded_at:
+                self._latest[courier_id] = Position(*newest)
+                self.index.set(courier_id, newest[0], newest[1])
+            self._pending.extend((courier_id, *point) for point in points)
+            batch = self._take_batch() if len(self._pending) >= self.flush_size else None
+            if batch is None and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self._flush_in_background)
+                self._timer.daemon = True
+                self._timer.start()
+        if batch:
+            self._write(batch)
+
+    def flush(self):
+        """
+        Write every buffered point now.
+        """
+        with self._lock:
+            batch = self._take_batch()
+        if batch:
+            self._write(batch)
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            # the timer thread opened a connection of its own; don't leak it
+            connection.close()
+
+    def latest(self, courier_id):
+        """
+        Return the last known Position of a courier, or None if it has not reported one.
+        """
+        return self._latest.get(courier_id)
+
+    def latest_positions(self):
+        """
+        Return a snapshot of {courier_id: Position} for every courier seen by this process.
+        """
+        with self._lock:
+            return dict(self._latest)
+
+    def clear(self):
+        """
+        Drop the buffered points and known positions without writing them.
+        """
+        with self._lock:
+            self._take_batch()
+            self._latest.clear()
+            self._couriers.clear()
+            self.index.clear()
+
+    def _take_batch(self):
+        # Called with the lock held.
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        return batch
+
+    def _write(self, batch):
+        """
+        Write a batch taken from the buffer, logging and counting whatever can't be written.
+        """
+        try:
+            self._insert(batch)
+            written = len(batch)
+        except Exception:
+            logger.exception(
+                "Writing %d courier location points failed; retrying without unknown couriers.", len(batch))
+            written = self._write_known(batch)
+        with self._lock:
+            if written:
+                self.flushed_batches += 1
+                self.flushed_points += written
+            self.dropped_points += len(batch) - written
+
+    def _write_known(self, batch):
+        # Retry a failed batch without the points of couriers that no longer exist; return the points written.
+        try:
+            known = set(get_user_model().objects.filter(
+                pk__in={point[0] for point in batch}).values_list('pk', flat=True))
+            with self._lock:
+                self._couriers &= known
+            kept = [point for point in batch if point[0] in known]
+            if kept:
+                self._insert(kept)
+            return len(kept)
+        except Exception:
+            logger.exception("Dropped %d courier location points that could not be written.", len(batch))
+            return 0
+
+    @staticmethod
+    def _insert(batch):
+        """
+        Insert the batch with one executemany() in one transaction.
+
+        The rows skip model instantiation and per-row SQL compilation, which dominate
+        the cost of bulk_create() at this volume.
+        """
+        meta = CourierLocationModel._meta
+        columns = [meta.get_field(name).column for name in (
+            'courier', 'latitude', 'longitude', 'accuracy', 'recorded_at', 'received_at')]
+        qn = connection.ops.quote_name
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            qn(meta.db_table), ', '.join(qn(column) for column in columns), ', '.join(['%s'] * len(columns)))
+        adapt = connection.ops.adapt_datetimefield_value
+        received_at = adapt(timezone.now())
+        rows = [
+            (courier_id, latitude, longitude, accuracy, adapt(recorded_at), received_at)
+            for courier_id, latitude, longitude, accuracy, recorded_at in batch
+        ]
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+
+
+location_buffer = LocationBuffer()
+atexit.register(location_buffer.flush)
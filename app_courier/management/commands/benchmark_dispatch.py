@@ -0,0 +1,87 @@
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from app_courier.dispatch import _claim_lock, claim_next_order
+from app_deliveries.models import OrderModel, OrderStatus
+from app_users.models import UserLocations, UserModel, UserRoleChoice
+
+
+class Command(BaseCommand):
+    """
+    Measure claim throughput with many couriers claiming from the dispatch queue at once.
+
+    The benchmark users and orders are deleted afterwards. Use a file-based database:
+    SQLite in-memory databases are not shared between threads.
+    """
+    help = "Benchmark concurrent courier order claiming and check that no order is assigned twice."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--couriers', type=int, default=50, help="Concurrent couriers.")
+        parser.add_argument('--orders', type=int, default=2000, help="Orders in the dispatch queue.")
+
+    def handle(self, *args, **options):
+        customer = UserModel.objects.create(username='benchmark-dispatch', phone_number='benchmark-dispatch')
+        couriers = UserModel.objects.bulk_create([
+            UserModel(username=f'benchmark-courier-{i}', phone_number=f'benchmark-c-{i}', role=UserRoleChoice.COURIER)
+            for i in range(options['couriers'])
+        ])
+        try:
+            location = UserLocations.objects.create(user=customer, address='Benchmark street')
+            OrderModel.objects.bulk_create([
+                OrderModel(user=customer, delivery_address=location, order_status=OrderStatus.PENDING_COURIER)
+                for _ in range(options['orders'])
+            ])
+            self.run_couriers(couriers)
+        finally:
+            OrderModel.objects.filter(user=customer).delete()
+            UserModel.objects.filter(pk__in=[customer.pk, *(courier.pk for courier in couriers)]).delete()
+
+    def run_couriers(self, couriers):
+        claims = []
+        errors = []
+        start = threading.Barrier(len(couriers) + 1)
+        # writes are serialized like the claims where those are
+        write_lock = nullcontext() if connection.features.has_select_for_update_skip_locked else _claim_lock
+
+        def work(courier):
+            start.wait()
+            try:
+                while (order_id := claim_next_order(courier)) is not None:
+                    claims.append((order_id, courier.pk))
+                    # deliver it at once, so the courier is idle for its next claim
+                    with write_lock:
+                        OrderModel.objects.filter(pk=order_id).update(order_status=OrderStatus.DELIVERED)
+            except Exception as exc:  # reported after all threads finish
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=work, args=(courier,)) for courier in couriers]
+        for thread in threads:
+            thread.start()
+        start.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        if errors:
+            raise CommandError(f"{len(errors)} courier(s) failed: {errors[0]!r}")
+        duplicates = [order_id for order_id, count in Counter(order_id for order_id, _ in claims).items() if count > 1]
+        assigned = dict(OrderModel.objects.filter(pk__in=[order_id for order_id, _ in claims]).values_list('pk', 'courier_id'))
+        mismatched = [order_id for order_id, courier_id in claims if assigned.get(order_id) != courier_id]
+        if duplicates or mismatched:
+            raise CommandError(f"Double assignment: {len(duplicates)} duplicate and {len(mismatched)} mismatched claims.")
+
+        self.stdout.write(
+            f"backend={connection.vendor} couriers={len(couriers)} claims={len(claims)} "
+            f"elapsed={elapsed:.2f}s throughput={len(claims) / elapsed:.0f} claims/s "
+            f"busiest={max(Counter(courier_id for _, courier_id in claims).values(), default=0)} "
+            f"double_assignments=0"
+        )
+        return claims
@@ -0,0 +1,84 @@
+import json
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from app_courier.locations import location_buffer
+from app_courier.models import CourierLocationModel
+from app_courier.views import LocationPings
+from app_users.models import UserModel, UserRoleChoice
+
+
+class Command(BaseCommand):
+    """
+    Measure location ping throughput of one worker through the full ping view.
+
+    Requests go through DRF dispatch (with forced authentication), validation and the in-memory
+    buffer, including the bulk inserts triggered along the way. The benchmark couriers
+    and their points are deleted afterwards.
+    """
+    help = "Benchmark courier location ping ingest and check that every point is written."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--couriers', type=int, default=200, help="Couriers sending pings.")
+        parser.add_argument('--requests', type=int, default=5000, help="Ping requests to send.")
+        parser.add_argument('--batch', type=int, default=10, help="Points per request.")
+
+    def handle(self, *args, **options):
+        couriers = UserModel.objects.bulk_create([
+            UserModel(username=f'benchmark-pinger-{i}', phone_number=f'benchmark-p-{i}', role=UserRoleChoice.COURIER)
+            for i in range(options['couriers'])
+        ])
+        try:
+            self.run_pings(couriers, options['requests'], options['batch'])
+        finally:
+            location_buffer.clear()
+            CourierLocationModel.objects.filter(courier__in=couriers).delete()
+            UserModel.objects.filter(pk__in=[courier.pk for courier in couriers]).delete()
+
+    def run_pings(self, couriers, total_requests, batch):
+        factory = APIRequestFactory()
+        view = LocationPings.as_view()
+        started_at = timezone.now()
+        requests = []
+        for n in range(total_requests):
+            courier = couriers[n % len(couriers)]
+            points = [
+                {
+                    'latitude': 41.3 + random.random() / 10,
+                    'longitude': 69.2 + random.random() / 10,
+                    'accuracy': 5,
+                    'recorded_at': (started_at + timedelta(seconds=n * batch + i)).isoformat(),
+                }
+                for i in range(batch)
+            ]
+            request = factory.post('/', json.dumps({'points': points}), content_type='application/json')
+            force_authenticate(request, user=courier)
+            requests.append(request)
+
+        batches_before = location_buffer.flushed_batches
+        started = time.perf_counter()
+        for request in requests:
+            response = view(request)
+            if response.status_code != 202:
+                raise CommandError(f"Ping rejected: {response.status_code} {response.data}")
+        location_buffer.flush()
+        elapsed = time.perf_counter() - started
+
+        expected = total_requests * batch
+        written = CourierLocationModel.objects.filter(courier__in=couriers).count()
+        if written != expected:
+            raise CommandError(f"Lost points: {expected} sent, {written} written.")
+
+        self.stdout.write(
+            f"backend={connection.vendor} couriers={len(couriers)} requests={total_requests} "
+            f"points={expected} elapsed={elapsed:.2f}s "
+            f"throughput={expected / elapsed:.0f} points/s ({total_requests / elapsed:.0f} requests/s) "
+            f"bulk_inserts={location_buffer.flushed_batches - batches_before} "
+            f"positions_in_memory={len(location_buffer.latest_positions())}"
+        )
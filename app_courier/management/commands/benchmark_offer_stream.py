@@ -0,0 +1,168 @@
+import asyncio
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from app_common.pubsub import get_broker
+from app_courier.offers import offer_order
+from app_courier.streams import courier_offers
+from app_courier.views import AcceptForDelivering, MarkAsDelivering
+from app_deliveries.events import COURIERS_TOPIC
+from app_deliveries.models import OrderModel
+from app_users.models import UserLocations, UserModel, UserRoleChoice
+
+
+class QueryCounter:
+    """
+    Counts the queries of every database connection opened while it is installed, in any thread.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def connection_created(self, sender, connection, **kwargs):
+        connection.execute_wrappers.append(self)
+
+
+class Command(BaseCommand):
+    """
+    Compare couriers polling for work with couriers holding an offer stream open.
+
+    Streams are driven in-process against the ASGI application: each connection is the
+    real handshake (JWT check and state query) followed by an idle subscription, so the
+    memory and fan-out numbers are those of one worker without the server's own sockets.
+    The benchmark users and order are deleted afterwards.
+    """
+    help = "Benchmark idle offer stream connections per worker and the query rate against polling."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=5000, help="Idle courier streams to open.")
+        parser.add_argument('--poll-interval', type=float, default=5, help="Seconds between polls of a polling courier.")
+        parser.add_argument('--reconnect-interval', type=float, default=300,
+                            help="Average seconds a stream stays open before the app reconnects.")
+        parser.add_argument('--orders-per-minute', type=float, default=60, help="New orders offered per minute.")
+
+    def handle(self, *args, **options):
+        courier = UserModel.objects.create(
+            username='benchmark-streamer', phone_number='benchmark-streamer', role=UserRoleChoice.COURIER)
+        customer = UserModel.objects.create(username='benchmark-stream-customer', phone_number='benchmark-sc')
+        try:
+            token = str(AccessToken.for_user(courier))
+            poll_queries = self.measure_polling(token)
+            offer_queries = self.measure_offer(customer)
+            stream = asyncio.run(self.run_streams(token, options['connections']))
+        finally:
+            OrderModel.objects.filter(user=customer).delete()
+            UserModel.objects.filter(pk__in=[courier.pk, customer.pk]).delete()
+
+        couriers = options['connections']
+        orders_per_second = options['orders_per_minute'] / 60
+        polling_rate = couriers * poll_queries / options['poll_interval']
+        streaming_rate = (
+            couriers * stream['handshake_queries'] / options['reconnect_interval'] + orders_per_second * offer_queries
+        )
+        self.stdout.write(
+            f"streams={couriers} open={stream['open']:.2f}s "
+            f"memory_per_stream={stream['memory'] / couriers / 1024:.1f}KiB "
+            f"fanout_to_all={stream['fanout'] * 1e3:.1f}ms handshake_queries={stream['handshake_queries']}\n"
+            f"polling: {poll_queries} queries per poll, every {options['poll_interval']:g}s "
+            f"-> {polling_rate:.0f} queries/s\n"
+            f"streaming: {stream['handshake_queries']} queries per connection (reconnect every "
+            f"{options['reconnect_interval']:g}s) + {offer_queries} per offered order "
+            f"({options['orders_per_minute']:g}/min) -> {streaming_rate:.1f} queries/s "
+            f"({polling_rate / streaming_rate:.0f}x fewer)"
+        )
+
+    def measure_polling(self, token):
+        """
+        Queries one polling cycle costs: an idle courier asking both work endpoints.
+        """
+        factory = APIRequestFactory()
+        with CaptureQueriesContext(connection) as queries:
+            for view in (AcceptForDelivering, MarkAsDelivering):
+                response = view.as_view()(factory.post('/', HTTP_AUTHORIZATION=f'Bearer {token}'))
+                if response.status_code != 400:
+                    raise CommandError(f"Unexpected poll response: {response.status_code}")
+        return len(queries)
+
+    def measure_offer(self, customer):
+        """
+        Queries offering one new order costs, whatever the number of connected couriers.
+        """
+        location = UserLocations.objects.create(user=customer, address='Benchmark street')
+        order = OrderModel.objects.create(user=customer, delivery_address=location)
+        with CaptureQueriesContext(connection) as queries:
+            offer_order(order.pk)
+        return len(queries)
+
+    async def run_streams(self, token, count):
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': '/api/courier/offers/stream/', 'query_string': b'',
+            'headers': [(b'authorization', f'Bearer {token}'.encode())],
+        }
+        received = [0] * count
+        all_received = asyncio.Event()
+        all_open = asyncio.Event()
+        hang_up = asyncio.Event()
+        delivered = 0
+        opened = 0
+
+        def make_send(n):
+            async def send(message):
+                nonlocal delivered, opened
+                body = message.get('body', b'')
+                if body.startswith(b': connected'):
+                    opened += 1
+                    if opened == count:
+                        all_open.set()
+                elif b'event: offer' in body:
+                    received[n] += 1
+                    delivered += 1
+                    if delivered == count:
+                        all_received.set()
+            return send
+
+        async def receive():
+            await hang_up.wait()
+            return {'type': 'http.disconnect'}
+
+        broker = get_broker()
+        counter = QueryCounter()
+        connection_created.connect(counter.connection_created)
+        tracemalloc.start()
+        try:
+            before = tracemalloc.take_snapshot()
+            started = time.perf_counter()
+            streams = [asyncio.ensure_future(courier_offers(scope, receive, make_send(n))) for n in range(count)]
+            await asyncio.wait_for(all_open.wait(), timeout=600)
+            open_time = time.perf_counter() - started
+            memory = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(before, 'filename'))
+        finally:
+            tracemalloc.stop()
+            connection_created.disconnect(counter.connection_created)
+
+        started = time.perf_counter()
+        broker.publish(COURIERS_TOPIC, {'type': 'offer', 'order_id': 0})
+        await asyncio.wait_for(all_received.wait(), timeout=60)
+        fanout = time.perf_counter() - started
+
+        hang_up.set()
+        await asyncio.gather(*streams)
+        if broker.subscriber_count():
+            raise CommandError("Streams left subscriptions behind.")
+        if received != [1] * count:
+            raise CommandError("Not every stream received the offer exactly once.")
+        return {
+            'open': open_time, 'memory': memory, 'fanout': fanout,
+            'handshake_queries': round(counter.count / count),
+        }
@@ -0,0 +1,89 @@
+import itertools
+import math
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from app_common.geo import METERS_PER_DEGREE
+from app_common.routing import distance_matrix, nearest_neighbour_route, plan_route, route_length
+from app_courier.batching import MAX_BEARING_SPREAD, group_by_direction
+
+
+class Command(BaseCommand):
+    """
+    Measure the route solver and direction batching on synthetic order sets, without a database.
+
+    For every route size the solver is compared with plain nearest-neighbour and, up to
+    --exact-limit stops, with the optimal route found by brute force. Batching is measured
+    as the distance driven per order for a branch's waiting orders.
+    """
+    help = "Benchmark multi-stop route planning and order batching on synthetic orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='3,4,6,8,12,20', help="Comma-separated stops per route.")
+        parser.add_argument('--trials', type=int, default=200, help="Random routes per size.")
+        parser.add_argument('--exact-limit', type=int, default=8, help="Largest route solved by brute force.")
+        parser.add_argument('--radius', type=float, default=5000, help="Delivery radius around the branch in meters.")
+        parser.add_argument('--orders', type=int, default=40, help="Waiting orders in the batching scenario.")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        origin = (41.3, 69.28)
+
+        def destination():
+            distance = options['radius'] * math.sqrt(rng.random()) / METERS_PER_DEGREE
+            angle = rng.random() * 2 * math.pi
+            return (
+                origin[0] + distance * math.cos(angle),
+                origin[1] + distance * math.sin(angle) / math.cos(math.radians(origin[0])),
+            )
+
+        for size in (int(size) for size in options['sizes'].split(',')):
+            distance_matrix.cache_clear()
+            stop_sets = [[destination() for _ in range(size)] for _ in range(options['trials'])]
+            nn_lengths, solved_lengths, optimal_lengths, solve_times = [], [], [], []
+            for stops in stop_sets:
+                # computed outside the cache so the timed solve below starts cold
+                matrix = distance_matrix.__wrapped__((origin, *stops))
+                nn_lengths.append(route_length(nearest_neighbour_route(matrix), matrix))
+                started = time.perf_counter()
+                _, length = plan_route(origin, stops)
+                solve_times.append(time.perf_counter() - started)
+                solved_lengths.append(length)
+                if size <= options['exact_limit']:
+                    optimal_lengths.append(min(
+                        route_length((0, *order), matrix) for order in itertools.permutations(range(1, size + 1))))
+
+            started = time.perf_counter()
+            for stops in stop_sets:
+                plan_route(origin, stops)
+            cached = (time.perf_counter() - started) / len(stop_sets)
+
+            line = (
+                f"stops={size} solve={sum(solve_times) / len(solve_times) * 1e3:.3f}ms "
+                f"solve_cached_matrix={cached * 1e3:.3f}ms "
+                f"nn={sum(nn_lengths) / len(nn_lengths):.0f}m nn+2opt={sum(solved_lengths) / len(solved_lengths):.0f}m"
+            )
+            if optimal_lengths:
+                gaps = [solved / optimal - 1 for solved, optimal in zip(solved_lengths, optimal_lengths)]
+                line += (
+                    f" optimal={sum(optimal_lengths) / len(optimal_lengths):.0f}m "
+                    f"gap_avg={sum(gaps) / len(gaps) * 100:.2f}% gap_max={max(gaps) * 100:.2f}% "
+                    f"optimal_found={sum(gap < 1e-9 for gap in gaps) / len(gaps) * 100:.0f}%"
+                )
+            self.stdout.write(line)
+
+        orders = [(key, destination()) for key in range(options['orders'])]
+        points = dict(orders)
+        single = sum(plan_route(origin, [point])[1] for _, point in orders)
+        started = time.perf_counter()
+        groups = group_by_direction(origin, orders)
+        batched = sum(plan_route(origin, [points[key] for key in group])[1] for group in groups)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"batching orders={len(orders)} batches={len(groups)} spread={MAX_BEARING_SPREAD}deg "
+            f"plan={elapsed * 1e3:.2f}ms outbound_per_order: single={single / len(orders):.0f}m "
+            f"batched={batched / len(orders):.0f}m"
+        )
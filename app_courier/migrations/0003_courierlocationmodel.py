@@ -0,0 +1,33 @@
+# Generated by Django 5.1.3 on 2026-10-17 19:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_courier', '0002_alter_couriermodel_user'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourierLocationModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('latitude', models.FloatField(verbose_name='Latitude')),
+                ('longitude', models.FloatField(verbose_name='Longitude')),
+                ('accuracy', models.FloatField(blank=True, null=True, verbose_name='Accuracy')),
+                ('recorded_at', models.DateTimeField(verbose_name='Recorded At')),
+                ('received_at', models.DateTimeField(auto_now_add=True, verbose_name='Received At')),
+                ('courier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='location_pings', to=settings.AUTH_USER_MODEL, verbose_name='Courier')),
+            ],
+            options={
+                'verbose_name': 'Courier Location',
+                'verbose_name_plural': 'Courier Locations',
+                'indexes': [models.Index(fields=['courier', 'recorded_at'], name='courier_location_recorded_idx')],
+            },
+        ),
+    ]
@@ -24,3 +24,36 @@ class CourierModel(BaseModel):
 
     def __str__(self):
         return self.name
+
+
+class CourierLocationModel(models.Model):
+    """
+    CourierLocationModel is one GPS point reported by a courier's device.
+    latitude / longitude: Position in degrees (WGS 84).
+    accuracy: Reported accuracy radius in meters, if the device sent one.
+    recorded_at: When the device took the reading.
+    received_at: When the server wrote the point.
+
+    Points are append-only and are written in batches by app_courier.locations.
+    """
+    courier = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="location_pings",
+        verbose_name="Courier"
+    )
+    latitude = models.FloatField(verbose_name="Latitude")
+    longitude = models.FloatField(verbose_name="Longitude")
+    accuracy = models.FloatField(null=True, blank=True, verbose_name="Accuracy")
+    recorded_at = models.DateTimeField(verbose_name="Recorded At")
+    received_at = models.DateTimeField(auto_now_add=True, verbose_name="Received At")
+
+    class Meta:
+        verbose_name = "Courier Location"
+        verbose_name_plural = "Courier Locations"
+        indexes = [
+            models.Index(fields=['courier', 'recorded_at'], name='courier_location_recorded_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.courier_id}: {self.latitude}, {self.longitude}"
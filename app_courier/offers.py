@@ -0,0 +1,37 @@
+from app_common.pubsub import get_broker
+from app_courier.dispatch import nearest_idle_couriers
+from app_deliveries.events import COURIERS_TOPIC, courier_topic
+from app_deliveries.models import OrderModel, OrderStatus
+
+# How many of the nearest idle couriers a new order is offered to.
+OFFER_FANOUT = 5
+
+
+def offer_order(order_id):
+    """
+    Push a new order to the nearest idle couriers, or to every connected courier.
+
+    Orders whose branch has no coordinates, or with no located idle courier nearby, are
+    broadcast. Returns the number of subscriptions the offer reached in this process.
+    """
+    order = OrderModel.objects.filter(
+        pk=order_id, order_status=OrderStatus.PENDING_COURIER, courier__isnull=True,
+    ).values('id', 'branch_id', 'total_price', 'total_items', 'created_at').first()
+    if order is None:
+        return 0
+    event = {
+        'type': 'offer',
+        'order_id': order['id'],
+        'branch_id': order['branch_id'],
+        'total_price': str(order['total_price']),
+        'total_items': order['total_items'],
+        'created_at': order['created_at'].isoformat(),
+    }
+    broker = get_broker()
+    couriers = nearest_idle_couriers(order_id, k=OFFER_FANOUT)
+    if not couriers:
+        return broker.publish(COURIERS_TOPIC, event)
+    return sum(
+        broker.publish(courier_topic(courier_id), {**event, 'distance': round(distance)})
+        for distance, courier_id in couriers
+    )
@@ -1 +1,84 @@
+import math
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework import serializers
+
+from app_courier.batching import MAX_BATCH_ORDERS
+
+# The most points a single ping request may carry.
+MAX_PINGS_PER_BATCH = 500
+
+
+class LocationPointsField(serializers.Field):
+    """
+    A list of GPS points, each `{"latitude", "longitude", "accuracy"?, "recorded_at"}`.
+
+    Validated into (latitude, longitude, accuracy, recorded_at) tuples. Points are checked
+    by hand rather than with a nested serializer: pings are the hottest write path and a
+    nested serializer costs more per point than the buffered write itself.
+    """
+    default_error_messages = {
+        'not_a_list': 'Expected a list of points.',
+        'empty': 'This list may not be empty.',
+        'max_length': f'Ensure this field has no more than {MAX_PINGS_PER_BATCH} points.',
+        'invalid_point': 'Point {index}: {message}',
+    }
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            self.fail('not_a_list')
+        if not data:
+            self.fail('empty')
+        if len(data) > MAX_PINGS_PER_BATCH:
+            self.fail('max_length')
+        return [self.to_point(index, point) for index, point in enumerate(data)]
+
+    def to_point(self, index, point):
+        try:
+            latitude = self.to_coordinate(point['latitude'], 90)
+            longitude = self.to_coordinate(point['longitude'], 180)
+            accuracy = point.get('accuracy')
+            if accuracy is not None:
+                accuracy = float(accuracy)
+                if not accuracy >= 0:
+                    raise ValueError('accuracy must be a positive number.')
+            recorded_at = parse_datetime(point['recorded_at'])
+            if recorded_at is None:
+                raise ValueError('recorded_at must be an ISO 8601 datetime.')
+        except KeyError as exc:
+            self.fail('invalid_point', index=index, message=f'{exc.args[0]} is required.')
+        except (TypeError, ValueError, AttributeError) as exc:
+            self.fail('invalid_point', index=index, message=exc)
+        if timezone.is_naive(recorded_at):
+            recorded_at = timezone.make_aware(recorded_at)
+        return latitude, longitude, accuracy, recorded_at
+
+    @staticmethod
+    def to_coordinate(value, limit):
+        if isinstance(value, bool):
+            raise TypeError('coordinates must be numbers.')
+        value = float(value)
+        if not math.isfinite(value) or not -limit <= value <= limit:
+            raise ValueError(f'coordinates must be between -{limit} and {limit}.')
+        return value
+
+    def to_representation(self, value):
+        return [
+            {'latitude': latitude, 'longitude': longitude, 'accuracy': accuracy, 'recorded_at': recorded_at}
+            for latitude, longitude, accuracy, recorded_at in value
+        ]
+
+
+class LocationBatchSerializer(serializers.Serializer):
+    """
+    Serializer for a batch of GPS points sent by a courier's device in one request.
+    """
+    points = LocationPointsField()
+
+
+class ClaimBatchSerializer(serializers.Serializer):
+    """
+    Serializer for claiming a batch of orders.
+    """
+    max_orders = serializers.IntegerField(min_value=1, max_value=MAX_BATCH_ORDERS, default=MAX_BATCH_ORDERS)
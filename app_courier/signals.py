@@ -0,0 +1,17 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from app_courier.offers import offer_order
+from app_deliveries.models import OrderModel, OrderStatus
+
+
+@receiver(post_save, sender=OrderModel)
+def order_created(sender, instance, created, **kwargs):
+    """
+    Offer a new order to couriers once it is committed.
+    """
+    if created and instance.order_status == OrderStatus.PENDING_COURIER and instance.courier_id is None:
+        transaction.on_commit(partial(offer_order, instance.pk))
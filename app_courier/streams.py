@@ -0,0 +1,48 @@
+from asgiref.sync import sync_to_async
+
+from app_common.pubsub import get_broker
+from app_common.sse import authenticate, send_json, stream_events
+from app_courier.dispatch import ACTIVE_ORDER_STATUSES
+from app_deliveries.events import COURIERS_TOPIC, courier_topic
+from app_deliveries.models import OrderModel
+from app_users.models import UserRoleChoice
+
+
+def _active_orders(courier_id):
+    return [
+        {'order_id': order_id, 'order_status': order_status}
+        for order_id, order_status in OrderModel.objects.filter(
+            courier_id=courier_id, order_status__in=ACTIVE_ORDER_STATUSES,
+        ).order_by('created_at', 'id').values_list('id', 'order_status')
+    ]
+
+
+async def courier_offers(scope, receive, send):
+    """
+    Server-Sent Events stream of order offers and status changes for the authenticated courier.
+
+    Mounted in config/asgi.py at /api/courier/offers/stream/ (ASGI servers only). The stream
+    opens with a `state` event listing the courier's active orders, then pushes:
+    - `offer`: a new order waiting for a courier,
+    - `taken`: offered orders another courier claimed,
+    - `assigned`: orders claimed by this courier,
+    - `status`: a status change of one of the courier's orders,
+    - `resync`: events were dropped; reload the state.
+    After the two queries of the handshake an open stream costs no database queries.
+    """
+    if scope['method'] != 'GET':
+        return await send_json(send, 405, {'success': False, 'message': 'Method not allowed'})
+    user = await authenticate(scope)
+    if user is None:
+        return await send_json(send, 401, {'success': False, 'message': 'Authentication required'})
+    if user.role != UserRoleChoice.COURIER:
+        return await send_json(send, 403, {'success': False, 'message': 'Only couriers can listen for offers'})
+
+    # subscribe before reading the state so no change falls between the two
+    subscription = get_broker().subscribe(courier_topic(user.pk), COURIERS_TOPIC)
+    try:
+        orders = await sync_to_async(_active_orders)(user.pk)
+    except BaseException:
+        subscription.close()
+        raise
+    await stream_events(receive, send, subscription, initial=[{'type': 'state', 'orders': orders}])
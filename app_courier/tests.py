@@ -1,3 +1,296 @@
+import asyncio
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken
+
+from app_branch.models import BranchModel
+from app_common.geo import haversine_distance
+from app_common.pubsub import get_broker
+from app_courier.batching import claim_next_batch, group_by_direction
+from app_courier.dispatch import CourierBusy, claim_next_order, is_idle, nearest_idle_couriers
+from app_courier.locations import LocationBuffer, location_buffer
+from app_courier.models import CourierLocationModel
+from app_courier.streams import courier_offers
+from app_courier.views import LocationPings
+from app_deliveries.events import COURIERS_TOPIC, courier_topic
+from app_deliveries.models import OrderHourlyRollup, OrderModel, OrderStatus
+from app_deliveries.services import transition_next_order
+from app_deliveries.tests import OrderFixturesMixin
+from app_users.models import UserLocations, UserModel, UserRoleChoice
+
+
+class DispatchFixturesMixin(OrderFixturesMixin):
+    """
+    Builds orders waiting in the dispatch queue.
+    """
+
+    def create_unassigned_order(self):
+        order = self.create_order(order_status=OrderStatus.PENDING_COURIER)
+        OrderModel.objects.filter(pk=order.pk).update(courier=None)
+        OrderHourlyRollup.refresh_buckets([
+            (order.restaurant_id, order.branch_id, courier_id, OrderHourlyRollup.hour_bucket(order.created_at))
+            for courier_id in (None, self.courier_user.pk)
+        ])
+        return order
+
+
+class DispatchTest(DispatchFixturesMixin, TestCase):
+    """
+    Couriers claim unassigned orders oldest first, and each order only once.
+    """
+
+    def test_claims_oldest_order_once(self):
+        first = self.create_unassigned_order()
+        second = self.create_unassigned_order()
+        other_courier = UserModel.objects.create(username='courier-2', phone_number='301', role=UserRoleChoice.COURIER)
+
+        self.assertTrue(is_idle(self.courier_user))
+        self.assertEqual(claim_next_order(self.courier_user), first.pk)
+        self.assertFalse(is_idle(self.courier_user))
+        with self.assertRaises(CourierBusy):
+            claim_next_order(self.courier_user)
+        with self.assertRaises(CourierBusy):
+            claim_next_batch(self.courier_user)
+        self.assertEqual(claim_next_order(other_courier), second.pk)
+        idle_courier = UserModel.objects.create(username='courier-3', phone_number='302', role=UserRoleChoice.COURIER)
+        self.assertIsNone(claim_next_order(idle_courier))
+
+        self.assertEqual(
+            dict(OrderModel.objects.values_list('pk', 'courier_id')),
+            {first.pk: self.courier_user.pk, second.pk: other_courier.pk},
+        )
+
+    def test_nearest_idle_couriers(self):
+        order = self.create_unassigned_order()
+        BranchModel.objects.filter(pk=self.branch.pk).update(latitude=41.3, longitude=69.28)
+        near = UserModel.objects.create(username='courier-2', phone_number='301', role=UserRoleChoice.COURIER)
+        far = UserModel.objects.create(username='courier-3', phone_number='302', role=UserRoleChoice.COURIER)
+        now = timezone.now()
+        try:
+            location_buffer.add(near.pk, [(41.301, 69.28, None, now)])
+            location_buffer.add(far.pk, [(41.35, 69.28, None, now)])
+            location_buffer.add(self.courier_user.pk, [(41.3, 69.28, None, now)])
+            self.create_order(order_status=OrderStatus.DELIVERING)  # self.courier_user is busy
+
+            self.assertEqual([courier_id for _, courier_id in nearest_idle_couriers(order.pk)], [near.pk, far.pk])
+            self.assertEqual([courier_id for _, courier_id in nearest_idle_couriers(order.pk, max_distance=1000)],
+                             [near.pk])
+        finally:
+            location_buffer.clear()
+
+    def test_claim_moves_rollups(self):
+        self.create_unassigned_order()
+        claim_next_order(self.courier_user)
+        pending = OrderHourlyRollup.status_totals(courier=self.courier_user)[OrderStatus.PENDING_COURIER]
+        unassigned = OrderHourlyRollup.status_totals(courier=None)[OrderStatus.PENDING_COURIER]
+        self.assertEqual((pending['orders_count'], pending['revenue']), (1, 10))
+        self.assertEqual(unassigned['orders_count'], 0)
+
+
+class LocationPingsTest(OrderFixturesMixin, TestCase):
+    """
+    Location pings are buffered, written in batches, and the latest position is served from memory.
+    """
+
+    def tearDown(self):
+        location_buffer.clear()
+
+    def ping(self, points):
+        request = APIRequestFactory().post('/', {'points': points}, format='json')
+        force_authenticate(request, user=self.courier_user)
+        return LocationPings.as_view()(request)
+
+    def test_ping_updates_latest_position(self):
+        response = self.ping([
+            {'latitude': 41.31, 'longitude': 69.28, 'accuracy': 5, 'recorded_at': '2024-12-13T09:00:02Z'},
+            {'latitude': 41.30, 'longitude': 69.27, 'recorded_at': '2024-12-13T09:00:00Z'},
+        ])
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['accepted'], 2)
+
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user=self.courier_user)
+        with self.assertNumQueries(0):
+            response = LocationPings.as_view()(request)
+        self.assertEqual((response.data['data']['latitude'], response.data['data']['longitude']), (41.31, 69.28))
+
+        location_buffer.flush()
+        self.assertEqual(CourierLocationModel.objects.filter(courier=self.courier_user).count(), 2)
+
+    def test_invalid_points_are_rejected(self):
+        for point in (
+            {'latitude': 91, 'longitude': 69.28, 'recorded_at': '2024-12-13T09:00:00Z'},
+            {'latitude': 41.31, 'recorded_at': '2024-12-13T09:00:00Z'},
+            {'latitude': 41.31, 'longitude': 69.28, 'recorded_at': 'yesterday'},
+        ):
+            self.assertEqual(self.ping([point]).status_code, 400)
+        self.assertEqual(self.ping([]).status_code, 400)
+        self.assertIsNone(location_buffer.latest(self.courier_user.pk))
+
+    def test_buffer_flushes_on_size(self):
+        buffer = LocationBuffer(flush_size=3, flush_interval=60)
+        now = timezone.now()
+        # the courier id is checked once, then points are buffered without queries
+        with self.assertNumQueries(1):
+            buffer.add(self.courier_user.pk, [(41.3, 69.2, None, now)])
+        with self.assertNumQueries(0):
+            buffer.add(self.courier_user.pk, [(41.3, 69.2, None, now)])
+        buffer.add(self.courier_user.pk, [(41.4, 69.3, None, now)])
+        self.assertEqual(CourierLocationModel.objects.count(), 3)
+        self.assertEqual(buffer.flushed_batches, 1)
+        self.assertEqual(buffer.latest(self.courier_user.pk).latitude, 41.4)
+
+    def test_failed_write_keeps_other_couriers_points(self):
+        buffer = LocationBuffer(flush_size=3, flush_interval=60)
+        now = timezone.now()
+        with self.assertRaises(ValueError):
+            buffer.add(0, [(41.3, 69.2, None, now)])
+
+        gone = UserModel.objects.create(username='courier-2', phone_number='301', role=UserRoleChoice.COURIER)
+        buffer.add(gone.pk, [(41.3, 69.2, None, now)])
+        gone.delete()
+        insert = LocationBuffer._insert
+        failures = iter([IntegrityError('FOREIGN KEY constraint failed')])
+
+        def insert_failing_once(batch):
+            # the database only reports the deleted courier's row at commit; fail the first insert like it would
+            for error in failures:
+                raise error
+            insert(batch)
+
+        with mock.patch.object(LocationBuffer, '_insert', side_effect=insert_failing_once), \
+                self.assertLogs('app_courier.locations', 'ERROR'):
+            buffer.add(self.courier_user.pk, [(41.4, 69.3, None, now), (41.4, 69.3, None, now)])
+        self.assertEqual(CourierLocationModel.objects.filter(courier=self.courier_user).count(), 2)
+        self.assertEqual((buffer.flushed_points, buffer.dropped_points), (2, 1))
+
+
+class BatchingTest(DispatchFixturesMixin, TestCase):
+    """
+    Orders heading the same way from a branch are claimed together and delivered in route order.
+    """
+
+    def create_order_to(self, latitude, longitude):
+        order = self.create_unassigned_order()
+        location = UserLocations.objects.create(
+            user=self.customer, address='Street', latitude=latitude, longitude=longitude)
+        OrderModel.objects.filter(pk=order.pk).update(delivery_address=location)
+        return order
+
+    def test_group_by_direction(self):
+        origin = (41.30, 69.28)
+        destinations = [
+            ('north-far', (41.35, 69.28)), ('south', (41.25, 69.28)), ('north-near', (41.32, 69.285)),
+            ('unknown', None), ('north-east', (41.33, 69.30)),
+        ]
+        self.assertEqual(
+            group_by_direction(origin, destinations, max_orders=3, max_spread=60),
+            [['north-far', 'north-near', 'north-east'], ['south'], ['unknown']],
+        )
+
+    def test_claim_batch_in_route_order(self):
+        BranchModel.objects.filter(pk=self.branch.pk).update(latitude=41.30, longitude=69.28)
+        far = self.create_order_to(41.35, 69.28)
+        south = self.create_order_to(41.25, 69.28)
+        near = self.create_order_to(41.32, 69.28)
+
+        batch = claim_next_batch(self.courier_user)
+        self.assertEqual(batch.order_ids, [near.pk, far.pk])
+        self.assertAlmostEqual(batch.route_length, haversine_distance(41.30, 69.28, 41.35, 69.28), delta=1)
+        self.assertEqual(
+            dict(OrderModel.objects.filter(courier=self.courier_user).values_list('pk', 'stop_sequence')),
+            {near.pk: 1, far.pk: 2},
+        )
+        self.assertEqual(OrderModel.objects.get(pk=south.pk).courier_id, None)
+        pending = OrderHourlyRollup.status_totals(courier=self.courier_user)[OrderStatus.PENDING_COURIER]
+        self.assertEqual(pending['orders_count'], 2)
+
+        courier = {'courier': self.courier_user}
+        for order in (near, far):
+            self.assertEqual(
+                transition_next_order(OrderStatus.PENDING_COURIER, OrderStatus.PENDING_RESTAURANT, **courier), order.pk)
+
+    def test_claim_batch_without_coordinates(self):
+        first = self.create_unassigned_order()
+        self.create_unassigned_order()
+        batch = claim_next_batch(self.courier_user)
+        self.assertEqual((batch.order_ids, batch.route_length), ([first.pk], None))
+
+
+class OfferStreamTest(DispatchFixturesMixin, TestCase):
+    """
+    New orders are pushed to couriers once committed, and the stream opens with the courier's state.
+    """
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def subscribe(self, *topics):
+        async def subscribe():
+            return get_broker().subscribe(*topics)
+
+        subscription = self.loop.run_until_complete(subscribe())
+        self.addCleanup(subscription.close)
+        return subscription
+
+    def received(self, subscription):
+        self.loop.run_until_complete(asyncio.sleep(0))
+        events = []
+        while not subscription.queue.empty():
+            events.append(subscription.get_nowait())
+        return events
+
+    def test_offer_and_claim_events(self):
+        couriers = self.subscribe(COURIERS_TOPIC)
+        courier = self.subscribe(courier_topic(self.courier_user.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            order = OrderModel.objects.create(
+                restaurant=self.restaurant, branch=self.branch, user=self.customer, delivery_address=self.location,
+                order_status=OrderStatus.PENDING_COURIER, total_price=10, total_items=1,
+            )
+        [offer] = self.received(couriers)
+        self.assertEqual((offer['type'], offer['order_id']), ('offer', order.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            claim_next_order(self.courier_user)
+        self.assertEqual(self.received(couriers), [{'type': 'taken', 'order_ids': [order.pk]}])
+        self.assertEqual(self.received(courier), [{'type': 'assigned', 'order_ids': [order.pk]}])
+
+    async def open_stream(self, user):
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': '/api/courier/offers/stream/', 'query_string': b'',
+            'headers': [(b'authorization', f'Bearer {AccessToken.for_user(user)}'.encode())],
+        }
+        hang_up = asyncio.Event()
+        messages = []
+
+        async def receive():
+            await hang_up.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            messages.append(message)
+            if message.get('more_body'):
+                hang_up.set()
+
+        await courier_offers(scope, receive, send)
+        return messages
+
+    async def test_stream_opens_with_state(self):
+        order = await sync_to_async(self.create_order)(order_status=OrderStatus.DELIVERING)
+        messages = await self.open_stream(self.courier_user)
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertIn(
+            f'"type":"state","orders":[{{"order_id":{order.pk},"order_status":"{OrderStatus.DELIVERING}"}}]'.encode(),
+            messages[1]['body'],
+        )
+        self.assertEqual(get_broker().subscriber_count(), 0)
 
-# Create your tests here.
+        messages = await self.open_stream(self.customer)
+        self.assertEqual(messages[0]['status'], 403)
@@ -7,8 +7,11 @@ app_name = 'courier'
 
 urlpatterns = [
     path('my-deliveries/', views.MyDeliveredDeliveries.as_view(), name='my_deliveries'),
+    path('claim-order/', views.ClaimOrder.as_view(), name='claim_order'),
+    path('claim-batch/', views.ClaimBatch.as_view(), name='claim_batch'),
     path('accept-for-delivery/', views.AcceptForDelivering.as_view(), name='accept_for_delivery'),
     path('mark-as-delivering/', views.MarkAsDelivering.as_view(), name='mark_as_delivering'),
     path('mark-as-delivered/', views.MarkAsDelivered.as_view(), name='mark_as_delivered'),
+    path('location-pings/', views.LocationPings.as_view(), name='location_pings'),
     path('statistics/', views.StatisticsCourier.as_view(), name='statistics'),
 ]
\ No newline at end of file
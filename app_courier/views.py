@@ -7,17 +7,26 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from app_common.mixins import EagerLoadingMixin
+from app_common.pagination import KeysetPagination
 from app_common.premissions import IsCourier
-from app_deliveries.models import OrderModel, OrderStatus
+from app_courier.batching import claim_next_batch
+from app_courier.dispatch import CourierBusy, claim_next_order
+from app_courier.locations import location_buffer
+from app_courier.serializers import ClaimBatchSerializer, LocationBatchSerializer
+from app_deliveries.events import courier_moved
+from app_deliveries.models import OrderHourlyRollup, OrderModel, OrderStatus
 from app_deliveries.serializers import OrderSerializer
+from app_deliveries.services import transition_next_order
 
 
-class MyDeliveredDeliveries(generics.ListAPIView):
+class MyDeliveredDeliveries(EagerLoadingMixin, generics.ListAPIView):
     """
     Retrieve a list of delivered deliveries for a specific user.
     """
     queryset = OrderModel.objects.all()
     serializer_class = OrderSerializer
+    pagination_class = KeysetPagination
     permission_classes = [IsCourier]
 
     def get_queryset(self):
@@ -48,8 +57,9 @@ class StatisticsCourier(APIView):
         - `yearly`: Orders from the past 365 days.
 
     ### Response
-    - **Order Data**:
-        - Paginated list of orders assigned to the courier.
+    - **Order Data** (`data`):
+        - Page of the orders assigned to the courier: `next` and `previous` links and the
+          orders in `results`. The statistics stay at the top level.
         - Each order contains:
             - `id`: The unique ID of the order.
             - `total_price`: The total price of the order.
@@ -59,6 +69,7 @@ class StatisticsCourier(APIView):
         - `total_assigned_orders`: Total number of orders assigned to the courier.
         - `total_delivered_orders`: Total number of delivered orders.
         - `total_canceled_orders`: Total number of canceled orders.
+        - `total_pending_orders`: Total number of orders pending for the courier.
         - `total_sum`: Total earnings from delivered orders.
         - `average_delivered_order_price`: Average price of delivered orders.
         - `pending_order`: The first pending order for the courier, if any.
@@ -74,32 +85,35 @@ class StatisticsCourier(APIView):
     ### Example Response
     ```json
     {
-        "count": 5,
-        "next": null,
-        "previous": null,
-        "results": [
-            {
-                "id": 1,
-                "total_price": 120.5,
-                "order_status": "delivered",
-                "created_at": "2024-12-12T10:00:00Z"
-            },
-            {
-                "id": 2,
-                "total_price": 80.0,
-                "order_status": "canceled",
-                "created_at": "2024-12-11T15:30:00Z"
-            }
-        ],
+        "success": true,
+        "data": {
+            "next": "http://example.com/api/courier/statistics/?cursor=eyJwIjogWy...",
+            "previous": null,
+            "results": [
+                {
+                    "id": 1,
+                    "total_price": "120.50",
+                    "order_status": "delivered",
+                    "created_at": "2024-12-12T10:00:00Z"
+                },
+                {
+                    "id": 2,
+                    "total_price": "80.00",
+                    "order_status": "canceled",
+                    "created_at": "2024-12-11T15:30:00Z"
+                }
+            ]
+        },
         "total_assigned_orders": 10,
         "total_delivered_orders": 6,
         "total_canceled_orders": 2,
+        "total_pending_orders": 1,
         "total_sum": 450.0,
         "average_delivered_order_price": 75.0,
         "pending_order": {
             "id": 3,
-            "total_price": 50.0,
-            "order_status": "pending",
+            "total_price": "50.00",
+            "order_status": "pending_for_courier",
             "created_at": "2024-12-13T09:00:00Z"
         }
     }
@@ -107,6 +121,8 @@ class StatisticsCourier(APIView):
     """
     permission_classes = [IsAuthenticated, IsCourier]
     queryset = OrderModel.objects.all()
+    pagination_class = KeysetPagination
+    owner_lookup = 'courier'
     fbd_filters = {
         'weekly': timedelta(days=7),
         'monthly': timedelta(days=30),
@@ -117,52 +133,64 @@ class StatisticsCourier(APIView):
         """
         Get delivery statistics for the courier.
         """
-        courier = self.request.user
-        orders = self.queryset.filter(courier=courier)
+        orders = self.get_queryset()
 
         fbd = request.GET.get('fbd')
 
         # Apply date filter
-        orders = self.apply_date_filter(orders, fbd)
-
-        # Calculate statistics manually
-        delivered_orders = orders.filter(order_status=OrderStatus.DELIVERED)
-        delivered_orders_count = delivered_orders.count()
-
-        # Calculate total price manually
-        delivered_orders_total_price = sum(
-            order.total_price for order in delivered_orders
-        )
-
-        total_assigned_orders = orders.count()
-        total_canceled_orders = orders.filter(order_status=OrderStatus.CANCELED).count()
-
-        # Calculate average price of delivered orders (avoid division by zero)
-        average_delivered_order_price = (
-            delivered_orders_total_price / delivered_orders_count
-            if delivered_orders_count > 0 else 0
-        )
-
-        # Prepare response data
-        data = {
-            "data": orders,
-            "total_assigned_orders": total_assigned_orders,
-            "total_delivered_orders": delivered_orders_count,
-            "total_canceled_orders": total_canceled_orders,
-            "total_sum": delivered_orders_total_price,
-            "average_delivered_order_price": round(average_delivered_order_price, 2),
-            "pending_order": orders.filter(order_status=OrderStatus.PENDING_COURIER).first()
+        start = self.get_start_date(fbd)
+        orders = self.apply_date_filter(orders, start)
+
+        # Every count, the sum and the average from the hourly rollups
+        totals = OrderHourlyRollup.status_totals(start, **{self.owner_lookup: request.user})
+        delivered = totals[OrderStatus.DELIVERED]
+        stats = {
+            "total_assigned_orders": sum(total['orders_count'] for total in totals.values()),
+            "total_delivered_orders": delivered['orders_count'],
+            "total_canceled_orders": totals[OrderStatus.CANCELED]['orders_count'],
+            "total_pending_orders": totals[OrderStatus.PENDING_COURIER]['orders_count'],
+            "total_sum": delivered['revenue'],
+            "average_delivered_order_price": (
+                round(delivered['revenue'] / delivered['orders_count'], 2) if delivered['orders_count'] else 0
+            ),
         }
-        return Response(data=data, status=status.HTTP_200_OK)
 
-    def apply_date_filter(self, orders, fbd: str):
-        """Apply the date filter to the orders queryset."""
+        pending_order = None
+        if stats['total_pending_orders']:
+            pending_order = OrderSerializer.setup_eager_loading(
+                orders.filter(order_status=OrderStatus.PENDING_COURIER)
+            ).order_by('created_at', 'id').first()
+
+        # Paginate the orders
+        paginator = self.pagination_class()
+        paginated_orders = paginator.paginate_queryset(OrderSerializer.setup_eager_loading(orders), request)
+
+        orders_page = paginator.get_paginated_response(OrderSerializer(paginated_orders, many=True).data).data
+
+        return Response(data={
+            "success": True,
+            "data": orders_page,
+            **stats,
+            "pending_order": OrderSerializer(pending_order).data if pending_order else None,
+        }, status=status.HTTP_200_OK)
+
+    def get_queryset(self):
+        """Return the orders of the requesting courier."""
+        return self.queryset.filter(**{self.owner_lookup: self.request.user})
+
+    def get_start_date(self, fbd: str):
+        """Return the start of the date filter range, or None for all orders."""
         if fbd == 'today':
-            start_of_today = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
-            return orders.filter(created_at__gte=start_of_today)
+            return timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
 
         elif fbd in self.fbd_filters:
-            return orders.filter(created_at__gte=timezone.now() - self.fbd_filters[fbd])
+            return timezone.now() - self.fbd_filters[fbd]
+        return None
+
+    def apply_date_filter(self, orders, start):
+        """Apply the date filter to the orders queryset."""
+        if start is not None:
+            return orders.filter(created_at__gte=start)
         return orders
 
 
@@ -177,12 +205,10 @@ class AcceptForDelivering(APIView):
         """
         Accept the order for delivery.
         """
-        order = self.queryset.objects.filter(
-            courier__id=request.user.pk).filter(order_status=OrderStatus.PENDING_COURIER)
-        if order.exists():
-            order = order.first()
-            order.order_status = OrderStatus.PENDING_RESTAURANT
-            order.save()
+        order_id = transition_next_order(
+            OrderStatus.PENDING_COURIER, OrderStatus.PENDING_RESTAURANT, courier__id=request.user.pk)
+        if order_id is not None:
+            order = OrderSerializer.setup_eager_loading(self.queryset.objects.filter(pk=order_id)).get()
             data = OrderSerializer(order).data
             return Response(data={
                 "success": True,
@@ -207,12 +233,10 @@ class MarkAsDelivering(APIView):
         """
         Accept the order for delivery.
         """
-        order = self.queryset.objects.filter(
-            courier__id=request.user.pk).filter(order_status=OrderStatus.CONFIRMED_RESTAURANT)
-        if order.exists():
-            order = order.first()
-            order.order_status = OrderStatus.DELIVERING
-            order.save()
+        order_id = transition_next_order(
+            OrderStatus.CONFIRMED_RESTAURANT, OrderStatus.DELIVERING, courier__id=request.user.pk)
+        if order_id is not None:
+            order = OrderSerializer.setup_eager_loading(self.queryset.objects.filter(pk=order_id)).get()
             data = OrderSerializer(order).data
             return Response(data={
                 "success": True,
@@ -238,12 +262,10 @@ class MarkAsDelivered(APIView):
         """
         Mark the order as delivered.
         """
-        order = self.queryset.objects.filter(
-            courier__id=request.user.pk).filter(order_status=OrderStatus.DELIVERING)
-        if order.exists():
-            order = order.first()
-            order.order_status = OrderStatus.DELIVERED
-            order.save()
+        order_id = transition_next_order(
+            OrderStatus.DELIVERING, OrderStatus.DELIVERED, courier__id=request.user.pk)
+        if order_id is not None:
+            order = OrderSerializer.setup_eager_loading(self.queryset.objects.filter(pk=order_id)).get()
             data = OrderSerializer(order).data
             return Response(data={
                 "success": True,
@@ -254,4 +276,130 @@ class MarkAsDelivered(APIView):
         return Response(data={
             "success": False,
             "message": "No pending delivery order found for this courier"
-        }, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ClaimOrder(APIView):
+    """
+    Assign the oldest order waiting for a courier to the requesting idle courier.
+    """
+    permission_classes = [IsAuthenticated, IsCourier]
+    queryset = OrderModel
+
+    def post(self, request):
+        """
+        Claim the next order from the dispatch queue.
+        """
+        try:
+            order_id = claim_next_order(request.user)
+        except CourierBusy as error:
+            return Response(data={
+                "success": False,
+                "message": str(error)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if order_id is not None:
+            order = OrderSerializer.setup_eager_loading(self.queryset.objects.filter(pk=order_id)).get()
+            data = OrderSerializer(order).data
+            return Response(data={
+                "success": True,
+                "message": "Order assigned to courier",
+                "data": data
+            }, status=status.HTTP_200_OK)
+
+        return Response(data={
+            "success": False,
+            "message": "No orders waiting for a courier"
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ClaimBatch(APIView):
+    """
+    Assign a batch of orders heading the same way from one branch to the requesting idle courier.
+
+    The batch holds the oldest order waiting for a courier and up to `max_orders - 1` orders
+    of the same branch in a similar direction. Orders are returned in stop order, and the
+    courier's accept / delivering / delivered calls then follow that order.
+    """
+    permission_classes = [IsAuthenticated, IsCourier]
+    serializer_class = ClaimBatchSerializer
+    queryset = OrderModel
+
+    def post(self, request):
+        """
+        Claim the next batch from the dispatch queue.
+        """
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            batch = claim_next_batch(request.user, serializer.validated_data['max_orders'])
+        except CourierBusy as error:
+            return Response(data={
+                "success": False,
+                "message": str(error)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if batch is not None:
+            orders = OrderSerializer.setup_eager_loading(self.queryset.objects.filter(pk__in=batch.order_ids))
+            orders = sorted(orders, key=lambda order: order.stop_sequence)
+            return Response(data={
+                "success": True,
+                "message": "Batch assigned to courier",
+                "route_length": round(batch.route_length) if batch.route_length is not None else None,
+                "data": OrderSerializer(orders, many=True).data
+            }, status=status.HTTP_200_OK)
+
+        return Response(data={
+            "success": False,
+            "message": "No orders waiting for a courier"
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+
+class LocationPings(APIView):
+    """
+    Receive batches of GPS points from the courier's device.
+
+    Points are buffered in memory and written in bulk, so a ping never waits on the
+    database. GET returns the courier's latest position from memory.
+
+    ### Example Request
+    ```
+    POST /api/courier/location-pings/
+    {
+        "points": [
+            {"latitude": 41.3111, "longitude": 69.2797, "accuracy": 5, "recorded_at": "2024-12-13T09:00:00Z"},
+            {"latitude": 41.3114, "longitude": 69.2801, "recorded_at": "2024-12-13T09:00:02Z"}
+        ]
+    }
+    ```
+    """
+    permission_classes = [IsAuthenticated, IsCourier]
+    serializer_class = LocationBatchSerializer
+
+    def get(self, request):
+        """
+        Return the latest known position of the courier.
+        """
+        position = location_buffer.latest(request.user.pk)
+        if position is None:
+            return Response(data={
+                "success": False,
+                "message": "No location reported yet"
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        return Response(data={
+            "success": True,
+            "data": position._asdict()
+        }, status=status.HTTP_200_OK)
+
+    def post(self, request):
+        """
+        Buffer a batch of location points.
+        """
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        points = serializer.validated_data['points']
+        location_buffer.add(request.user.pk, points, known=True)
+        courier_moved(request.user.pk, location_buffer.latest(request.user.pk))
+        return Response(data={
+            "success": True,
+            "accepted": len(points)
+        }, status=status.HTTP_202_ACCEPTED)
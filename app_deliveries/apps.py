@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AppDeliveriesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app_deliveries'
+
+    def ready(self):
+        from app_deliveries import signals  # noqa: F401
@@ -0,0 +1,63 @@
+from app_common.pubsub import get_broker, publish_on_commit
+
+# Every connected courier: offers without a target and offers another courier has taken.
+COURIERS_TOPIC = 'couriers'
+
+
+def courier_topic(courier_id) -> str:
+    """
+    Return the topic of the events meant for one courier.
+    """
+    return f'courier:{courier_id}'
+
+
+def order_topic(order_id) -> str:
+    """
+    Return the topic of the events watchers of one order receive.
+    """
+    return f'order:{order_id}'
+
+
+def position_topic(courier_id) -> str:
+    """
+    Return the topic of one courier's position updates.
+    """
+    return f'position:{courier_id}'
+
+
+def order_status_changed(order_id, order_status, courier_id=None):
+    """
+    Tell the order's watchers and courier that the order moved to a new status.
+    """
+    event = {'type': 'status', 'order_id': order_id, 'order_status': order_status}
+    publish_on_commit(order_topic(order_id), event)
+    if courier_id is not None:
+        publish_on_commit(courier_topic(courier_id), event)
+
+
+def orders_claimed(order_ids, courier_id):
+    """
+    Tell the courier which orders it was given, every other courier that they are gone,
+    and the watchers of each order who delivers it.
+    """
+    order_ids = list(order_ids)
+    publish_on_commit(COURIERS_TOPIC, {'type': 'taken', 'order_ids': order_ids})
+    publish_on_commit(courier_topic(courier_id), {'type': 'assigned', 'order_ids': order_ids})
+    for order_id in order_ids:
+        publish_on_commit(order_topic(order_id), {'type': 'courier', 'order_id': order_id, 'courier_id': courier_id})
+
+
+def courier_moved(courier_id, position):
+    """
+    Publish the courier's latest Position to the watchers of its orders.
+
+    Coordinates are rounded to 5 decimals (about a meter). Position updates aren't
+    tied to a transaction, so they are published right away.
+    """
+    return get_broker().publish(position_topic(courier_id), {
+        'type': 'position',
+        'courier_id': courier_id,
+        'latitude': round(position.latitude, 5),
+        'longitude': round(position.longitude, 5),
+        'recorded_at': position.recorded_at.isoformat(),
+    })
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from app_deliveries.models import OrderModel
+
+
+class Command(BaseCommand):
+    """
+    Recalculate the stored total_price and total_items of existing orders.
+    """
+    help = "Backfill OrderModel.total_price and OrderModel.total_items from the order items."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Orders updated per UPDATE statement.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        order_ids = OrderModel.objects.order_by('pk').values_list('pk', flat=True)
+        updated = 0
+        last_id = 0
+        while True:
+            batch = list(order_ids.filter(pk__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            updated += OrderModel.refresh_totals(batch)
+            last_id = batch[-1]
+        self.stdout.write(self.style.SUCCESS(f"Backfilled totals for {updated} orders."))
@@ -0,0 +1,67 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from app_basket.models import BasketItemModel, BasketModel
+from app_deliveries.serializers import OrderSerializer
+from app_products.models import CategoryModel, ProductsModel
+from app_users.models import UserLocations, UserModel
+
+
+class Command(BaseCommand):
+    """
+    Measure OrderSerializer.create for baskets of different sizes.
+
+    Everything is created inside a transaction that is rolled back, so the database is left untouched.
+    """
+    help = "Benchmark checkout (OrderSerializer.create) for baskets of 1, 20 and 200 items."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 20, 200], help="Basket sizes to measure.")
+        parser.add_argument('--repeat', type=int, default=20, help="Checkouts per basket size.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = UserModel.objects.create(username='benchmark-checkout', phone_number='benchmark-checkout')
+            location = UserLocations.objects.create(user=user, address='Benchmark street')
+            category = CategoryModel.objects.create(name='Benchmark')
+            products = ProductsModel.objects.bulk_create([
+                ProductsModel(name=f'Product {i}', description='', price=10 + i, category=category)
+                for i in range(max(options['sizes']))
+            ])
+            request = Request(APIRequestFactory().post('/'))
+            request.user = user
+
+            for size in options['sizes']:
+                timings = []
+                queries = 0
+                for _ in range(options['repeat']):
+                    basket = self.fill_basket(user, products[:size])
+                    serializer = OrderSerializer(
+                        data={'basket': basket.pk, 'delivery_address': location.pk}, context={'request': request})
+                    serializer.is_valid(raise_exception=True)
+                    with CaptureQueriesContext(connection) as context:
+                        started = time.perf_counter()
+                        serializer.save(user=user)
+                        timings.append(time.perf_counter() - started)
+                    queries = len(context)
+                timings.sort()
+                self.stdout.write(
+                    f"items={size:<4} queries={queries:<3} "
+                    f"median={timings[len(timings) // 2] * 1000:.2f}ms "
+                    f"max={timings[-1] * 1000:.2f}ms"
+                )
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def fill_basket(user, products):
+        basket = BasketModel.objects.create(user=user)
+        items = BasketItemModel.objects.bulk_create([
+            BasketItemModel(product=product, quantity=2) for product in products
+        ])
+        basket.items.add(*items)
+        return basket
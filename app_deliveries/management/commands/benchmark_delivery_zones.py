@@ -0,0 +1,70 @@
+import math
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app_common.geo import METERS_PER_DEGREE, PolygonIndex, point_in_polygon
+
+
+class Command(BaseCommand):
+    """
+    Measure delivery-zone serviceability lookups against testing every polygon.
+
+    Zones are irregular polygons of a few kilometers spread over a square around a city
+    center, one per branch. A sample of lookups is checked against the full scan.
+    """
+    help = "Benchmark the delivery-zone polygon index used for serviceable-branch lookups."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--zones', type=int, default=5000, help="Indexed zones.")
+        parser.add_argument('--vertices', type=int, default=24, help="Vertices per zone.")
+        parser.add_argument('--queries', type=int, default=5000, help="Lookups.")
+        parser.add_argument('--span', type=float, default=0.5, help="Side of the covered square in degrees.")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        center_lat, center_lon, span = 41.3, 69.28, options['span']
+
+        def point():
+            return center_lat + (rng.random() - 0.5) * span, center_lon + (rng.random() - 0.5) * span
+
+        def zone():
+            latitude, longitude = point()
+            scale = math.cos(math.radians(latitude))
+            radius = rng.uniform(1500, 5000) / METERS_PER_DEGREE
+            polygon = []
+            for i in range(options['vertices']):
+                angle = 2 * math.pi * i / options['vertices']
+                r = radius * rng.uniform(0.6, 1.0)
+                polygon.append([latitude + r * math.sin(angle), longitude + r * math.cos(angle) / scale])
+            return polygon
+
+        zones = {key: zone() for key in range(options['zones'])}
+        index = PolygonIndex()
+        started = time.perf_counter()
+        for key, polygon in zones.items():
+            index.set(key, polygon)
+        build = time.perf_counter() - started
+
+        queries = [point() for _ in range(options['queries'])]
+        started = time.perf_counter()
+        found = [index.containing(latitude, longitude) for latitude, longitude in queries]
+        indexed = (time.perf_counter() - started) / len(queries)
+
+        sample = queries[:200]
+        started = time.perf_counter()
+        expected = [
+            [key for key, polygon in zones.items() if point_in_polygon(latitude, longitude, polygon)]
+            for latitude, longitude in sample
+        ]
+        full_scan = (time.perf_counter() - started) / len(sample)
+        if [sorted(keys) for keys in found[:len(sample)]] != expected:
+            raise CommandError("Indexed lookups differ from the full scan.")
+
+        self.stdout.write(
+            f"zones={len(index)} vertices={options['vertices']} build={build:.2f}s "
+            f"indexed={indexed * 1e6:.0f}us full_scan={full_scan * 1e6:.0f}us "
+            f"avg_matches={sum(map(len, found)) / len(found):.1f} full_scan_check=ok"
+        )
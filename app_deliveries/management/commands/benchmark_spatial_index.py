@@ -0,0 +1,69 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app_common.geo import SpatialIndex, haversine_distance
+
+
+class Command(BaseCommand):
+    """
+    Measure SpatialIndex build, move, k-nearest and radius query times on random points.
+
+    Points are spread over a square around a city center, the way courier positions
+    and branches are. A sample of queries is checked against a brute-force scan.
+    """
+    help = "Benchmark the in-memory spatial index used for nearest-courier and nearest-branch lookups."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--points', type=int, default=100_000, help="Indexed points.")
+        parser.add_argument('--queries', type=int, default=2000, help="Queries of each kind.")
+        parser.add_argument('--k', type=int, default=10, help="Neighbours per k-nearest query.")
+        parser.add_argument('--radius', type=float, default=500, help="Radius query size in meters.")
+        parser.add_argument('--span', type=float, default=0.5, help="Side of the covered square in degrees.")
+        parser.add_argument('--cell-size', type=float, default=0.01, help="Index cell size in degrees.")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        center_lat, center_lon, span = 41.3, 69.28, options['span']
+
+        def point():
+            return center_lat + (rng.random() - 0.5) * span, center_lon + (rng.random() - 0.5) * span
+
+        points = {key: point() for key in range(options['points'])}
+        index = SpatialIndex(cell_size=options['cell_size'])
+        started = time.perf_counter()
+        for key, (latitude, longitude) in points.items():
+            index.set(key, latitude, longitude)
+        build = time.perf_counter() - started
+
+        moves = [(rng.randrange(len(points)), point()) for _ in range(options['queries'])]
+        started = time.perf_counter()
+        for key, (latitude, longitude) in moves:
+            index.set(key, latitude, longitude)
+            points[key] = (latitude, longitude)
+        move = (time.perf_counter() - started) / len(moves)
+
+        queries = [point() for _ in range(options['queries'])]
+        k, radius = options['k'], options['radius']
+        started = time.perf_counter()
+        nearest = [index.nearest(latitude, longitude, k) for latitude, longitude in queries]
+        knn = (time.perf_counter() - started) / len(queries)
+        started = time.perf_counter()
+        within = [index.within(latitude, longitude, radius) for latitude, longitude in queries]
+        radius_time = (time.perf_counter() - started) / len(queries)
+
+        for (latitude, longitude), found_nearest, found_within in list(zip(queries, nearest, within))[:20]:
+            distances = sorted(
+                (haversine_distance(latitude, longitude, *position), key) for key, position in points.items())
+            if [key for _, key in found_nearest] != [key for _, key in distances[:k]]:
+                raise CommandError(f"k-nearest mismatch at ({latitude}, {longitude}).")
+            if [key for _, key in found_within] != [key for distance, key in distances if distance <= radius]:
+                raise CommandError(f"Radius mismatch at ({latitude}, {longitude}).")
+
+        self.stdout.write(
+            f"points={len(index)} span={span}deg cell={index.cell_size}deg build={build:.2f}s move={move * 1e6:.1f}us "
+            f"knn(k={k})={knn * 1e6:.0f}us radius({radius:.0f}m)={radius_time * 1e6:.0f}us "
+            f"avg_radius_hits={sum(map(len, within)) / len(within):.1f} brute_force_check=ok"
+        )
@@ -0,0 +1,79 @@
+import re
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from app_branch.views import BranchStatistics, KitchenQueue
+from app_common.pagination import KeysetPagination
+from app_courier.dispatch import dispatch_queue
+from app_company.views import RestaurantStatistics
+from app_courier.views import MyDeliveredDeliveries, StatisticsCourier
+from app_deliveries.models import OrderModel, OrderStatus
+from app_users.models import UserModel
+
+# EXPLAIN lines that mean the orders table is read in full instead of searched through an index.
+# Scanning one of the partial indexes is fine: it only holds the rows matching its condition.
+FULL_SCAN_PATTERNS = {
+    'sqlite': r'\bSCAN {table}\b(?! USING (?:COVERING )?INDEX (?:{partial_indexes})\b)',
+    'postgresql': r'\bSeq Scan on {table}\b',
+}
+
+
+def order_querysets(user):
+    """
+    Yield (name, queryset) for the order querysets built by the views for the given user.
+    """
+    def view(view_class):
+        instance = view_class()
+        instance.request = SimpleNamespace(user=user, GET={})
+        return instance
+
+    # the order feeds are read newest first by KeysetPagination
+    yield 'MyDeliveredDeliveries', view(MyDeliveredDeliveries).get_queryset().order_by(*KeysetPagination.ordering)
+    yield 'KitchenQueue', view(KitchenQueue).get_queryset()
+    yield 'KitchenQueue (since)', view(KitchenQueue).get_queryset(since=0)
+    for view_class in (BranchStatistics, RestaurantStatistics, StatisticsCourier):
+        instance = view(view_class)
+        yield view_class.__name__, instance.get_queryset()
+        start = instance.get_start_date('weekly')
+        yield f'{view_class.__name__} (fbd=weekly)', instance.apply_date_filter(instance.get_queryset(), start)
+    yield 'courier dispatch queue', dispatch_queue()
+    for status in (OrderStatus.PENDING_COURIER, OrderStatus.CONFIRMED_RESTAURANT, OrderStatus.DELIVERING):
+        yield f'courier transition from {status}', OrderModel.objects.filter(
+            order_status=status, courier__id=user.pk).order_by('created_at', 'id')
+
+
+class Command(BaseCommand):
+    """
+    Run EXPLAIN on every order queryset used by the views and fail on a full table scan.
+    """
+    help = "Check that the order views' querysets are served by OrderModel's indexes."
+
+    def handle(self, *args, **options):
+        pattern = FULL_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f"EXPLAIN check is not supported on '{connection.vendor}'.")
+        partial_indexes = [index.name for index in OrderModel._meta.indexes if index.condition is not None]
+        pattern = re.compile(pattern.format(
+            table=re.escape(OrderModel._meta.db_table),
+            partial_indexes='|'.join(map(re.escape, partial_indexes)) or '$^',
+        ))
+
+        user = UserModel(pk=0)
+        failures = []
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # Small tables are always cheaper to scan; make the planner show the index it would use.
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            for name, queryset in order_querysets(user):
+                plan = queryset.explain()
+                if pattern.search(plan):
+                    failures.append(name)
+                    self.stdout.write(self.style.ERROR(f"FULL SCAN  {name}\n{plan}"))
+                else:
+                    self.stdout.write(f"ok         {name}")
+
+        if failures:
+            raise CommandError(f"{len(failures)} order queryset(s) fall back to a full scan: {', '.join(failures)}")
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from app_deliveries.models import rebuild_order_rollups
+
+
+class Command(BaseCommand):
+    """
+    Rebuild every OrderHourlyRollup row from OrderModel.
+    """
+    help = "Rebuild the hourly order rollups used by the dashboard statistics."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rollup rows inserted per INSERT statement.")
+
+    def handle(self, *args, **options):
+        count = rebuild_order_rollups(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} hourly order rollups."))
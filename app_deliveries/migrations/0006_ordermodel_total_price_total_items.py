@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-17 19:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_deliveries', '0005_alter_ordermodel_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ordermodel',
+            name='total_items',
+            field=models.PositiveIntegerField(db_index=True, default=0, verbose_name='Total Items'),
+        ),
+        migrations.AddField(
+            model_name='ordermodel',
+            name='total_price',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, max_digits=12, verbose_name='Total Price'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.3 on 2026-10-17 19:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_branch', '0004_branchproductsmodel_restaurant_and_more'),
+        ('app_company', '0003_restaurantproductsmodel'),
+        ('app_deliveries', '0006_ordermodel_total_price_total_items'),
+        ('app_users', '0005_alter_usermodel_role'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ordermodel',
+            index=models.Index(fields=['courier', 'order_status', 'created_at'], name='order_courier_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordermodel',
+            index=models.Index(fields=['courier', 'created_at'], name='order_courier_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordermodel',
+            index=models.Index(fields=['branch', 'order_status', 'created_at'], name='order_branch_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordermodel',
+            index=models.Index(fields=['restaurant', 'created_at'], name='order_restaurant_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordermodel',
+            index=models.Index(condition=models.Q(('is_deleted', False), ('order_status', 'pending_for_restaurant')), fields=['created_at', 'id'], name='order_pending_restaurant_idx'),
+        ),
+    ]
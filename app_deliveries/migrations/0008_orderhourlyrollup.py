@@ -0,0 +1,37 @@
+# Generated by Django 5.1.3 on 2026-10-17 19:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_branch', '0004_branchproductsmodel_restaurant_and_more'),
+        ('app_company', '0003_restaurantproductsmodel'),
+        ('app_deliveries', '0007_ordermodel_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderHourlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_status', models.CharField(choices=[('pending_for_courier', 'Pending for a Courier'), ('pending_for_restaurant', 'Pending for a Restaurant'), ('confirmed_by_restaurant', 'Confirmed by a Restaurant'), ('delivering', 'Delivering'), ('delivered', 'Delivered'), ('canceled', 'Canceled')], max_length=25, verbose_name='Order Status')),
+                ('hour', models.DateTimeField(verbose_name='Hour')),
+                ('orders_count', models.PositiveIntegerField(default=0, verbose_name='Orders Count')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Revenue')),
+                ('items_count', models.PositiveIntegerField(default=0, verbose_name='Items Count')),
+                ('branch', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_rollups', to='app_branch.branchmodel', verbose_name='Branch')),
+                ('courier', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_rollups', to=settings.AUTH_USER_MODEL, verbose_name='Courier')),
+                ('restaurant', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_rollups', to='app_company.restaurantmodel', verbose_name='Restaurant')),
+            ],
+            options={
+                'verbose_name': 'Order Hourly Rollup',
+                'verbose_name_plural': 'Order Hourly Rollups',
+                'indexes': [models.Index(fields=['restaurant', 'hour'], name='rollup_restaurant_hour_idx'), models.Index(fields=['branch', 'hour'], name='rollup_branch_hour_idx'), models.Index(fields=['courier', 'hour'], name='rollup_courier_hour_idx')],
+            },
+        ),
+    ]
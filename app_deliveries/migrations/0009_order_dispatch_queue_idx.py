@@ -0,0 +1,22 @@
+# Generated by Django 5.1.3 on 2026-10-17 19:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_branch', '0004_branchproductsmodel_restaurant_and_more'),
+        ('app_company', '0003_restaurantproductsmodel'),
+        ('app_deliveries', '0008_orderhourlyrollup'),
+        ('app_users', '0005_alter_usermodel_role'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ordermodel',
+            index=models.Index(condition=models.Q(('courier__isnull', True), ('is_deleted', False), ('order_status', 'pending_for_courier')), fields=['created_at', 'id'], name='order_dispatch_queue_idx'),
+        ),
+    ]
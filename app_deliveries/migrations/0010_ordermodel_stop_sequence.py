@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-17 19:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_deliveries', '0009_order_dispatch_queue_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ordermodel',
+            name='stop_sequence',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Stop Sequence'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.3 on 2026-10-17 19:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_branch', '0006_branchdeliveryzone'),
+        ('app_company', '0003_restaurantproductsmodel'),
+        ('app_deliveries', '0010_ordermodel_stop_sequence'),
+        ('app_users', '0006_userlocations_latitude_userlocations_longitude'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KitchenQueueVersion',
+            fields=[
+                ('branch', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='kitchen_queue_version', serialize=False, to='app_branch.branchmodel', verbose_name='Branch')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='Version')),
+            ],
+            options={
+                'verbose_name': 'Kitchen Queue Version',
+                'verbose_name_plural': 'Kitchen Queue Versions',
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='ordermodel',
+            name='order_pending_restaurant_idx',
+        ),
+        migrations.AddField(
+            model_name='ordermodel',
+            name='queue_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False, verbose_name='Queue Version'),
+        ),
+        migrations.AddIndex(
+            model_name='ordermodel',
+            index=models.Index(fields=['branch', 'queue_version'], name='order_branch_queue_version_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.3 on 2026-10-17 20:16
+
+from decimal import Decimal
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+from django.db.models import Count, Sum, Value
+from django.db.models.functions import Coalesce, TruncHour
+from django.utils import timezone
+
+
+def rebuild_rollups(apps, schema_editor):
+    """
+    Rebuild the rollups from the orders, filling the table and merging duplicate rows before the constraint.
+
+    A frozen copy of app_deliveries.models.rebuild_order_rollups as it was when this migration was written.
+    """
+    OrderHourlyRollup = apps.get_model('app_deliveries', 'OrderHourlyRollup')
+    OrderModel = apps.get_model('app_deliveries', 'OrderModel')
+    rows = OrderModel.objects.order_by().values(
+        'restaurant_id', 'branch_id', 'courier_id', 'order_status',
+        hour=TruncHour('created_at', tzinfo=timezone.get_default_timezone()),
+    ).annotate(
+        orders_count=Count('pk'),
+        revenue=Coalesce(Sum('total_price'), Value(Decimal('0'))),
+        items_count=Coalesce(Sum('total_items'), Value(0)),
+    )
+    OrderHourlyRollup.objects.all().delete()
+    OrderHourlyRollup.objects.bulk_create((OrderHourlyRollup(**row) for row in rows.iterator()), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_deliveries', '0011_kitchen_queue_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_rollups, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='orderhourlyrollup',
+            constraint=models.UniqueConstraint(django.db.models.functions.comparison.Coalesce('restaurant', models.Value(0)), django.db.models.functions.comparison.Coalesce('branch', models.Value(0)), django.db.models.functions.comparison.Coalesce('courier', models.Value(0)), models.F('order_status'), models.F('hour'), name='rollup_bucket_unique'),
+        ),
+    ]
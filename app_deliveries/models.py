@@ -1,8 +1,15 @@
-from django.db import models
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncHour
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 from app_basket.models import BasketModel
 from app_branch.models import BranchModel
+from app_common.bulk import insert_ignoring_conflicts
 from app_common.models import BaseModel
 from app_company.models import RestaurantModel
 from app_products.models import ProductsModel
@@ -23,6 +30,10 @@ class OrderStatus(models.TextChoices):
     CANCELED = 'canceled', 'Canceled'
 
 
+# Statuses of the orders a branch's kitchen is working on.
+KITCHEN_QUEUE_STATUSES = (OrderStatus.PENDING_RESTAURANT, OrderStatus.CONFIRMED_RESTAURANT)
+
+
 class OrderItemModel(models.Model):
     """
     OrderItem model represents an item in an order.
@@ -59,6 +70,10 @@ class OrderModel(BaseModel):
     order_status: The status of the order being placed.
     order_items: The items in the order.
     delivery_address: The address where the order is to be delivered.
+    total_price: Sum of the order items' total prices, kept in sync by signals.
+    total_items: Sum of the order items' quantities, kept in sync by signals.
+    stop_sequence: Position of the order in its courier's route when it was claimed in a batch.
+    queue_version: Kitchen queue version of the order's last change, from KitchenQueueVersion.
     """
     restaurant = models.ForeignKey(
         RestaurantModel,
@@ -106,15 +121,388 @@ class OrderModel(BaseModel):
         verbose_name='Delivery Address'
     )
 
+    total_price = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        db_index=True,
+        verbose_name='Total Price'
+    )
+    total_items = models.PositiveIntegerField(
+        default=0,
+        db_index=True,
+        verbose_name='Total Items'
+    )
+    stop_sequence = models.PositiveSmallIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Stop Sequence'
+    )
+    queue_version = models.PositiveBigIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Queue Version'
+    )
+
+    class Meta:
+        indexes = [
+            # courier feeds and status transitions: courier + order_status, oldest first
+            models.Index(fields=['courier', 'order_status', 'created_at'], name='order_courier_status_idx'),
+            # courier statistics: courier + created_at range
+            models.Index(fields=['courier', 'created_at'], name='order_courier_created_idx'),
+            # branch statistics and order acceptance: branch + order_status + created_at
+            models.Index(fields=['branch', 'order_status', 'created_at'], name='order_branch_status_idx'),
+            # restaurant statistics: restaurant + created_at range
+            models.Index(fields=['restaurant', 'created_at'], name='order_restaurant_created_idx'),
+            # kitchen queue delta sync: the branch's orders changed after a version
+            models.Index(fields=['branch', 'queue_version'], name='order_branch_queue_version_idx'),
+            # the courier dispatch queue: unassigned orders waiting for a courier
+            models.Index(
+                fields=['created_at', 'id'],
+                condition=models.Q(order_status=OrderStatus.PENDING_COURIER, courier__isnull=True, is_deleted=False),
+                name='order_dispatch_queue_idx',
+            ),
+        ]
+
     def __str__(self):
         return f"Order #{self.pk} | User: {self.user.phone_number}"
 
-    @property
-    def total_items(self):
-        return sum(item.quantity for item in self.order_items.all())
+    @classmethod
+    def refresh_totals(cls, order_ids):
+        """
+        Recalculate total_price and total_items for the given orders with a single UPDATE.
+        """
+        order_ids = list(order_ids)
+        if not order_ids:
+            return 0
+        items = cls.order_items.through.objects.filter(
+            ordermodel_id=OuterRef('pk')
+        ).values('ordermodel_id')
+        total_price = items.annotate(value=Sum('orderitemmodel__total_price')).values('value')
+        total_items = items.annotate(value=Sum('orderitemmodel__quantity')).values('value')
+        updated = cls.objects.filter(pk__in=order_ids).update(
+            total_price=Coalesce(
+                Subquery(total_price),
+                Value(Decimal('0')),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2)
+            ),
+            total_items=Coalesce(Subquery(total_items), Value(0)),
+        )
+        OrderHourlyRollup.refresh_for_orders(order_ids)
+        cls.mark_queue_changed(
+            cls.objects.filter(pk__in=order_ids, order_status__in=KITCHEN_QUEUE_STATUSES).values_list('id', flat=True))
+        return updated
+
+    @classmethod
+    def mark_queue_changed(cls, order_ids, branch_id=None):
+        """
+        Give the orders the next kitchen queue version of their branch.
+
+        Call it after the orders' own change, in the same transaction: the branch's counter
+        stays locked until the commit, so versions become visible in increasing order and a
+        client syncing from its last version never skips a change. branch_id saves the
+        lookup when every order belongs to the same known branch.
+        """
+        order_ids = list(order_ids)
+        if not order_ids:
+            return
+        if branch_id is not None:
+            by_branch = {branch_id: order_ids}
+        else:
+            by_branch = {}
+            for order_id, order_branch_id in cls.objects.filter(
+                    pk__in=order_ids, branch__isnull=False).values_list('id', 'branch_id'):
+                by_branch.setdefault(order_branch_id, []).append(order_id)
+        with transaction.atomic():
+            for order_branch_id, ids in by_branch.items():
+                version = KitchenQueueVersion.next_version(order_branch_id)
+                cls.objects.filter(pk__in=ids).update(queue_version=version)
+
+
+class KitchenQueueVersion(models.Model):
+    """
+    KitchenQueueVersion is the change counter of one branch's kitchen queue.
+    version: Incremented for every change to one of the branch's queue orders.
+
+    Kept apart from BranchModel so saving a branch never writes a stale counter back.
+    """
+    branch = models.OneToOneField(
+        BranchModel,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='kitchen_queue_version',
+        verbose_name='Branch'
+    )
+    version = models.PositiveBigIntegerField(default=0, verbose_name='Version')
+
+    class Meta:
+        verbose_name = 'Kitchen Queue Version'
+        verbose_name_plural = 'Kitchen Queue Versions'
+
+    def __str__(self):
+        return f"{self.branch_id}: {self.version}"
+
+    @classmethod
+    def current(cls, branch_id):
+        """
+        Return the branch's latest kitchen queue version, 0 before its first change.
+        """
+        return cls.objects.filter(branch_id=branch_id).values_list('version', flat=True).first() or 0
+
+    @classmethod
+    def next_version(cls, branch_id):
+        """
+        Increment the branch's counter and return the new version.
+        """
+        with transaction.atomic():
+            if not cls.objects.filter(branch_id=branch_id).update(version=F('version') + 1):
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(branch_id=branch_id, version=1)
+                    return 1
+                except IntegrityError:
+                    # another transaction created the counter first
+                    cls.objects.filter(branch_id=branch_id).update(version=F('version') + 1)
+            return cls.current(branch_id)
+
+
+class OrderHourlyRollup(models.Model):
+    """
+    OrderHourlyRollup holds the number of orders, revenue and items per
+    (restaurant, branch, courier, order_status, hour) for dashboard statistics.
+    hour: Start of the hour the orders were created in, in the project's local time zone.
+    orders_count: Number of orders in the bucket.
+    revenue: Sum of the orders' total_price.
+    items_count: Sum of the orders' total_items.
+
+    Buckets are recalculated from OrderModel whenever one of their orders is written,
+    so each row equals the matching GROUP BY over OrderModel. A unique constraint keeps
+    one row per key (a missing restaurant, branch or courier counting as one key), and
+    rows are written by upserting under it.
+    """
+    restaurant = models.ForeignKey(
+        RestaurantModel,
+        on_delete=models.SET_NULL,
+        related_name='order_rollups',
+        verbose_name='Restaurant',
+        null=True
+    )
+    branch = models.ForeignKey(
+        BranchModel,
+        on_delete=models.SET_NULL,
+        related_name='order_rollups',
+        verbose_name='Branch',
+        null=True
+    )
+    courier = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        related_name='order_rollups',
+        verbose_name='Courier',
+        null=True
+    )
+    order_status = models.CharField(
+        max_length=25,
+        choices=OrderStatus.choices,
+        verbose_name='Order Status'
+    )
+    hour = models.DateTimeField(verbose_name='Hour')
+    orders_count = models.PositiveIntegerField(default=0, verbose_name='Orders Count')
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='Revenue')
+    items_count = models.PositiveIntegerField(default=0, verbose_name='Items Count')
+
+    class Meta:
+        verbose_name = 'Order Hourly Rollup'
+        verbose_name_plural = 'Order Hourly Rollups'
+        indexes = [
+            models.Index(fields=['restaurant', 'hour'], name='rollup_restaurant_hour_idx'),
+            models.Index(fields=['branch', 'hour'], name='rollup_branch_hour_idx'),
+            models.Index(fields=['courier', 'hour'], name='rollup_courier_hour_idx'),
+        ]
+        constraints = [
+            # NULLs are distinct in a plain unique constraint, so the nullable keys are coalesced
+            models.UniqueConstraint(
+                Coalesce('restaurant', Value(0)), Coalesce('branch', Value(0)), Coalesce('courier', Value(0)),
+                'order_status', 'hour',
+                name='rollup_bucket_unique',
+            ),
+        ]
 
-    @property
-    def total_price(self):
-        return sum(item.total_price for item in self.order_items.all())
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H:00} | {self.order_status}: {self.orders_count}"
+
+    @staticmethod
+    def hour_bucket(value):
+        """
+        Return the start of the local hour containing the given datetime.
+        """
+        return timezone.localtime(value, timezone.get_default_timezone()).replace(minute=0, second=0, microsecond=0)
+
+    @classmethod
+    def order_bucket(cls, order):
+        """
+        Return the (restaurant_id, branch_id, courier_id, hour) bucket of an order instance.
+        """
+        return order.restaurant_id, order.branch_id, order.courier_id, cls.hour_bucket(order.created_at)
+
+    @classmethod
+    def stored_bucket(cls, order_id):
+        """
+        Return the bucket an order is counted in according to the database, or None if it doesn't exist.
+        """
+        order = OrderModel.objects.filter(pk=order_id).only(
+            'restaurant_id', 'branch_id', 'courier_id', 'created_at').first()
+        return cls.order_bucket(order) if order is not None else None
+
+    @classmethod
+    def refresh_for_orders(cls, order_ids):
+        """
+        Recalculate the buckets the given orders belong to.
+        """
+        order_ids = list(order_ids)
+        if not order_ids:
+            return
+        keys = OrderModel.objects.filter(pk__in=order_ids).values_list(
+            'restaurant_id', 'branch_id', 'courier_id', 'created_at'
+        )
+        cls.refresh_buckets({
+            (restaurant_id, branch_id, courier_id, cls.hour_bucket(created_at))
+            for restaurant_id, branch_id, courier_id, created_at in keys
+        })
+
+    @classmethod
+    def refresh_buckets(cls, buckets):
+        """
+        Recalculate (restaurant_id, branch_id, courier_id, hour) buckets from OrderModel.
+
+        The bucket's rows are locked before the orders are counted, so concurrent refreshes
+        of one bucket run one after the other; rows are then upserted under the unique key
+        and only the ones that changed are written.
+        """
+        for restaurant_id, branch_id, courier_id, hour in buckets:
+            key = {'restaurant_id': restaurant_id, 'branch_id': branch_id, 'courier_id': courier_id, 'hour': hour}
+            with transaction.atomic():
+                stored = {
+                    row.pop('order_status'): row
+                    for row in cls.objects.select_for_update().filter(**key).values(
+                        'order_status', 'orders_count', 'revenue', 'items_count')
+                }
+                counted = {
+                    row.pop('order_status'): row
+                    for row in OrderModel.objects.filter(
+                        created_at__gte=hour, created_at__lt=hour + timedelta(hours=1),
+                        restaurant_id=restaurant_id, branch_id=branch_id, courier_id=courier_id,
+                    ).order_by().values('order_status').annotate(
+                        orders_count=Count('pk'),
+                        revenue=Coalesce(Sum('total_price'), Value(Decimal('0'))),
+                        items_count=Coalesce(Sum('total_items'), Value(0)),
+                    )
+                }
+                insert_ignoring_conflicts(
+                    cls, [{'order_status': order_status} for order_status in counted if order_status not in stored],
+                    **key)
+                for order_status, totals in counted.items():
+                    if stored.get(order_status) != totals:
+                        cls.objects.filter(order_status=order_status, **key).update(**totals)
+                gone = [order_status for order_status in stored if order_status not in counted]
+                if gone:
+                    cls.objects.filter(order_status__in=gone, **key).delete()
+
+    @classmethod
+    def move_order(cls, source, target, revenue, items_count, orders_count=1):
+        """
+        Move orders' contribution from the source bucket to the target bucket.
+
+        source and target are (restaurant_id, branch_id, courier_id, order_status, hour) keys;
+        revenue and items_count are the totals of the orders_count orders moved.
+        Used when only an order's status or courier changes, so the hot buckets are
+        adjusted in place instead of being recalculated. The target row is upserted under
+        the unique key. If the source row is missing or holds less than what is moved, the
+        rollups have drifted from the orders, and both buckets are recalculated instead.
+        """
+        def key(bucket):
+            restaurant_id, branch_id, courier_id, order_status, hour = bucket
+            return {
+                'restaurant_id': restaurant_id, 'branch_id': branch_id, 'courier_id': courier_id,
+                'order_status': order_status, 'hour': hour,
+            }
 
-# Create your models here.
+        with transaction.atomic():
+            moved = cls.objects.filter(
+                orders_count__gte=orders_count, revenue__gte=revenue, items_count__gte=items_count, **key(source),
+            ).update(
+                orders_count=F('orders_count') - orders_count,
+                revenue=F('revenue') - revenue,
+                items_count=F('items_count') - items_count,
+            )
+            if not moved:
+                cls.refresh_buckets({(*source[:3], source[4]), (*target[:3], target[4])})
+                return
+            target_key = key(target)
+            insert_ignoring_conflicts(cls, [{'order_status': target_key.pop('order_status')}], **target_key)
+            cls.objects.filter(**key(target)).update(
+                orders_count=F('orders_count') + orders_count,
+                revenue=F('revenue') + revenue,
+                items_count=F('items_count') + items_count,
+            )
+
+    @classmethod
+    def status_totals(cls, start=None, **filters):
+        """
+        Return {status: {'orders_count', 'revenue', 'items_count'}} for orders created since start.
+
+        Whole hours are read from the rollups; the part of the first hour before start is
+        read from OrderModel, so the result matches filtering orders by created_at exactly.
+        The filters are applied to both models (e.g. branch__user=user, order_status=...).
+        """
+        totals = {
+            status: {'orders_count': 0, 'revenue': Decimal('0'), 'items_count': 0}
+            for status in OrderStatus.values
+        }
+        rollups = cls.objects.filter(**filters)
+        rollup_sums = {
+            'orders_count': Sum('orders_count'),
+            'revenue': Sum('revenue'),
+            'items_count': Sum('items_count'),
+        }
+        sources = [(rollups, rollup_sums)]
+        if start is not None:
+            first_full_hour = cls.hour_bucket(start)
+            if first_full_hour < start:
+                first_full_hour += timedelta(hours=1)
+            sources = [(rollups.filter(hour__gte=first_full_hour), rollup_sums)]
+            if start < first_full_hour:
+                orders = OrderModel.objects.filter(created_at__gte=start, created_at__lt=first_full_hour, **filters)
+                sources.append((orders, {
+                    'orders_count': Count('pk'),
+                    'revenue': Sum('total_price'),
+                    'items_count': Sum('total_items'),
+                }))
+
+        for queryset, aggregates in sources:
+            for row in queryset.order_by().values('order_status').annotate(**aggregates):
+                bucket = totals.setdefault(
+                    row['order_status'], {'orders_count': 0, 'revenue': Decimal('0'), 'items_count': 0})
+                for field in bucket:
+                    bucket[field] += row[field] or 0
+        return totals
+
+
+def rebuild_order_rollups(rollup_model=OrderHourlyRollup, order_model=OrderModel, batch_size=1000):
+    """
+    Replace every rollup row with a GROUP BY over the orders and return the number of rows.
+
+    Takes the models as arguments so migrations can run it on their historical models.
+    """
+    rows = order_model.objects.order_by().values(
+        'restaurant_id', 'branch_id', 'courier_id', 'order_status',
+        hour=TruncHour('created_at', tzinfo=timezone.get_default_timezone()),
+    ).annotate(
+        orders_count=Count('pk'),
+        revenue=Coalesce(Sum('total_price'), Value(Decimal('0'))),
+        items_count=Coalesce(Sum('total_items'), Value(0)),
+    )
+    with transaction.atomic():
+        rollup_model.objects.all().delete()
+        return len(rollup_model.objects.bulk_create(
+            (rollup_model(**row) for row in rows.iterator()), batch_size=batch_size))
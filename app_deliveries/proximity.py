@@ -0,0 +1,206 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.utils import timezone
+
+from app_branch.models import BranchDeliveryZone, BranchModel
+from app_common.geo import PolygonIndex, SpatialIndex, haversine_distance
+from app_courier.locations import location_buffer
+
+# Courier positions older than this are ignored: the courier is probably offline.
+POSITION_MAX_AGE = timedelta(minutes=5)
+
+# Branch and zone changes made by other worker processes are picked up after this many seconds.
+BRANCH_INDEX_TTL = 300
+
+
+class BranchLocations:
+    """
+    SpatialIndex of active, non-deleted branches that have coordinates.
+
+    Loaded from the database on first use, then kept current in this process by the
+    BranchModel signals once their writes commit (see app_deliveries.signals). Writes made
+    by other processes or by queryset.update() are picked up when the index expires after
+    `ttl` seconds.
+    """
+
+    def __init__(self, ttl=BRANCH_INDEX_TTL):
+        self.ttl = ttl
+        self._index = None
+        self._restaurants = {}
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    def index(self):
+        if self._index is None or time.monotonic() - self._loaded_at > self.ttl:
+            self.load()
+        return self._index
+
+    def load(self):
+        index = SpatialIndex()
+        restaurants = {}
+        branches = BranchModel.objects.filter(
+            is_active=True, is_deleted=False, latitude__isnull=False, longitude__isnull=False,
+        ).values_list('id', 'restaurant_id', 'latitude', 'longitude')
+        for branch_id, restaurant_id, latitude, longitude in branches.iterator(chunk_size=2000):
+            index.set(branch_id, latitude, longitude)
+            restaurants[branch_id] = restaurant_id
+        with self._lock:
+            self._index, self._restaurants, self._loaded_at = index, restaurants, time.monotonic()
+
+    def update(self, branch):
+        """
+        Index, move or drop one branch after it was saved.
+        """
+        if self._index is None:
+            return
+        if branch.is_active and not branch.is_deleted and branch.latitude is not None and branch.longitude is not None:
+            self._restaurants[branch.pk] = branch.restaurant_id
+            self._index.set(branch.pk, branch.latitude, branch.longitude)
+        else:
+            self.remove(branch.pk)
+
+    def remove(self, branch_id):
+        if self._index is None:
+            return
+        self._index.remove(branch_id)
+        self._restaurants.pop(branch_id, None)
+
+    def restaurant_of(self, branch_id):
+        return self._restaurants.get(branch_id)
+
+    def invalidate(self):
+        with self._lock:
+            self._index = None
+
+
+branch_locations = BranchLocations()
+
+
+class DeliveryZones:
+    """
+    PolygonIndex of the active delivery zones of active, non-deleted branches.
+
+    Loaded and expired like BranchLocations. Committed zone writes update it in place; a
+    branch write reloads it on the next lookup, since it can enable or disable every zone
+    of the branch at once. That reload also keeps the ids of the active branches current,
+    so a zone write needs no query to know whether its branch is active.
+    """
+
+    def __init__(self, ttl=BRANCH_INDEX_TTL):
+        self.ttl = ttl
+        self._index = None
+        self._branches = {}
+        self._active_branches = set()
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    def index(self):
+        if self._index is None or time.monotonic() - self._loaded_at > self.ttl:
+            self.load()
+        return self._index
+
+    def load(self):
+        index = PolygonIndex()
+        branches = {}
+        zones = BranchDeliveryZone.objects.filter(
+            is_active=True, is_deleted=False, branch__is_active=True, branch__is_deleted=False,
+        ).values_list('id', 'branch_id', 'polygon')
+        for zone_id, branch_id, polygon in zones.iterator(chunk_size=2000):
+            index.set(zone_id, polygon)
+            branches[zone_id] = branch_id
+        active_branches = set(
+            BranchModel.objects.filter(is_active=True, is_deleted=False).values_list('id', flat=True))
+        with self._lock:
+            self._index, self._branches, self._active_branches, self._loaded_at = (
+                index, branches, active_branches, time.monotonic())
+
+    def update(self, zone):
+        """
+        Index, replace or drop one zone after it was saved.
+        """
+        if self._index is None:
+            return
+        if zone.is_active and not zone.is_deleted and zone.branch_id in self._active_branches:
+            self._branches[zone.pk] = zone.branch_id
+            self._index.set(zone.pk, zone.polygon)
+        else:
+            self.remove(zone.pk)
+
+    def remove(self, zone_id):
+        if self._index is None:
+            return
+        self._index.remove(zone_id)
+        self._branches.pop(zone_id, None)
+
+    def branches_at(self, latitude, longitude):
+        """
+        Return the ids of the branches with a zone containing the point.
+        """
+        index = self.index()
+        return {self._branches[zone_id] for zone_id in index.containing(latitude, longitude)}
+
+    def invalidate(self):
+        with self._lock:
+            self._index = None
+
+
+delivery_zones = DeliveryZones()
+
+
+def _of_restaurant(restaurant_id):
+    if restaurant_id is None:
+        return None
+    return lambda branch_id: branch_locations.restaurant_of(branch_id) == restaurant_id
+
+
+def nearest_branches(latitude, longitude, k=5, max_distance=None, restaurant_id=None):
+    """
+    Return up to k (distance in meters, branch id) pairs nearest to the point, nearest first.
+    """
+    return branch_locations.index().nearest(latitude, longitude, k, max_distance, _of_restaurant(restaurant_id))
+
+
+def branches_within(latitude, longitude, radius, restaurant_id=None):
+    """
+    Return every (distance in meters, branch id) pair within radius meters of the point, nearest first.
+    """
+    return branch_locations.index().within(latitude, longitude, radius, _of_restaurant(restaurant_id))
+
+
+def serviceable_branches(latitude, longitude):
+    """
+    Return (distance in meters or None, branch id) pairs for every branch delivering to the point.
+
+    Branches are ordered nearest first; branches without coordinates come last.
+    """
+    locations = branch_locations.index()
+    found = []
+    for branch_id in delivery_zones.branches_at(latitude, longitude):
+        position = locations.get(branch_id)
+        distance = haversine_distance(latitude, longitude, *position) if position is not None else None
+        found.append((distance, branch_id))
+    found.sort(key=lambda item: (item[0] is None, item[0] or 0, item[1]))
+    return found
+
+
+def _is_fresh(courier_id):
+    position = location_buffer.latest(courier_id)
+    return position is not None and position.recorded_at >= timezone.now() - POSITION_MAX_AGE
+
+
+def nearest_couriers(latitude, longitude, k=5, max_distance=None):
+    """
+    Return up to k (distance in meters, courier id) pairs nearest to the point, nearest first.
+
+    Only couriers that reported a position in the last POSITION_MAX_AGE are considered.
+    """
+    return location_buffer.index.nearest(latitude, longitude, k, max_distance, _is_fresh)
+
+
+def couriers_within(latitude, longitude, radius):
+    """
+    Return every (distance in meters, courier id) pair within radius meters of the point, nearest first.
+    """
+    return location_buffer.index.within(latitude, longitude, radius, _is_fresh)
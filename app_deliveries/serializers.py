@@ -1,5 +1,9 @@
+from django.db import transaction
+from django.db.models import Prefetch
 from rest_framework import serializers
 
+from app_basket.models import BasketModel
+from app_common.images import image_urls
 from app_company.models import RestaurantModel
 from app_deliveries.models import OrderModel, OrderItemModel
 
@@ -7,32 +11,83 @@ from app_deliveries.models import OrderModel, OrderItemModel
 class OrderSerializer(serializers.ModelSerializer):
     """
     Serializer for OrderModel.
+
+    select_related_fields and prefetch_related_fields declare every relation read by
+    to_representation, so a page of orders is rendered with a fixed number of queries.
     """
+    select_related_fields = ('restaurant', 'branch__user', 'user', 'courier', 'delivery_address')
+    prefetch_related_fields = (
+        'courier__courier',
+        Prefetch('order_items', queryset=OrderItemModel.objects.select_related('product__category')),
+    )
+
+    basket = serializers.PrimaryKeyRelatedField(queryset=BasketModel.objects.none(), write_only=True)
+
     class Meta:
         model = OrderModel
         fields = '__all__'
-        read_only_fields = ['id', 'user', 'courier', 'order_status', 'order_items']
+        read_only_fields = [
+            'id', 'user', 'courier', 'order_status', 'order_items', 'total_price', 'total_items', 'stop_sequence',
+        ]
+
+    def get_fields(self):
+        """
+        Limit `basket` to the baskets of the requesting user, so nobody can check out another user's basket.
+        """
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is not None and request.user.is_authenticated:
+            fields['basket'].queryset = BasketModel.objects.filter(user=request.user)
+        return fields
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """
+        Apply the serializer's eager-loading plan to an order queryset.
+        """
+        return queryset.select_related(*cls.select_related_fields).prefetch_related(*cls.prefetch_related_fields)
 
+    @transaction.atomic
     def create(self, validated_data):
         """
-        Create a new order with the provided data.
+        Create a new order from the basket in a single transaction.
+
+        The basket items and their product prices are read with one query, the order items
+        and their through-table rows are bulk-inserted and the basket is cleared with one
+        DELETE, so checkout costs the same number of queries for any basket size.
         """
         basket = validated_data.pop('basket')
-        order = OrderModel.objects.create(**validated_data)
-        for item in basket.items.all():
-            # Create an order item for each item in the basket
-            item_data = dict()
-
-            item_data['price_per_item'] = item.product.price
-            item_data['quantity'] = item.quantity
-            item_data['total_price'] = item.product.price * item.quantity
-            # Create an order item for each item in the basket and add it to the order
-            order_item = OrderItemModel.objects.create(order=order, **item_data)
-            order.items.add(order_item)
-            # Remove the item from the basket
-            basket.items.remove(item)
-            basket.save()
-        order.save()
+        basket_items = list(basket.items.values_list('id', 'product_id', 'quantity', 'product__price'))
+        if not basket_items:
+            raise serializers.ValidationError('Basket must not be empty.')
+
+        order_items = [
+            OrderItemModel(
+                product_id=product_id,
+                quantity=quantity,
+                price_per_item=price,
+                total_price=price * quantity,
+            ) for _, product_id, quantity, price in basket_items
+        ]
+        order = OrderModel.objects.create(
+            total_price=sum(item.total_price for item in order_items),
+            total_items=sum(item.quantity for item in order_items),
+            **validated_data
+        )
+        OrderItemModel.objects.bulk_create(order_items)
+        order_items_through = OrderModel.order_items.through
+        order_items_through.objects.bulk_create([
+            order_items_through(ordermodel_id=order.pk, orderitemmodel_id=item.pk) for item in order_items
+        ])
+
+        # Remove the items from the basket; a concurrent checkout of the same basket
+        # would already have removed them, in which case this order is rolled back.
+        removed, _ = BasketModel.items.through.objects.filter(
+            basketmodel_id=basket.pk,
+            basketitemmodel_id__in=[item_id for item_id, *_ in basket_items]
+        ).delete()
+        if removed != len(basket_items):
+            raise serializers.ValidationError('Basket was modified during checkout.')
         return order
 
     def update(self, instance, validated_data):
@@ -50,7 +105,7 @@ class OrderSerializer(serializers.ModelSerializer):
         """
         # Check if the basket exists and is not empty
         basket = attrs.get('basket')
-        if not basket or not basket.items.all():
+        if not basket or not basket.items.exists():
             raise serializers.ValidationError('Basket must not be empty.')
         return attrs
 
@@ -58,31 +113,36 @@ class OrderSerializer(serializers.ModelSerializer):
         """
         Customize the representation of the order data.
         """
-        # Add the total items and total price to the representation
         data = super().to_representation(instance)
         data.pop('is_deleted', None)
 
         data['restaurant'] = {
             "id": instance.restaurant.id,
-            "name": instance.restaurant.name
-        }
+            "name": instance.restaurant.name,
+            "logo": image_urls(instance.restaurant.logo, instance.restaurant.logo_variants)
+        } if instance.restaurant else None
         data['branch'] = {
             "id": instance.branch.id,
             "unique_name": instance.branch.name,
-            "phone_number": instance.branch.user.phone_number,
+            "phone_number": instance.branch.user.phone_number if instance.branch.user else None,
             "address": instance.branch.address
-        }
+        } if instance.branch else None
         data['user'] = {
             "id": instance.user.id,
             "first_name": instance.user.first_name,
             "phone_number": instance.user.phone_number
-        }
-        data['courier'] = {
-            "id": instance.courier.id,
-            "unique_name": instance.courier.courier.name,
-            "first_name": instance.courier.first_name,
-            "phone_number": instance.courier.phone_number
-        }
+        } if instance.user else None
+        if instance.courier:
+            # courier.courier is a reverse relation, read from the prefetch cache
+            courier_profile = next(iter(instance.courier.courier.all()), None)
+            data['courier'] = {
+                "id": instance.courier.id,
+                "unique_name": courier_profile.name if courier_profile else None,
+                "first_name": instance.courier.first_name,
+                "phone_number": instance.courier.phone_number
+            }
+        else:
+            data['courier'] = None
         data['delivery_address'] = {
             "id": instance.delivery_address.id,
             "address": instance.delivery_address.address
@@ -96,8 +156,6 @@ class OrderSerializer(serializers.ModelSerializer):
                 'quantity': item.quantity,
                 'price_per_item': item.price_per_item,
                 'total_price': item.total_price
-            } for item in instance.items.all()
+            } for item in instance.order_items.all()
         ]
-        data['total_items'] = instance.total_items
-        data['total_price'] = instance.total_price
         return data
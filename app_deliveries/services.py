@@ -0,0 +1,137 @@
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from app_deliveries.events import order_status_changed
+from app_deliveries.models import (
+    KITCHEN_QUEUE_STATUSES, KitchenQueueVersion, OrderHourlyRollup, OrderModel, OrderStatus,
+)
+
+
+class InvalidOrderTransition(Exception):
+    """
+    Raised when an order status change is not allowed by the order state machine.
+    """
+
+
+# Order state machine: current status -> statuses it may move to.
+ORDER_TRANSITIONS = {
+    OrderStatus.PENDING_COURIER: {OrderStatus.PENDING_RESTAURANT, OrderStatus.CANCELED},
+    OrderStatus.PENDING_RESTAURANT: {OrderStatus.CONFIRMED_RESTAURANT, OrderStatus.CANCELED},
+    OrderStatus.CONFIRMED_RESTAURANT: {OrderStatus.DELIVERING, OrderStatus.CANCELED},
+    OrderStatus.DELIVERING: {OrderStatus.DELIVERED},
+    OrderStatus.DELIVERED: set(),
+    OrderStatus.CANCELED: set(),
+}
+
+# How many times transition_next_order retries after losing a race for a candidate order.
+CLAIM_RETRIES = 3
+
+
+def check_transition(source: str, target: str) -> None:
+    """
+    Raise InvalidOrderTransition if an order may not move from source to target.
+    """
+    if target not in ORDER_TRANSITIONS.get(source, ()):
+        raise InvalidOrderTransition(f"Order can not move from '{source}' to '{target}'.")
+
+
+def transition_order(order_id: int, source: str, target: str, **filters) -> bool:
+    """
+    Move one order from source to target with a single conditional UPDATE.
+
+    The UPDATE only matches while the order is still in the source status, so concurrent
+    requests can not both apply the transition. Extra filters restrict the order further
+    (e.g. to the requesting courier). Returns True if the order was changed.
+    """
+    check_transition(source, target)
+    with transaction.atomic():
+        updated = OrderModel.objects.filter(pk=order_id, order_status=source, **filters).update(
+            order_status=target,
+            updated_at=timezone.now(),
+        )
+        if updated:
+            order = OrderModel.objects.values(
+                'restaurant_id', 'branch_id', 'courier_id', 'created_at', 'total_price', 'total_items'
+            ).get(pk=order_id)
+            key = (order['restaurant_id'], order['branch_id'], order['courier_id'])
+            hour = OrderHourlyRollup.hour_bucket(order['created_at'])
+            OrderHourlyRollup.move_order(
+                (*key, source, hour), (*key, target, hour), order['total_price'], order['total_items'])
+            in_kitchen_queue = source in KITCHEN_QUEUE_STATUSES or target in KITCHEN_QUEUE_STATUSES
+            if in_kitchen_queue and order['branch_id'] is not None:
+                OrderModel.mark_queue_changed([order_id], order['branch_id'])
+            order_status_changed(order_id, target, order['courier_id'])
+    return updated == 1
+
+
+def transition_orders(order_ids, source: str, target: str, **filters) -> list:
+    """
+    Move the given orders from source to target with a single UPDATE and return the ids changed.
+
+    Orders that don't match the filters or are no longer in the source status are left
+    alone. The matching orders are read (and locked where the database supports it)
+    before the UPDATE; if another request changed one of them in between, the whole
+    transition is rolled back and retried. Rollups are moved once per bucket.
+    """
+    check_transition(source, target)
+    order_ids = list(order_ids)
+    for _ in range(CLAIM_RETRIES):
+        with transaction.atomic():
+            # locked in id order, so two overlapping requests can't deadlock
+            candidates = OrderModel.objects.filter(pk__in=order_ids, order_status=source, **filters).order_by('pk')
+            if connection.features.has_select_for_update_of:
+                candidates = candidates.select_for_update(of=('self',))
+            orders = list(candidates.values(
+                'id', 'restaurant_id', 'branch_id', 'courier_id', 'created_at', 'total_price', 'total_items'))
+            if not orders:
+                return []
+            changed = [order['id'] for order in orders]
+            fields = {}
+            branch_ids = {order['branch_id'] for order in orders}
+            in_kitchen_queue = source in KITCHEN_QUEUE_STATUSES or target in KITCHEN_QUEUE_STATUSES
+            if in_kitchen_queue and len(branch_ids) == 1 and None not in branch_ids:
+                # the orders are locked already, so the version goes into the same UPDATE
+                fields['queue_version'] = KitchenQueueVersion.next_version(branch_ids.pop())
+            updated = OrderModel.objects.filter(pk__in=changed, order_status=source).update(
+                order_status=target,
+                updated_at=timezone.now(),
+                **fields,
+            )
+            if updated != len(changed):
+                transaction.set_rollback(True)
+                continue
+
+            buckets = {}
+            for order in orders:
+                key = (order['restaurant_id'], order['branch_id'], order['courier_id'],
+                       OrderHourlyRollup.hour_bucket(order['created_at']))
+                count, revenue, items_count = buckets.get(key, (0, 0, 0))
+                buckets[key] = (count + 1, revenue + order['total_price'], items_count + order['total_items'])
+            for (*key, hour), (count, revenue, items_count) in buckets.items():
+                OrderHourlyRollup.move_order((*key, source, hour), (*key, target, hour), revenue, items_count, count)
+            if in_kitchen_queue and 'queue_version' not in fields:
+                OrderModel.mark_queue_changed(changed)
+            for order in orders:
+                order_status_changed(order['id'], target, order['courier_id'])
+            return changed
+    return []
+
+
+def transition_next_order(source: str, target: str, **filters):
+    """
+    Move the next order matching the filters from source to target.
+
+    Orders claimed in a batch go in their stop_sequence order, other orders oldest first.
+    Returns the id of the changed order, or None if there was no order to change.
+    """
+    check_transition(source, target)
+    candidates = OrderModel.objects.filter(order_status=source, **filters).order_by(
+        F('stop_sequence').asc(nulls_last=True), 'created_at', 'id')
+    for _ in range(CLAIM_RETRIES):
+        order_id = candidates.values_list('id', flat=True).first()
+        if order_id is None:
+            return None
+        if transition_order(order_id, source, target, **filters):
+            return order_id
+    return None
@@ -0,0 +1,120 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from app_branch.models import BranchDeliveryZone, BranchModel
+from app_deliveries.models import KITCHEN_QUEUE_STATUSES, OrderHourlyRollup, OrderItemModel, OrderModel
+from app_deliveries.proximity import branch_locations, delivery_zones
+
+
+@receiver(m2m_changed, sender=OrderModel.order_items.through)
+def order_items_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keep the stored order totals in sync when items are added to or removed from an order.
+    """
+    if action == 'pre_clear' and reverse:
+        # The affected orders are only known before the clear happens.
+        instance._cleared_order_ids = list(instance.orders.values_list('id', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            OrderModel.refresh_totals([instance.pk])
+        elif action == 'post_clear':
+            OrderModel.refresh_totals(getattr(instance, '_cleared_order_ids', []))
+        else:
+            OrderModel.refresh_totals(pk_set or [])
+
+
+@receiver(post_save, sender=OrderItemModel)
+def order_item_saved(sender, instance, created, **kwargs):
+    """
+    Recalculate the totals of every order containing an updated item.
+    """
+    if created:
+        return
+    OrderModel.refresh_totals(instance.orders.values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=OrderItemModel)
+def order_item_pre_delete(sender, instance, **kwargs):
+    """
+    Remember the orders of an item before its through rows are deleted.
+    """
+    instance._deleted_order_ids = list(instance.orders.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=OrderItemModel)
+def order_item_deleted(sender, instance, **kwargs):
+    """
+    Recalculate the totals of the orders that contained a deleted item.
+    """
+    OrderModel.refresh_totals(getattr(instance, '_deleted_order_ids', []))
+
+
+@receiver(pre_save, sender=OrderModel)
+def order_pre_save(sender, instance, **kwargs):
+    """
+    Remember the rollup bucket an updated order was counted in, before a new courier, branch
+    or restaurant moves it.
+    """
+    instance._stored_rollup_bucket = OrderHourlyRollup.stored_bucket(instance.pk) if instance.pk else None
+
+
+@receiver(post_save, sender=OrderModel)
+def order_saved(sender, instance, created, **kwargs):
+    """
+    Recalculate the hourly rollup buckets an order left and joined, and version it in its
+    branch's kitchen queue unless it is a new order that isn't in the queue.
+    """
+    buckets = {OrderHourlyRollup.order_bucket(instance)}
+    if getattr(instance, '_stored_rollup_bucket', None) is not None:
+        buckets.add(instance._stored_rollup_bucket)
+    OrderHourlyRollup.refresh_buckets(buckets)
+    if instance.branch_id is not None and (not created or instance.order_status in KITCHEN_QUEUE_STATUSES):
+        OrderModel.mark_queue_changed([instance.pk], instance.branch_id)
+
+
+@receiver(post_delete, sender=OrderModel)
+def order_deleted(sender, instance, **kwargs):
+    """
+    Recalculate the hourly rollup bucket a deleted order was counted in.
+    """
+    OrderHourlyRollup.refresh_buckets([(
+        instance.restaurant_id, instance.branch_id, instance.courier_id,
+        OrderHourlyRollup.hour_bucket(instance.created_at),
+    )])
+
+
+@receiver(post_save, sender=BranchModel)
+def branch_saved(sender, instance, **kwargs):
+    """
+    Keep the branch spatial index in step with a saved branch, once the save commits.
+    """
+    transaction.on_commit(partial(branch_locations.update, instance))
+    transaction.on_commit(delivery_zones.invalidate)
+
+
+@receiver(post_delete, sender=BranchModel)
+def branch_deleted(sender, instance, **kwargs):
+    """
+    Drop a deleted branch from the branch spatial index, once the delete commits.
+    """
+    transaction.on_commit(partial(branch_locations.remove, instance.pk))
+    transaction.on_commit(delivery_zones.invalidate)
+
+
+@receiver(post_save, sender=BranchDeliveryZone)
+def delivery_zone_saved(sender, instance, **kwargs):
+    """
+    Keep the delivery zone index in step with a saved zone, once the save commits.
+    """
+    transaction.on_commit(partial(delivery_zones.update, instance))
+
+
+@receiver(post_delete, sender=BranchDeliveryZone)
+def delivery_zone_deleted(sender, instance, **kwargs):
+    """
+    Drop a deleted zone from the delivery zone index, once the delete commits.
+    """
+    transaction.on_commit(partial(delivery_zones.remove, instance.pk))
@@ -1,3 +1,376 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import QuerySet
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from app_basket.models import BasketItemModel, BasketModel
+from app_branch.models import BranchModel
+from app_branch.views import BranchStatistics, KitchenQueue
+from app_company.models import RestaurantModel
+from app_courier.models import CourierModel
+from app_courier.views import MyDeliveredDeliveries, StatisticsCourier
+from app_deliveries.models import OrderHourlyRollup, OrderItemModel, OrderModel, OrderStatus
+from app_deliveries.proximity import branch_locations, branches_within, nearest_branches
+from app_deliveries.serializers import OrderSerializer
+from app_deliveries.services import InvalidOrderTransition, transition_next_order, transition_order
+from app_products.models import CategoryModel, ProductsModel
+from app_users.models import UserLocations, UserModel, UserRoleChoice
+
+
+class OrderFixturesMixin:
+    """
+    Builds restaurants, branches, couriers and orders for the order tests.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.restaurant_user = UserModel.objects.create(
+            username='restaurant', phone_number='100', role=UserRoleChoice.RESTAURANT)
+        cls.branch_user = UserModel.objects.create(
+            username='branch', phone_number='200', role=UserRoleChoice.BRANCH)
+        cls.courier_user = UserModel.objects.create(
+            username='courier', phone_number='300', role=UserRoleChoice.COURIER)
+        cls.customer = UserModel.objects.create(username='customer', phone_number='400')
+        CourierModel.objects.create(name='courier-1', user=cls.courier_user)
+        cls.restaurant = RestaurantModel.objects.create(user=cls.restaurant_user, name='Restaurant', logo='logo.png')
+        cls.branch = BranchModel.objects.create(
+            user=cls.branch_user, name='Branch', address='Street 1', restaurant=cls.restaurant)
+        cls.location = UserLocations.objects.create(user=cls.customer, address='Street 2')
+        cls.category = CategoryModel.objects.create(name='Drinks')
+        cls.product = ProductsModel.objects.create(
+            name='Tea', description='Green tea', price=5, category=cls.category)
+
+    @classmethod
+    def create_order(cls, items=1, order_status=OrderStatus.DELIVERED):
+        order = OrderModel.objects.create(
+            restaurant=cls.restaurant,
+            branch=cls.branch,
+            user=cls.customer,
+            courier=cls.courier_user,
+            delivery_address=cls.location,
+            order_status=order_status,
+        )
+        order.order_items.add(*[
+            OrderItemModel.objects.create(product=cls.product, quantity=2, price_per_item=5, total_price=10)
+            for _ in range(items)
+        ])
+        return order
+
+
+class OrderSerializerQueryBudgetTest(OrderFixturesMixin, TestCase):
+    """
+    A page of orders must cost the same number of queries however many items the orders have.
+    """
+    # page query, courier profiles prefetch, order items prefetch
+    query_budget = 3
+
+    def list_orders(self, view_class, user, query_budget=None):
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user=user)
+        with self.assertNumQueries(query_budget or self.query_budget):
+            response = view_class.as_view()(request)
+            response.render()
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_my_delivered_deliveries_budget(self):
+        for _ in range(3):
+            self.create_order(items=1)
+        self.list_orders(MyDeliveredDeliveries, self.courier_user)
+
+        for _ in range(7):
+            self.create_order(items=5)
+        response = self.list_orders(MyDeliveredDeliveries, self.courier_user)
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertEqual(response.data['results'][0]['restaurant']['logo'], {
+            'url': '/media/logo.png', 'variants': {'thumb': None, 'medium': None, 'large': None}})
+
+    def test_kitchen_queue_budget(self):
+        for items in (1, 3, 8):
+            self.create_order(items=items, order_status=OrderStatus.PENDING_RESTAURANT)
+        # the page budget plus the queue version
+        response = self.list_orders(KitchenQueue, self.branch_user, query_budget=self.query_budget + 1)
+        self.assertEqual(
+            [order['total_items'] for order in response.data['orders']],
+            [sum(item['quantity'] for item in order['order_items']) for order in response.data['orders']],
+        )
+
+    def test_branch_statistics_budget(self):
+        for items in (1, 4, 9):
+            self.create_order(items=items)
+        self.create_order(items=2, order_status=OrderStatus.CANCELED)
+        # the page budget plus one GROUP BY for the status counts
+        response = self.list_orders(BranchStatistics, self.branch_user, query_budget=self.query_budget + 1)
+        results = response.data['results']
+        self.assertEqual(results['delivered'], 3)
+        self.assertEqual(results['canceled'], 1)
+        self.assertEqual(results['pending_to_accept'], 0)
+        self.assertEqual(results['total_orders'], 4)
+
+    def test_courier_statistics_budget(self):
+        for items in (1, 6):
+            self.create_order(items=items)
+        self.create_order(items=2, order_status=OrderStatus.CANCELED)
+        self.create_order(items=3, order_status=OrderStatus.PENDING_COURIER)
+        # the statistics aggregate, the page and the eager-loaded pending order
+        response = self.list_orders(StatisticsCourier, self.courier_user, query_budget=1 + 2 * self.query_budget)
+        stats = response.data
+        self.assertEqual(stats['total_assigned_orders'], 4)
+        self.assertEqual(stats['total_delivered_orders'], 2)
+        self.assertEqual(stats['total_canceled_orders'], 1)
+        self.assertEqual(stats['total_pending_orders'], 1)
+        self.assertEqual(stats['total_sum'], 70)
+        self.assertEqual(stats['average_delivered_order_price'], 35)
+        self.assertEqual(stats['pending_order']['total_items'], 6)
+        self.assertEqual(len(stats['data']['results']), 4)
+        self.assertIsNone(stats['data']['next'])
+
+
+class OrderTotalsTest(OrderFixturesMixin, TestCase):
+    """
+    The stored total_price and total_items follow every change to an order's items.
+    """
+
+    def totals(self, order):
+        return OrderModel.objects.filter(pk=order.pk).values_list('total_price', 'total_items').get()
+
+    def item(self, quantity, price=5):
+        return OrderItemModel.objects.create(
+            product=self.product, quantity=quantity, price_per_item=price, total_price=price * quantity)
+
+    def test_item_changes_refresh_totals(self):
+        order = self.create_order(items=2)
+        self.assertEqual(self.totals(order), (20, 4))
+
+        extra = self.item(3)
+        order.order_items.add(extra)
+        self.assertEqual(self.totals(order), (35, 7))
+
+        extra.quantity, extra.total_price = 1, 5
+        extra.save()
+        self.assertEqual(self.totals(order), (25, 5))
+
+        order.order_items.remove(extra)
+        self.assertEqual(self.totals(order), (20, 4))
+
+        other = self.create_order(items=0)
+        extra.orders.add(order, other)
+        self.assertEqual((self.totals(order), self.totals(other)), ((25, 5), (5, 1)))
+
+        extra.orders.clear()
+        self.assertEqual((self.totals(order), self.totals(other)), ((20, 4), (0, 0)))
+
+        order.order_items.first().delete()
+        self.assertEqual(self.totals(order), (10, 2))
+
+        order.order_items.clear()
+        self.assertEqual(self.totals(order), (0, 0))
+
+    def test_refresh_totals(self):
+        orders = [self.create_order(items=items) for items in (1, 3)]
+        OrderModel.objects.update(total_price=0, total_items=0)
+        self.assertEqual(OrderModel.refresh_totals([order.pk for order in orders]), 2)
+        self.assertEqual([self.totals(order) for order in orders], [(10, 2), (30, 6)])
+        self.assertEqual(OrderModel.refresh_totals([]), 0)
+
+    def test_backfill_command(self):
+        orders = [self.create_order(items=items) for items in (1, 2, 4)]
+        OrderModel.objects.update(total_price=999, total_items=999)
+        out = StringIO()
+        call_command('backfill_order_totals', batch_size=2, stdout=out)
+        self.assertIn('Backfilled totals for 3 orders.', out.getvalue())
+        self.assertEqual([self.totals(order) for order in orders], [(10, 2), (20, 4), (40, 8)])
+
+
+class CheckoutTest(OrderFixturesMixin, TestCase):
+    """
+    Checkout turns the user's own basket into an order in one transaction, with a fixed number of queries.
+    """
+
+    def fill_basket(self, size, user=None):
+        basket = BasketModel.objects.create(user=user or self.customer)
+        basket.items.add(*BasketItemModel.objects.bulk_create([
+            BasketItemModel(product=self.product, quantity=2) for _ in range(size)]))
+        return basket
+
+    def serializer(self, basket, user=None):
+        request = Request(APIRequestFactory().post('/'))
+        request.user = user or self.customer
+        return OrderSerializer(
+            data={'basket': basket.pk, 'delivery_address': self.location.pk}, context={'request': request})
+
+    def test_query_count_does_not_grow_with_basket(self):
+        def queries_for(size):
+            basket = self.fill_basket(size)
+            serializer = self.serializer(basket)
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+            with CaptureQueriesContext(connection) as queries:
+                order = serializer.save(user=self.customer)
+            self.assertEqual((order.total_items, order.total_price), (2 * size, 10 * size))
+            self.assertEqual(order.order_items.count(), size)
+            self.assertFalse(basket.items.exists())
+            return len(queries)
+
+        queries_for(1)  # creates the rollup bucket the later checkouts update
+        self.assertEqual(queries_for(2), queries_for(20))
+
+    def test_other_users_basket(self):
+        serializer = self.serializer(self.fill_basket(1, user=self.courier_user))
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('basket', serializer.errors)
+
+    def test_modified_basket_rolls_back(self):
+        basket = self.fill_basket(3)
+        serializer = self.serializer(basket)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        orders, items = OrderModel.objects.count(), OrderItemModel.objects.count()
+        # a concurrent checkout took the basket's items between the read and the DELETE
+        with mock.patch.object(QuerySet, 'delete', return_value=(2, {})):
+            with self.assertRaisesMessage(ValidationError, 'Basket was modified during checkout.'):
+                serializer.save(user=self.customer)
+        self.assertEqual((OrderModel.objects.count(), OrderItemModel.objects.count()), (orders, items))
+        self.assertEqual(basket.items.count(), 3)
+
+
+class OrderTransitionTest(OrderFixturesMixin, TestCase):
+    """
+    Order status transitions are compare-and-set updates on the current status.
+    """
+
+    def test_transition_applies_once(self):
+        order = self.create_order(order_status=OrderStatus.PENDING_RESTAURANT)
+        self.assertTrue(transition_order(order.pk, OrderStatus.PENDING_RESTAURANT, OrderStatus.CONFIRMED_RESTAURANT))
+        self.assertFalse(transition_order(order.pk, OrderStatus.PENDING_RESTAURANT, OrderStatus.CONFIRMED_RESTAURANT))
+        order.refresh_from_db()
+        self.assertEqual(order.order_status, OrderStatus.CONFIRMED_RESTAURANT)
+
+    def test_transition_respects_filters(self):
+        order = self.create_order(order_status=OrderStatus.PENDING_RESTAURANT)
+        self.assertFalse(transition_order(
+            order.pk, OrderStatus.PENDING_RESTAURANT, OrderStatus.CONFIRMED_RESTAURANT, branch__user=self.customer))
+
+    def test_invalid_transition_is_rejected(self):
+        order = self.create_order(order_status=OrderStatus.DELIVERED)
+        with self.assertRaises(InvalidOrderTransition):
+            transition_order(order.pk, OrderStatus.DELIVERED, OrderStatus.DELIVERING)
+
+    def test_next_order_takes_the_oldest(self):
+        first = self.create_order(order_status=OrderStatus.DELIVERING)
+        second = self.create_order(order_status=OrderStatus.DELIVERING)
+        courier = {'courier': self.courier_user}
+        self.assertEqual(transition_next_order(OrderStatus.DELIVERING, OrderStatus.DELIVERED, **courier), first.pk)
+        self.assertEqual(transition_next_order(OrderStatus.DELIVERING, OrderStatus.DELIVERED, **courier), second.pk)
+        self.assertIsNone(transition_next_order(OrderStatus.DELIVERING, OrderStatus.DELIVERED, **courier))
+
+
+class OrderIndexesTest(TestCase):
+    """
+    Every order queryset used by the views must be served by an index.
+    """
+
+    def test_no_full_scans(self):
+        call_command('check_order_indexes', stdout=StringIO())
+
+
+class OrderHourlyRollupTest(OrderFixturesMixin, TestCase):
+    """
+    The hourly rollups always match a GROUP BY over the orders.
+    """
+
+    def rollup_rows(self):
+        return sorted(OrderHourlyRollup.objects.values_list(
+            'branch_id', 'courier_id', 'order_status', 'orders_count', 'revenue', 'items_count'))
+
+    def test_rollups_follow_writes(self):
+        first = self.create_order(items=2, order_status=OrderStatus.PENDING_RESTAURANT)
+        self.create_order(items=1, order_status=OrderStatus.PENDING_RESTAURANT)
+        transition_order(first.pk, OrderStatus.PENDING_RESTAURANT, OrderStatus.CONFIRMED_RESTAURANT)
+        first.order_items.first().delete()
+
+        totals = OrderHourlyRollup.status_totals(branch=self.branch)
+        self.assertEqual(totals[OrderStatus.CONFIRMED_RESTAURANT]['orders_count'], 1)
+        self.assertEqual(totals[OrderStatus.CONFIRMED_RESTAURANT]['revenue'], 10)
+        self.assertEqual(totals[OrderStatus.PENDING_RESTAURANT]['items_count'], 2)
+
+        incremental = self.rollup_rows()
+        call_command('rebuild_order_rollups', stdout=StringIO())
+        self.assertEqual(self.rollup_rows(), incremental)
+
+    def test_moved_order_leaves_its_old_bucket(self):
+        order = self.create_order(items=1)
+        order.refresh_from_db()
+        order.courier = None
+        order.save()
+        self.assertEqual(self.rollup_rows(), [(self.branch.pk, None, OrderStatus.DELIVERED, 1, 10, 2)])
+
+        # a bucket row duplicated by hand is refused by the unique key
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            OrderHourlyRollup.objects.create(
+                branch=self.branch, restaurant=self.restaurant, order_status=OrderStatus.DELIVERED,
+                hour=OrderHourlyRollup.hour_bucket(order.created_at))
+
+    def test_move_from_drifted_bucket_recalculates(self):
+        order = self.create_order(items=1, order_status=OrderStatus.PENDING_RESTAURANT)
+        OrderHourlyRollup.objects.all().delete()
+        self.assertTrue(transition_order(order.pk, OrderStatus.PENDING_RESTAURANT, OrderStatus.CONFIRMED_RESTAURANT))
+        self.assertEqual(
+            self.rollup_rows(), [(self.branch.pk, self.courier_user.pk, OrderStatus.CONFIRMED_RESTAURANT, 1, 10, 2)])
+
+    def test_status_totals_respect_start(self):
+        order = self.create_order(items=1)
+        self.assertEqual(OrderHourlyRollup.status_totals(order.created_at, courier=self.courier_user)[
+            OrderStatus.DELIVERED]['orders_count'], 1)
+        after = order.created_at + timedelta(seconds=1)
+        self.assertEqual(OrderHourlyRollup.status_totals(after, courier=self.courier_user)[
+            OrderStatus.DELIVERED]['orders_count'], 0)
+
+
+class BranchProximityTest(OrderFixturesMixin, TestCase):
+    """
+    The branch spatial index follows branch writes and filters by restaurant.
+    """
+
+    def setUp(self):
+        branch_locations.invalidate()
+        BranchModel.objects.filter(pk=self.branch.pk).update(latitude=41.3, longitude=69.28)
+
+    def tearDown(self):
+        branch_locations.invalidate()
+
+    def test_nearest_branches_follow_writes(self):
+        [(distance, branch_id)] = nearest_branches(41.31, 69.28)
+        self.assertEqual(branch_id, self.branch.pk)
+        self.assertAlmostEqual(distance, 1112, delta=1)
+
+        other_restaurant = RestaurantModel.objects.create(user=self.customer, name='Other', logo='logo.png')
+        with self.captureOnCommitCallbacks(execute=True):
+            closer = BranchModel.objects.create(
+                name='Closer', address='Street 3', restaurant=other_restaurant, latitude=41.309, longitude=69.28)
+        self.assertEqual([branch_id for _, branch_id in nearest_branches(41.31, 69.28, k=2)], [closer.pk, self.branch.pk])
+        self.assertEqual(
+            [branch_id for _, branch_id in nearest_branches(41.31, 69.28, restaurant_id=self.restaurant.pk)],
+            [self.branch.pk])
+
+        closer.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            closer.save()
+        self.assertEqual([branch_id for _, branch_id in branches_within(41.31, 69.28, 2000)], [self.branch.pk])
+        self.assertEqual(branches_within(41.31, 69.28, 500), [])
 
-# Create your tests here.
+    def test_rolled_back_write_is_not_indexed(self):
+        nearest_branches(41.31, 69.28)
+        with transaction.atomic():
+            BranchModel.objects.create(
+                name='Closer', address='Street 3', restaurant=self.restaurant, latitude=41.309, longitude=69.28)
+            self.branch.is_active = False
+            self.branch.save()
+            transaction.set_rollback(True)
+        self.assertEqual([branch_id for _, branch_id in nearest_branches(41.31, 69.28, k=2)], [self.branch.pk])
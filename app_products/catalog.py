@@ -0,0 +1,39 @@
+import hashlib
+
+from django.db import transaction
+
+from app_products.models import CatalogVersion
+
+# Seconds a cached catalog page lives. Its key holds the catalog version, so it never goes stale.
+CATALOG_PAGE_TIMEOUT = 10 * 60
+
+
+def catalog_version():
+    """
+    Return the current catalog version, incremented after every committed product or category write.
+
+    The version is read from CatalogVersion on every call, one indexed query, so all the
+    worker processes agree on it and none serves pages of an older version.
+    """
+    return CatalogVersion.current()
+
+
+def _increment():
+    CatalogVersion.next_version()
+
+
+def catalog_changed():
+    """
+    Move the catalog to a new version once the current transaction commits.
+
+    Incrementing after the commit means a page read in between is cached under the old
+    version, which no request uses any more.
+    """
+    transaction.on_commit(_increment)
+
+
+def page_key(url):
+    """
+    Return the cache key of the catalog page at url, under the current catalog version.
+    """
+    return f'catalog:{catalog_version()}:{hashlib.sha256(url.encode("utf-8")).hexdigest()[:32]}'
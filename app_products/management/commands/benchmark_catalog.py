@@ -0,0 +1,101 @@
+import base64
+import json
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from app_products.catalog import catalog_changed
+from app_products.models import CategoryModel, ProductsModel
+from app_products.serializers import ProductSerializer
+from app_products.views import ProductCatalog
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """
+    Compare dumping the whole catalog in one response with reading catalog pages.
+
+    --products products spread over --categories categories are created in a transaction
+    that is rolled back afterwards. Each step reports its time, query count, response size
+    and peak memory, rendering included.
+    """
+    help = "Benchmark the paginated product catalog against a full-table dump."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100_000, help="Products in the catalog.")
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--page-size', type=int, default=50)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+        finally:
+            # pages cached during the run hold rolled back products
+            catalog_changed()
+
+    def run(self, options):
+        categories = CategoryModel.objects.bulk_create([
+            CategoryModel(name=f'benchmark-catalog {n}') for n in range(options['categories'])])
+        ProductsModel.objects.bulk_create([
+            ProductsModel(name=f'Dish {n}', description='A benchmark dish', price=n % 50 + 1,
+                          category=categories[n % len(categories)], status=n % 10 != 0)
+            for n in range(options['products'])
+        ], batch_size=5000)
+        catalog_changed()
+        ids = list(ProductsModel.objects.order_by('id').values_list('id', flat=True))
+
+        self.measure('full dump', self.full_dump)
+
+        page_size = options['page_size']
+        deep = base64.urlsafe_b64encode(json.dumps({'p': [str(ids[len(ids) * 9 // 10])]}).encode()).decode()
+        steps = [
+            ('first page', {'page_size': page_size}),
+            ('deep page', {'page_size': page_size, 'cursor': deep}),
+            ('category page', {'page_size': page_size, 'category': categories[-1].pk, 'status': 'true'}),
+        ]
+        for step, params in steps:
+            self.measure(f'{step} (cold)', lambda: self.page(params))
+            self.measure(f'{step} (cached)', lambda: self.page(params))
+
+    @staticmethod
+    def full_dump():
+        products = ProductSerializer.setup_eager_loading(ProductsModel.objects.filter(is_deleted=False))
+        return JSONRenderer().render(ProductSerializer(products, many=True).data)
+
+    @staticmethod
+    def page(params):
+        request = APIRequestFactory().get('/api/product/catalog/', params, HTTP_HOST='localhost')
+        response = ProductCatalog.as_view()(request)
+        if response.status_code != 200:
+            raise CommandError(f"Unexpected response: {response.status_code} {response.data}")
+        response.accepted_renderer = JSONRenderer()
+        response.accepted_media_type = 'application/json'
+        response.renderer_context = {}
+        return response.render().content
+
+    def measure(self, step, read):
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                body = read()
+                elapsed = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.stdout.write(
+            f"{step}: {elapsed * 1e3:.1f}ms queries={len(queries)} "
+            f"size={len(body) / 1024:.1f}KiB peak_memory={peak / 1024 / 1024:.1f}MiB"
+        )
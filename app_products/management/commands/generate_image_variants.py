@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from app_common.images import ImageVariantWorker
+from app_company.models import RestaurantModel
+from app_products.models import ProductImageModel
+
+# (model, image field, variants field) of every image that gets variants.
+VARIANT_IMAGE_FIELDS = [
+    (ProductImageModel, 'image', 'image_variants'),
+    (RestaurantModel, 'logo', 'logo_variants'),
+]
+
+
+class Command(BaseCommand):
+    """
+    Generate the missing or outdated variants of product images and restaurant logos.
+
+    Uploads get their variants in the background; this catches up on the ones uploaded
+    before the pipeline existed or whose job was lost with its process.
+    """
+    help = "Generate image variants for product images and restaurant logos that lack them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Regenerate the variants of every image.")
+
+    def handle(self, *args, **options):
+        for model, field_name, variants_field in VARIANT_IMAGE_FIELDS:
+            generated = failed = 0
+            for pk in model.objects.exclude(**{field_name: ''}).values_list('pk', flat=True).iterator():
+                variants = ImageVariantWorker.run(model, pk, field_name, variants_field, force=options['force'])
+                if variants is None:
+                    continue
+                if 'error' in variants:
+                    failed += 1
+                else:
+                    generated += 1
+            self.stdout.write(f"{model._meta.verbose_name_plural}: {generated} generated, {failed} unreadable")
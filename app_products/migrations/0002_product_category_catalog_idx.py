@@ -0,0 +1,17 @@
+# Generated by Django 5.1.3 on 2026-10-17 19:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productsmodel',
+            index=models.Index(fields=['category', 'id'], name='product_category_catalog_idx'),
+        ),
+    ]
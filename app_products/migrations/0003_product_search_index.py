@@ -0,0 +1,49 @@
+from django.db import migrations
+
+SEARCH_TABLE = 'app_products_search'
+POSTGRES_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B')"
+)
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Build the product full-text index native to the database: an FTS5 table on SQLite, an
+    expression GIN index on PostgreSQL, a FULLTEXT index on MySQL.
+    """
+    connection = schema_editor.connection
+    table = schema_editor.quote_name(apps.get_model('app_products', 'ProductsModel')._meta.db_table)
+    if connection.vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+            f"name, description, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        schema_editor.execute(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, name, description) SELECT id, name, description FROM {table}')
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute(f'CREATE INDEX product_search_idx ON {table} USING gin (({POSTGRES_VECTOR}))')
+    elif connection.vendor == 'mysql':
+        schema_editor.execute(f'CREATE FULLTEXT INDEX product_search_idx ON {table} (name, description)')
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    table = schema_editor.quote_name(apps.get_model('app_products', 'ProductsModel')._meta.db_table)
+    if connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE {SEARCH_TABLE}')
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX product_search_idx')
+    elif connection.vendor == 'mysql':
+        schema_editor.execute(f'DROP INDEX product_search_idx ON {table}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_products', '0002_product_category_catalog_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
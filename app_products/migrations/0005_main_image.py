@@ -0,0 +1,40 @@
+# Generated by Django 5.1.3 on 2026-10-17 20:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Min, OuterRef, Subquery
+
+
+def fill_main_images(apps, schema_editor):
+    """
+    Keep only the oldest main image of each product flagged, then point products at their main image.
+    """
+    ProductImageModel = apps.get_model('app_products', 'ProductImageModel')
+    ProductsModel = apps.get_model('app_products', 'ProductsModel')
+    first_main = ProductImageModel.objects.filter(is_main_image=True).values('product_id').annotate(first=Min('id'))
+    ProductImageModel.objects.filter(is_main_image=True).exclude(
+        id__in=first_main.values('first')).update(is_main_image=False)
+    ProductsModel.objects.update(main_image=Subquery(
+        ProductImageModel.objects.filter(product=OuterRef('pk'), status=True, is_deleted=False)
+        .order_by('-is_main_image', 'id').values('id')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_products', '0004_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productsmodel',
+            name='main_image',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='app_products.productimagemodel'),
+        ),
+        migrations.RunPython(fill_main_images, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='productimagemodel',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_main_image', True)), fields=('product',), name='product_single_main_image'),
+        ),
+    ]
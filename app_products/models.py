@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, OuterRef, Q, Subquery
 
 from app_common.models import BaseModel
 
@@ -30,6 +31,8 @@ class ProductsModel(BaseModel):
     price: The price of the product.
     category: The category of the product.
     status: Indicates whether the product is active or not.
+    main_image: The image shown for the product: its active main image, else its first active
+        image. Maintained from image writes by refresh_main_images().
     """
     name = models.CharField(max_length=200)
     description = models.TextField()
@@ -40,13 +43,41 @@ class ProductsModel(BaseModel):
         related_name="products"
     )
     status = models.BooleanField(default=True)
+    main_image = models.ForeignKey(
+        'ProductImageModel',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='+'
+    )
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def refresh_main_images(cls, product_ids=None, image_id=None):
+        """
+        Point main_image of the given products at their current main image, with one UPDATE.
+
+        With image_id, the product currently pointing at that image is refreshed too, which
+        covers an image moved to another product.
+        """
+        products = Q(pk__in=list(product_ids or []))
+        if image_id is not None:
+            products |= Q(main_image_id=image_id)
+        return cls.objects.filter(products).update(main_image=Subquery(
+            ProductImageModel.objects.filter(product=OuterRef('pk'), status=True, is_deleted=False)
+            .order_by('-is_main_image', 'id').values('id')[:1]
+        ))
+
     class Meta:
         verbose_name = 'Food'
         verbose_name_plural = 'Foods'
+        indexes = [
+            # catalog pages of one category, in id order
+            models.Index(fields=['category', 'id'], name='product_category_catalog_idx'),
+        ]
 
 
 class ProductImageModel(BaseModel):
@@ -57,6 +88,8 @@ class ProductImageModel(BaseModel):
     image: The image file.
     is_main_image: Indicates whether this image is the main image for the product.
     status: Indicates whether the image is active or not.
+    image_variants: The resized copies of the image and their dimensions, filled in after upload
+        (see app_common.images.generate_variants).
     """
     # fields
     product = models.ForeignKey(
@@ -67,10 +100,65 @@ class ProductImageModel(BaseModel):
     image = models.ImageField(upload_to='products/')
     is_main_image = models.BooleanField(default=False)
     status = models.BooleanField(default=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return self.product.name
 
     class Meta:
         verbose_name = 'Product Image'
-        verbose_name_plural = 'Product Images'
\ No newline at end of file
+        verbose_name_plural = 'Product Images'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product'], condition=Q(is_main_image=True), name='product_single_main_image'),
+        ]
+
+    def save(self, *args, **kwargs):
+        """
+        Save the image; flagging it as main unflags the product's previous main image.
+        """
+        with transaction.atomic():
+            if self.is_main_image:
+                ProductImageModel.objects.filter(
+                    product_id=self.product_id, is_main_image=True).exclude(pk=self.pk).update(is_main_image=False)
+            super().save(*args, **kwargs)
+
+
+class CatalogVersion(models.Model):
+    """
+    CatalogVersion is the change counter of the product catalog, in a single row.
+    version: Incremented after every committed product, image or category write.
+
+    Kept in the database, not the cache, so every worker process reads the same version.
+    """
+    version = models.PositiveBigIntegerField(default=0, verbose_name='Version')
+
+    class Meta:
+        verbose_name = 'Catalog Version'
+        verbose_name_plural = 'Catalog Versions'
+
+    def __str__(self):
+        return str(self.version)
+
+    @classmethod
+    def current(cls):
+        """
+        Return the latest catalog version, 0 before the first change.
+        """
+        return cls.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+
+    @classmethod
+    def next_version(cls):
+        """
+        Increment the counter and return the new version.
+        """
+        with transaction.atomic():
+            if not cls.objects.filter(pk=1).update(version=F('version') + 1):
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(pk=1, version=1)
+                    return 1
+                except IntegrityError:
+                    # another transaction created the counter first
+                    cls.objects.filter(pk=1).update(version=F('version') + 1)
+            return cls.current()
@@ -0,0 +1,122 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from app_common.bulk import chunked
+from app_products.models import ProductsModel
+
+# FTS5 table holding the name and description of every product, keyed by product id (SQLite only).
+SEARCH_TABLE = 'app_products_search'
+
+# Relevance weight of a match in the name against a match in the description.
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+# The document the PostgreSQL expression index of migration 0003 is built on; queries must repeat it verbatim.
+POSTGRES_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B')"
+)
+
+# Longest search text looked at, and most words of it used.
+MAX_QUERY_LENGTH = 100
+MAX_TERMS = 8
+
+_WORD = re.compile(r'\w+')
+
+
+def search_terms(text):
+    """
+    Split search text into lowercase words, dropping punctuation and any operator syntax.
+    """
+    return _WORD.findall(text[:MAX_QUERY_LENGTH].lower())[:MAX_TERMS]
+
+
+def index_products(products):
+    """
+    Add or refresh (id, name, description) rows of products in the search index.
+
+    Saves and deletes keep the index in sync through signals; call this after writes that
+    send none, like bulk_create() or QuerySet.update(). PostgreSQL and MySQL index the
+    product table itself and need nothing.
+    """
+    if connection.vendor != 'sqlite' or not products:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT OR REPLACE INTO {SEARCH_TABLE} (rowid, name, description) VALUES (%s, %s, %s)', products)
+
+
+def reindex_products(product_ids):
+    """
+    Refresh the search index rows of the given products from the product table.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    for chunk in chunked(sorted(set(product_ids)), 5000):
+        index_products(list(ProductsModel.objects.filter(pk__in=chunk).values_list('id', 'name', 'description')))
+
+
+def unindex_products(product_ids):
+    if connection.vendor != 'sqlite' or not product_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [(product_id,) for product_id in product_ids])
+
+
+def search_product_ids(text, branch_id=None, limit=20):
+    """
+    Return the ids of the active products best matching text, most relevant first.
+
+    Every word must match the start of a word of the product's name or description, so a
+    half-typed query already finds what it is heading for. Matches in the name rank above
+    matches in the description. With branch_id, only products on that branch's menu are returned.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return []
+    if connection.vendor not in ('sqlite', 'postgresql', 'mysql'):
+        products = ProductsModel.objects.filter(status=True, is_deleted=False)
+        if branch_id is not None:
+            products = products.filter(restaurants__branch_products__branch_id=branch_id)
+        for term in terms:
+            products = products.filter(Q(name__icontains=term) | Q(description__icontains=term))
+        return list(products.order_by('id').values_list('id', flat=True).distinct()[:limit])
+
+    table = connection.ops.quote_name(ProductsModel._meta.db_table)
+    where = 'p.status = %s AND p.is_deleted = %s'
+    where_params = [True, False]
+    if branch_id is not None:
+        menu_sql, menu_params = ProductsModel.objects.filter(
+            restaurants__branch_products__branch_id=branch_id).values('id').query.sql_with_params()
+        where += f' AND p.id IN ({menu_sql})'
+        where_params += menu_params
+
+    if connection.vendor == 'sqlite':
+        # joined rather than `rowid IN (...)`, which FTS5 would run the match for once per id
+        match = ' '.join(f'"{term}"*' for term in terms)
+        sql = (
+            f'SELECT s.rowid FROM {SEARCH_TABLE} s JOIN {table} p ON p.id = s.rowid '
+            f'WHERE {SEARCH_TABLE} MATCH %s AND {where} '
+            f'ORDER BY bm25({SEARCH_TABLE}, {NAME_WEIGHT}, {DESCRIPTION_WEIGHT}), s.rowid LIMIT %s'
+        )
+        params = [match, *where_params, limit]
+    elif connection.vendor == 'postgresql':
+        match = ' & '.join(f"'{term}':*" for term in terms)
+        sql = (
+            f"SELECT p.id FROM {table} p WHERE ({POSTGRES_VECTOR}) @@ to_tsquery('simple', %s) AND {where} "
+            f"ORDER BY ts_rank(({POSTGRES_VECTOR}), to_tsquery('simple', %s)) DESC, p.id LIMIT %s"
+        )
+        params = [match, *where_params, match, limit]
+    else:
+        match = ' '.join(f'+{term}*' for term in terms)
+        sql = (
+            f'SELECT p.id FROM {table} p WHERE MATCH(name, description) AGAINST (%s IN BOOLEAN MODE) AND {where} '
+            f'ORDER BY MATCH(name, description) AGAINST (%s IN BOOLEAN MODE) DESC, p.id LIMIT %s'
+        )
+        params = [match, *where_params, match, limit]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
@@ -1,9 +1,63 @@
 from rest_framework import serializers
 
-from .models import ProductsModel
+from app_common.images import variant_urls, variant_urls_by_size
+from .models import ProductImageModel, ProductsModel
 
 
-class ProductSerializer(serializers.Serializer):
+class ProductSerializer(serializers.ModelSerializer):
+    """
+    Serializer for a catalog product, with the name of its category and the thumbnail of its main image.
+
+    `thumbnail` is {format: url}, or null when the product has no image or its variants
+    aren't generated yet. setup_eager_loading() joins both relations, so rendering a page
+    costs no query per product.
+    """
+    category_name = serializers.CharField(source='category.name', read_only=True)
+    thumbnail = serializers.SerializerMethodField()
+
     class Meta:
         model = ProductsModel
-        fields = ('id', 'name', 'price', 'description', 'restaurant', 'status')
+        fields = ('id', 'name', 'description', 'price', 'category', 'category_name', 'status', 'thumbnail')
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('category', 'main_image')
+
+    def get_thumbnail(self, instance):
+        if instance.main_image is None:
+            return None
+        return variant_urls(instance.main_image.image_variants, instance.main_image.image.storage, 'thumb')
+
+
+class CatalogQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of the product catalog: optional category and status filters.
+    """
+    category = serializers.IntegerField(min_value=1, required=False)
+    status = serializers.BooleanField(required=False, allow_null=True, default=None)
+
+
+class ProductSearchQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of the product search: the text typed so far, and optionally the branch to search in.
+    """
+    q = serializers.CharField(max_length=100)
+    branch = serializers.IntegerField(min_value=1, required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=20)
+
+
+class ProductImageSerializer(serializers.ModelSerializer):
+    """
+    Serializer for a product image with the URLs of its generated variants.
+
+    `variants` maps each size to {format: url}, or to null until the variants are generated;
+    it is read from the stored description, without opening any file.
+    """
+    variants = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ProductImageModel
+        fields = ('id', 'product', 'image', 'is_main_image', 'status', 'variants')
+
+    def get_variants(self, instance):
+        return variant_urls_by_size(instance.image_variants, instance.image.storage)
@@ -0,0 +1,57 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from app_common.images import image_variants, variants_stale
+from app_products.catalog import catalog_changed
+from app_products.models import CategoryModel, ProductImageModel, ProductsModel
+from app_products.search import index_products, unindex_products
+
+
+@receiver(post_save, sender=ProductsModel)
+@receiver(post_delete, sender=ProductsModel)
+@receiver(post_save, sender=CategoryModel)
+@receiver(post_delete, sender=CategoryModel)
+def catalog_written(sender, **kwargs):
+    """
+    Move the catalog to a new version after a product or category write.
+
+    QuerySet.update() and bulk_create() send no signals; call catalog_changed() after them.
+    """
+    catalog_changed()
+
+
+@receiver(post_save, sender=ProductsModel)
+def product_search_saved(sender, instance, **kwargs):
+    """
+    Index the name and description of a saved product for search.
+    """
+    index_products([(instance.pk, instance.name, instance.description)])
+
+
+@receiver(post_delete, sender=ProductsModel)
+def product_search_deleted(sender, instance, **kwargs):
+    unindex_products([instance.pk])
+
+
+@receiver(post_save, sender=ProductImageModel)
+def product_image_uploaded(sender, instance, **kwargs):
+    """
+    Generate the variants of a new or replaced product image once the save commits.
+    """
+    if variants_stale(instance, 'image', 'image_variants'):
+        image_variants.schedule(ProductImageModel, instance.pk, 'image', 'image_variants')
+
+
+@receiver(post_save, sender=ProductImageModel)
+def product_image_saved(sender, instance, **kwargs):
+    """
+    Repoint the product at its main image and publish a new catalog version, whose pages show it.
+    """
+    ProductsModel.refresh_main_images([instance.product_id], image_id=instance.pk)
+    catalog_changed()
+
+
+@receiver(post_delete, sender=ProductImageModel)
+def product_image_deleted(sender, instance, **kwargs):
+    ProductsModel.refresh_main_images([instance.product_id])
+    catalog_changed()
@@ -1,3 +1,286 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+from functools import partial
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIRequestFactory
+
+from app_branch.models import BranchModel, BranchProductsModel
+from app_company.models import RestaurantModel, RestaurantProductsModel
+from app_products.catalog import catalog_version
+from app_products.models import CatalogVersion, CategoryModel, ProductImageModel, ProductsModel
+from app_products.search import reindex_products, search_product_ids
+from app_products.serializers import ProductImageSerializer
+from app_common.images import ImageVariantWorker
+from app_products.views import ProductCatalog, ProductImages, ProductSearch
+from app_users.models import UserModel, UserRoleChoice
+
+
+class ProductCatalogTest(TestCase):
+    """
+    The catalog is filtered and keyset-paginated, and its cached pages follow the catalog version.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.drinks = CategoryModel.objects.create(name='Drinks')
+        cls.meals = CategoryModel.objects.create(name='Meals')
+        cls.products = ProductsModel.objects.bulk_create([
+            ProductsModel(name=f'Dish {n}', description='Dish', price=n + 1,
+                          category=cls.drinks if n % 2 else cls.meals, status=n != 3)
+            for n in range(7)
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url='/api/product/catalog/', **params):
+        return ProductCatalog.as_view()(APIRequestFactory().get(url, params))
+
+    def test_filters_and_pages(self):
+        response = self.get(category=self.drinks.pk, status='true', page_size=1)
+        self.assertEqual([product['id'] for product in response.data['results']], [self.products[1].pk])
+        self.assertEqual(response.data['results'][0]['category_name'], 'Drinks')
+
+        ids = []
+        url = response.data['next']
+        while url:
+            response = self.get(url)
+            ids += [product['id'] for product in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(ids, [self.products[5].pk])
+
+        response = self.get(status='false')
+        self.assertEqual([product['id'] for product in response.data['results']], [self.products[3].pk])
+        self.assertEqual(self.get(category='drinks').status_code, 400)
+
+    def test_pages_are_cached_per_version(self):
+        version = catalog_version()
+        self.get()
+        # a cached page costs only the version read
+        with self.assertNumQueries(1):
+            response = self.get()
+        self.assertEqual(len(response.data['results']), 7)
+
+        product = self.products[0]
+        product.name = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertGreater(catalog_version(), version)
+        with self.assertNumQueries(2):
+            response = self.get()
+        self.assertEqual(response.data['results'][0]['name'], 'Renamed')
+
+        # the version is shared through the database, not the process' cache
+        cache.clear()
+        self.assertEqual(catalog_version(), CatalogVersion.current())
+        self.assertGreater(catalog_version(), version)
+
+
+class ProductSearchTest(TestCase):
+    """
+    Product search matches word prefixes, ranks name matches first and follows product writes.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = CategoryModel.objects.create(name='Drinks')
+        cls.green_tea = ProductsModel.objects.create(
+            name='Green tea', description='Loose leaves', price=5, category=category)
+        cls.milk = ProductsModel.objects.create(
+            name='Milk', description='Goes well with green tea', price=3, category=category)
+        cls.hidden = ProductsModel.objects.create(
+            name='Green juice', description='Seasonal', price=7, category=category, status=False)
+        restaurant = RestaurantModel.objects.create(
+            user=UserModel.objects.create(username='restaurant', phone_number='100', role=UserRoleChoice.RESTAURANT),
+            name='Restaurant', logo='logo.png')
+        cls.branch = BranchModel.objects.create(
+            user=UserModel.objects.create(username='branch', phone_number='200', role=UserRoleChoice.BRANCH),
+            name='Branch', address='Street 1', restaurant=restaurant)
+        BranchProductsModel.objects.create(
+            branch=cls.branch, restaurant=RestaurantProductsModel.objects.create(restaurant=restaurant, product=cls.milk))
+
+    def search(self, **params):
+        response = ProductSearch.as_view()(APIRequestFactory().get('/', params))
+        return [product['id'] for product in response.data['results']]
+
+    def test_prefix_match_and_ranking(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(self.search(q='gre te'), [self.green_tea.pk, self.milk.pk])
+        self.assertEqual(self.search(q='gre', branch=self.branch.pk), [self.milk.pk])
+        self.assertEqual(self.search(q='"juice" OR *'), [])
+        self.assertEqual(self.search(q='te', limit=1), [self.green_tea.pk])
+        response = ProductSearch.as_view()(APIRequestFactory().get('/', {'q': ''}))
+        self.assertEqual(response.status_code, 400)
+
+    def test_index_follows_writes(self):
+        self.green_tea.name = 'Black tea'
+        self.green_tea.save()
+        self.assertEqual(self.search(q='black'), [self.green_tea.pk])
+        self.assertEqual(self.search(q='green'), [self.milk.pk])
+
+        self.milk.delete()
+        self.assertEqual(search_product_ids('green'), [])
+
+        bulk = ProductsModel.objects.bulk_create([
+            ProductsModel(name='Mint lemonade', description='Cold', price=4, category=self.green_tea.category)])
+        self.assertEqual(search_product_ids('mint'), [])
+        reindex_products([product.pk for product in bulk])
+        self.assertEqual(search_product_ids('mint'), [bulk[0].pk])
+
+
+def image_upload(name, size, mode='RGBA'):
+    buffer = io.BytesIO()
+    Image.new(mode, size, (200, 30, 30, 128) if mode == 'RGBA' else (200, 30, 30)).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class ImageVariantsTest(TestCase):
+    """
+    Uploaded product images get thumb/medium/large variants in WebP and JPEG, described on the row.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = CategoryModel.objects.create(name='Drinks')
+        cls.product = ProductsModel.objects.create(name='Tea', description='Tea', price=5, category=category)
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root, IMAGE_VARIANTS_IN_BACKGROUND=False)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.media_root = media_root
+
+    def upload(self, image, name='tea.png'):
+        with self.captureOnCommitCallbacks(execute=True):
+            image.image = image_upload(name, (2000, 1000))
+            image.save()
+        image.refresh_from_db()
+        return image.image_variants
+
+    def test_variants_generated_and_replaced(self):
+        image = ProductImageModel(product=self.product, is_main_image=True)
+        variants = self.upload(image)
+        self.assertEqual((variants['source'], variants['width'], variants['height']), (image.image.name, 2000, 1000))
+        sizes = {
+            size: {extension: (variant['width'], variant['height']) for extension, variant in formats.items()}
+            for size, formats in variants['sizes'].items()
+        }
+        self.assertEqual(sizes, {
+            'thumb': {'webp': (160, 80), 'jpeg': (160, 80)},
+            'medium': {'webp': (480, 240), 'jpeg': (480, 240)},
+            'large': {'webp': (1080, 540), 'jpeg': (1080, 540)},
+        })
+        thumb = variants['sizes']['thumb']['jpeg']
+        path = os.path.join(self.media_root, thumb['name'])
+        self.assertEqual(os.path.getsize(path), thumb['bytes'])
+        with Image.open(path) as stored:
+            self.assertEqual((stored.format, stored.mode, stored.size), ('JPEG', 'RGB', (160, 80)))
+
+        with self.assertNumQueries(0):
+            data = ProductImageSerializer(image).data
+        self.assertEqual(data['variants']['thumb']['webp'], f"/media/{variants['sizes']['thumb']['webp']['name']}")
+
+        old_files = [variant['name'] for formats in variants['sizes'].values() for variant in formats.values()]
+        replaced = self.upload(image, name='green-tea.png')
+        self.assertTrue(replaced['source'].startswith('products/green-tea'))
+        self.assertFalse(any(os.path.exists(os.path.join(self.media_root, name)) for name in old_files))
+
+    def test_unreadable_upload(self):
+        image = ProductImageModel(product=self.product)
+        with self.captureOnCommitCallbacks(execute=True):
+            image.image = SimpleUploadedFile('broken.png', b'not an image')
+            image.save()
+        image.refresh_from_db()
+        self.assertIn('error', image.image_variants)
+        self.assertIsNone(ProductImageSerializer(image).data['variants']['thumb'])
+
+    def test_product_images_endpoint(self):
+        hidden = ProductImageModel.objects.create(product=self.product, image='products/old.png', status=False)
+        extra = ProductImageModel.objects.create(product=self.product, image='products/side.png')
+        main = ProductImageModel(product=self.product, is_main_image=True)
+        variants = self.upload(main)
+
+        request = APIRequestFactory().get(f'/api/product/{self.product.pk}/images/')
+        with self.assertNumQueries(1):
+            response = ProductImages.as_view()(request, product_id=self.product.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([image['id'] for image in response.data], [main.pk, extra.pk])
+        self.assertNotIn(hidden.pk, [image['id'] for image in response.data])
+        self.assertEqual(
+            response.data[0]['variants']['large']['jpeg'], f"/media/{variants['sizes']['large']['jpeg']['name']}")
+        self.assertIsNone(response.data[1]['variants']['thumb'])
+
+    def test_background_failure_is_logged(self):
+        def job(model, pk):
+            raise OSError('disk full')
+
+        with self.assertLogs('app_common.images', 'ERROR') as logs:
+            ImageVariantWorker._run_in_background(partial(job, ProductImageModel, 7))
+        self.assertIn('Generating image variants of ProductImageModel 7 failed.', logs.output[0])
+        self.assertIn('OSError: disk full', logs.output[0])
+
+
+class MainImageTest(TestCase):
+    """
+    Products point at their main image, of which there is at most one, and the catalog shows its thumbnail.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = CategoryModel.objects.create(name='Drinks')
+        cls.product = ProductsModel.objects.create(name='Tea', description='Tea', price=5, category=cls.category)
+
+    def main_image(self):
+        self.product.refresh_from_db()
+        return self.product.main_image_id
+
+    def test_pointer_follows_image_writes(self):
+        self.assertIsNone(self.main_image())
+        first = ProductImageModel.objects.create(product=self.product, image='products/first.png')
+        self.assertEqual(self.main_image(), first.pk)
+
+        second = ProductImageModel.objects.create(product=self.product, image='products/second.png', is_main_image=True)
+        self.assertEqual(self.main_image(), second.pk)
+
+        first.is_main_image = True
+        first.save()
+        second.refresh_from_db()
+        self.assertFalse(second.is_main_image)
+        self.assertEqual(self.main_image(), first.pk)
+
+        first.status = False
+        first.save()
+        self.assertEqual(self.main_image(), second.pk)
+
+        second.delete()
+        self.assertIsNone(self.main_image())
+
+    def test_single_main_image(self):
+        ProductImageModel.objects.create(product=self.product, image='products/first.png', is_main_image=True)
+        second = ProductImageModel.objects.create(product=self.product, image='products/second.png')
+        with self.assertRaises(IntegrityError):
+            ProductImageModel.objects.filter(pk=second.pk).update(is_main_image=True)
+
+    def test_catalog_thumbnails_cost_no_query(self):
+        cache.clear()
+        for n in range(3):
+            product = ProductsModel.objects.create(name=f'Dish {n}', description='Dish', price=5, category=self.category)
+            ProductImageModel.objects.create(
+                product=product, image=f'products/dish-{n}.png', is_main_image=True,
+                image_variants={'source': f'products/dish-{n}.png', 'sizes': {'thumb': {
+                    'webp': {'name': f'products/variants/dish-{n}-thumb.webp', 'width': 160, 'height': 160, 'bytes': 1},
+                }}})
+        # the catalog version and the page
+        with self.assertNumQueries(2):
+            response = ProductCatalog.as_view()(APIRequestFactory().get('/api/product/catalog/'))
+        thumbnails = [product['thumbnail'] for product in response.data['results']]
+        self.assertEqual(thumbnails, [None] + [{'webp': f'/media/products/variants/dish-{n}-thumb.webp'} for n in range(3)])
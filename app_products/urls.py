@@ -0,0 +1,12 @@
+from django.urls import path
+
+from app_products import views
+
+
+app_name = 'app_products'
+
+urlpatterns = [
+    path('catalog/', views.ProductCatalog.as_view(), name='catalog'),
+    path('search/', views.ProductSearch.as_view(), name='search'),
+    path('<int:product_id>/images/', views.ProductImages.as_view(), name='images'),
+]
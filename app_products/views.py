@@ -1,3 +1,156 @@
-from django.shortcuts import render
+from django.core.cache import cache
+from rest_framework import generics, status
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from app_common.pagination import KeysetPagination
+from app_products.catalog import CATALOG_PAGE_TIMEOUT, page_key
+from app_products.models import ProductImageModel, ProductsModel
+from app_products.search import search_product_ids
+from app_products.serializers import (
+    CatalogQuerySerializer, ProductImageSerializer, ProductSearchQuerySerializer, ProductSerializer,
+)
+
+
+class CatalogPagination(KeysetPagination):
+    page_size = 50
+    max_page_size = 200
+
+
+class ProductCatalog(generics.ListAPIView):
+    """
+    Returns the product catalog, in pages of `page_size` products (50 by default, at most 200).
+
+    Pages are keyset-paginated by product ID: follow the `next` link to read on, every page
+    costs the same however deep it is. Filter with `?category=<id>` and `?status=true|false`.
+    Pages are cached under the catalog version, which moves on every product or category
+    write, so a cached page is never stale.
+
+    ### Example Request
+    ```
+    GET /api/product/catalog/?category=3&status=true&page_size=2
+    ```
+
+    ### Example Response
+    ```
+    {
+        "next": "http://example.com/api/product/catalog/?category=3&cursor=eyJwIjogWyI3Il19&page_size=2&status=true",
+        "previous": null,
+        "results": [
+            {"id": 4, "name": "Tea", "description": "...", "price": "5.00", "category": 3,
+             "category_name": "Drinks", "status": true,
+             "thumbnail": {"webp": "/media/products/variants/tea-thumb.webp", "jpeg": "..."}},
+            ...
+        ]
+    }
+    ```
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    serializer_class = ProductSerializer
+    pagination_class = CatalogPagination
+    queryset = ProductsModel.objects.filter(is_deleted=False).order_by('id')
+
+    def get_queryset(self):
+        products = self.queryset
+        if self.filters.get('category') is not None:
+            products = products.filter(category_id=self.filters['category'])
+        if self.filters.get('status') is not None:
+            products = products.filter(status=self.filters['status'])
+        return self.serializer_class.setup_eager_loading(products)
+
+    def list(self, request, *args, **kwargs):
+        query = CatalogQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(data={
+                "success": False,
+                "message": "Invalid data",
+                "errors": query.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+        self.filters = query.validated_data
+
+        key = page_key(request.build_absolute_uri())
+        data = cache.get(key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            cache.set(key, data, CATALOG_PAGE_TIMEOUT)
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class ProductSearch(APIView):
+    """
+    Searches active products by name and description, most relevant first.
+
+    Every word of `q` matches the start of a word, so the endpoint can back autocomplete
+    as the user types. Name matches rank above description matches. Pass `branch` to only
+    search the products on that branch's menu, and `limit` for the number of results
+    (20 by default, at most 50). Backed by the database's full-text index: two queries
+    whatever the size of the catalog.
+
+    ### Example Request
+    ```
+    GET /api/product/search/?q=gre%20te&branch=3
+    ```
+
+    ### Example Response
+    ```
+    {
+        "success": true,
+        "results": [
+            {"id": 4, "name": "Green tea", "description": "...", "price": "5.00", "category": 3,
+             "category_name": "Drinks", "status": true, "thumbnail": null}
+        ]
+    }
+    ```
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    serializer_class = ProductSerializer
+
+    def get(self, request):
+        query = ProductSearchQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(data={
+                "success": False,
+                "message": "Invalid data",
+                "errors": query.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        ids = search_product_ids(
+            query.validated_data['q'], query.validated_data.get('branch'), query.validated_data['limit'])
+        products = self.serializer_class.setup_eager_loading(ProductsModel.objects.filter(pk__in=ids)) if ids else []
+        rank = {product_id: position for position, product_id in enumerate(ids)}
+        ranked = sorted(products, key=lambda product: rank[product.pk])
+        return Response(data={
+            "success": True,
+            "results": self.serializer_class(ranked, many=True).data
+        }, status=status.HTTP_200_OK)
+
+
+class ProductImages(generics.ListAPIView):
+    """
+    Returns the active images of a product, its main image first, with the URLs of their variants.
+
+    Each size of `variants` is {format: url}, or null until the variants are generated
+    after upload. The URLs come from the stored descriptions: one query, no file access.
+
+    ### Example Response
+    ```
+    GET /api/product/4/images/
+    [
+        {"id": 9, "product": 4, "image": "/media/products/tea.jpg", "is_main_image": true, "status": true,
+         "variants": {"thumb": {"webp": "/media/products/variants/tea-thumb.webp", "jpeg": "..."},
+                      "medium": {...}, "large": {...}}}
+    ]
+    ```
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    serializer_class = ProductImageSerializer
+    pagination_class = None
+
+    def get_queryset(self):
+        return ProductImageModel.objects.filter(
+            product_id=self.kwargs['product_id'], status=True, is_deleted=False,
+        ).order_by('-is_main_image', 'id')
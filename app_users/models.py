@@ -1,4 +1,5 @@
 from django.contrib.auth.models import AbstractUser
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 
 from app_common.models import BaseModel
@@ -55,6 +56,7 @@ class UserLocations(BaseModel):
     address: The user's address.
     is_default: Indicates whether the location is the default location for the user.
     address: The user's address
+    latitude / longitude: Position of the address in degrees, if known.
     user: The user who has this location.
     """
 
@@ -65,6 +67,8 @@ class UserLocations(BaseModel):
         verbose_name='User'
     )
     address = models.CharField(max_length=255)
+    latitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)])
     is_default = models.BooleanField(default=False)
 
     def __str__(self):
@@ -80,16 +80,6 @@ class LoginWithUsernameSerializer(serializers.Serializer):
     password = serializers.CharField(write_only=True, max_length=64)
 
 
-class ProductModelSerializer(serializers.ModelSerializer):
-    """
-    Serializer for ProductModel.
-    """
-
-    class Meta:
-        model = UserModel
-        fields = ['id', 'first_name', 'last_name', 'phone_number']
-
-
 class UpdatePasswordSerializer(serializers.Serializer):
     """
     Serializer for updating password. It includes the fields for old_password, new_password, and confirm_password.
@@ -0,0 +1,102 @@
+from asgiref.sync import sync_to_async
+
+from app_common.pubsub import get_broker
+from app_common.sse import authenticate, send_json, stream_events
+from app_courier.locations import location_buffer
+from app_deliveries.events import order_topic, position_topic
+from app_deliveries.models import OrderModel
+from app_deliveries.services import ORDER_TRANSITIONS
+
+
+def _position(position):
+    if position is None:
+        return None
+    return {
+        'latitude': round(position.latitude, 5),
+        'longitude': round(position.longitude, 5),
+        'recorded_at': position.recorded_at.isoformat(),
+    }
+
+
+class OrderTracker:
+    """
+    Per-stream state of one watched order: follows the courier's position while the order is on its way.
+    """
+
+    def __init__(self, subscription, order_status, courier_id):
+        self.subscription = subscription
+        self.order_status = order_status
+        self.courier_id = None
+        self.position = None
+        self.follow(courier_id)
+
+    def follow(self, courier_id):
+        if self.courier_id is not None:
+            self.subscription.remove_topic(position_topic(self.courier_id))
+        self.courier_id = courier_id
+        if courier_id is not None and ORDER_TRANSITIONS.get(self.order_status):
+            self.subscription.add_topic(position_topic(courier_id))
+
+    def state(self, order_id):
+        if self.courier_id is not None and ORDER_TRANSITIONS.get(self.order_status):
+            self.position = _position(location_buffer.latest(self.courier_id))
+        return {
+            'type': 'state', 'order_id': order_id, 'order_status': self.order_status,
+            'courier_id': self.courier_id, 'position': self.position,
+        }
+
+    def __call__(self, event):
+        """
+        Turn a subscription event into the delta sent to the watcher, or None to skip it.
+        """
+        if event['type'] == 'position':
+            # still queued from a courier that is no longer followed
+            if event['courier_id'] != self.courier_id:
+                return None
+            position = (event['latitude'], event['longitude'])
+            if self.position is not None and (self.position['latitude'], self.position['longitude']) == position:
+                return None
+            self.position = event
+            return event
+        if event['type'] == 'courier':
+            self.follow(event['courier_id'])
+        elif event['type'] == 'status':
+            self.order_status = event['order_status']
+            if not ORDER_TRANSITIONS.get(self.order_status):
+                self.follow(None)
+        return event
+
+
+async def order_tracking(scope, receive, send):
+    """
+    Server-Sent Events stream of one order's status and courier position for its customer.
+
+    Mounted in config/asgi.py at /api/user/orders/<order_id>/stream/ (ASGI servers only). The
+    stream opens with a `state` event (status, courier and last known position), then pushes:
+    - `status`: the order moved to a new status,
+    - `courier`: a courier took the order,
+    - `position`: the courier moved, until the order is delivered or canceled,
+    - `resync`: events were dropped; reload the state.
+    After the two queries of the handshake an open stream costs no database queries.
+    """
+    if scope['method'] != 'GET':
+        return await send_json(send, 405, {'success': False, 'message': 'Method not allowed'})
+    user = await authenticate(scope)
+    if user is None:
+        return await send_json(send, 401, {'success': False, 'message': 'Authentication required'})
+
+    order_id = int(scope['url_route']['kwargs']['order_id'])
+    # subscribe before reading the order so no change falls between the two
+    subscription = get_broker().subscribe(order_topic(order_id))
+    try:
+        order = await sync_to_async(
+            OrderModel.objects.filter(pk=order_id, user=user).values('order_status', 'courier_id').first)()
+    except BaseException:
+        subscription.close()
+        raise
+    if order is None:
+        subscription.close()
+        return await send_json(send, 404, {'success': False, 'message': 'Order not found'})
+
+    tracker = OrderTracker(subscription, order['order_status'], order['courier_id'])
+    await stream_events(receive, send, subscription, initial=[tracker.state(order_id)], transform=tracker)
@@ -1,3 +1,185 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken
+
+from app_branch.models import BranchDeliveryZone, BranchModel
+from app_common.pubsub import get_broker
+from app_company.models import RestaurantModel
+from app_courier.locations import location_buffer
+from app_deliveries.events import courier_moved, order_topic
+from app_deliveries.models import OrderStatus
+from app_deliveries.proximity import branch_locations, delivery_zones
+from app_deliveries.services import transition_order
+from app_deliveries.tests import OrderFixturesMixin
+from app_users.models import UserLocations
+from app_users.streams import order_tracking
+from app_users.views import ServiceableBranchesView
+
+
+class ServiceableBranchesTest(OrderFixturesMixin, TestCase):
+    """
+    A saved location lists the branches whose delivery zones contain it, nearest first.
+    """
+    zone = [[41.28, 69.25], [41.28, 69.31], [41.34, 69.31], [41.34, 69.25]]
+
+    def setUp(self):
+        branch_locations.invalidate()
+        delivery_zones.invalidate()
+        BranchModel.objects.filter(pk=self.branch.pk).update(latitude=41.30, longitude=69.28)
+        UserLocations.objects.filter(pk=self.location.pk).update(latitude=41.31, longitude=69.28)
+        BranchDeliveryZone.objects.create(branch=self.branch, name='Center', polygon=self.zone)
+
+    def tearDown(self):
+        branch_locations.invalidate()
+        delivery_zones.invalidate()
+
+    def get(self, location, user=None):
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, user=user or self.customer)
+        return ServiceableBranchesView.as_view()(request, pk=location.pk)
+
+    def test_serviceable_branches(self):
+        far = BranchModel.objects.create(
+            name='Far', address='Street 3', restaurant=self.restaurant, latitude=41.40, longitude=69.28)
+        BranchDeliveryZone.objects.create(branch=far, name='Wide', polygon=[
+            [41.20, 69.20], [41.20, 69.40], [41.45, 69.40], [41.45, 69.20]])
+        BranchModel.objects.create(name='Elsewhere', address='Street 4', restaurant=self.restaurant)
+
+        RestaurantModel.objects.filter(pk=self.restaurant.pk).update(logo_variants={
+            'source': 'logo.png', 'sizes': {'thumb': {'webp': {'name': 'restaurant_logos/variants/logo-thumb.webp'}}}})
+
+        response = self.get(self.location)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([branch['id'] for branch in response.data['data']], [self.branch.pk, far.pk])
+        self.assertEqual(response.data['data'][0]['distance'], 1112)
+        self.assertEqual(response.data['data'][0]['restaurant_logo'], {'url': '/media/logo.png', 'variants': {
+            'thumb': {'webp': '/media/restaurant_logos/variants/logo-thumb.webp'}, 'medium': None, 'large': None}})
+
+        far.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            far.save()
+        self.assertEqual([branch['id'] for branch in self.get(self.location).data['data']], [self.branch.pk])
+
+    def test_location_outside_every_zone(self):
+        UserLocations.objects.filter(pk=self.location.pk).update(latitude=41.50, longitude=69.28)
+        self.assertEqual(self.get(self.location).data['data'], [])
+
+    def test_zone_writes_apply_on_commit(self):
+        UserLocations.objects.filter(pk=self.location.pk).update(latitude=41.40, longitude=69.28)
+        self.assertEqual(self.get(self.location).data['data'], [])
+        wide = [[41.20, 69.20], [41.20, 69.40], [41.45, 69.40], [41.45, 69.20]]
+
+        with transaction.atomic():
+            BranchDeliveryZone.objects.create(branch=self.branch, name='Wide', polygon=wide)
+            transaction.set_rollback(True)
+        self.assertEqual(self.get(self.location).data['data'], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            zone = BranchDeliveryZone.objects.create(branch=self.branch, name='Wide', polygon=wide)
+        self.assertEqual([branch['id'] for branch in self.get(self.location).data['data']], [self.branch.pk])
+        # the index knows whether the branch is active without loading it
+        zone = BranchDeliveryZone.objects.get(pk=zone.pk)
+        with self.assertNumQueries(0):
+            delivery_zones.update(zone)
+
+    def test_location_of_another_user(self):
+        self.assertEqual(self.get(self.location, user=self.courier_user).status_code, 404)
+
+    def test_invalid_zone_is_not_saved(self):
+        for polygon in ([[41.28, 69.25], [41.30, 69.31]], [[41.28, 69.25], [41.30, 69.31], [91, 69.25]], 'center'):
+            with self.assertRaises(ValidationError):
+                BranchDeliveryZone.objects.create(branch=self.branch, name='Broken', polygon=polygon)
+        self.assertFalse(BranchDeliveryZone.objects.filter(name='Broken').exists())
+
+
+class OrderTrackingTest(OrderFixturesMixin, TestCase):
+    """
+    A customer's order stream sends the order's state, then status changes and courier moves.
+    """
+
+    def tearDown(self):
+        location_buffer.clear()
+
+    async def track(self, order_id, user, after_state=()):
+        """
+        Open the stream, run the after_state callables once the state is sent, and return the events.
+        """
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': f'/api/user/orders/{order_id}/stream/', 'query_string': b'',
+            'headers': [(b'authorization', f'Bearer {AccessToken.for_user(user)}'.encode())],
+            'url_route': {'kwargs': {'order_id': str(order_id)}},
+        }
+        hang_up = asyncio.Event()
+        messages = []
+
+        async def receive():
+            await hang_up.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            messages.append(message)
+            if len(messages) == 2:
+                for action in after_state:
+                    action()
+            if not message.get('more_body', True) or len(messages) == 3:
+                hang_up.set()
+
+        await order_tracking(scope, receive, send)
+        if messages[0]['status'] != 200:
+            return messages[0]['status']
+        return [
+            json.loads(line[len('data: '):])
+            for message in messages[1:] for line in message['body'].decode().splitlines() if line.startswith('data: ')
+        ]
+
+    async def test_status_and_position_deltas(self):
+        order = await sync_to_async(self.create_order)(order_status=OrderStatus.DELIVERING)
+        now = timezone.now()
+        location_buffer.add(self.courier_user.pk, [(41.3, 69.28, None, now)], known=True)
+
+        def courier_moves(latitude):
+            location_buffer.add(self.courier_user.pk, [(latitude, 69.28, None, timezone.now())], known=True)
+            courier_moved(self.courier_user.pk, location_buffer.latest(self.courier_user.pk))
+
+        events = await self.track(order.pk, self.customer, after_state=[
+            lambda: courier_moves(41.3),  # unchanged position, not sent
+            lambda: courier_moves(41.31),
+            lambda: get_broker().publish(order_topic(order.pk), {
+                'type': 'status', 'order_id': order.pk, 'order_status': OrderStatus.DELIVERED}),
+            lambda: courier_moves(41.32),  # after delivery the courier is no longer followed
+        ])
+        self.assertEqual(
+            [event['type'] for event in events], ['state', 'position', 'status'])
+        self.assertEqual(
+            (events[0]['order_status'], events[0]['courier_id'], events[0]['position']['latitude']),
+            (OrderStatus.DELIVERING, self.courier_user.pk, 41.3),
+        )
+        self.assertEqual(events[1]['latitude'], 41.31)
+        self.assertEqual(get_broker().subscriber_count(), 0)
+
+    async def test_other_users_order(self):
+        order = await sync_to_async(self.create_order)()
+        self.assertEqual(await self.track(order.pk, self.courier_user), 404)
+
+    def test_transition_publishes_to_order(self):
+        order = self.create_order(order_status=OrderStatus.DELIVERING)
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+
+        async def subscribe():
+            return get_broker().subscribe(order_topic(order.pk))
 
-# Create your tests here.
+        subscription = loop.run_until_complete(subscribe())
+        self.addCleanup(subscription.close)
+        with self.captureOnCommitCallbacks(execute=True):
+            transition_order(order.pk, OrderStatus.DELIVERING, OrderStatus.DELIVERED)
+        loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(subscription.get_nowait(), {
+            'type': 'status', 'order_id': order.pk, 'order_status': OrderStatus.DELIVERED})
@@ -8,4 +8,8 @@ urlpatterns = [
     path('auth/login/', user_views.LoginView.as_view(), name='login'),
     path('auth/login-with-username/', user_views.LoginWithUsernameView.as_view(), name='login_with_username'),
     path('auth/logout/', user_views.LogoutView.as_view(), name='logout'),
+
+    # location urls
+    path('locations/<int:pk>/serviceable-branches/', user_views.ServiceableBranchesView.as_view(),
+         name='serviceable_branches'),
 ]
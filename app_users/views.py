@@ -1,12 +1,16 @@
+from django.shortcuts import get_object_or_404
 from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from app_products.models import ProductsModel
-from .models import UserModel, UserRoleChoice, UserStatusChoice
+from app_branch.models import BranchModel
+from app_branch.serializers import ServiceableBranchSerializer
+from app_deliveries.proximity import serviceable_branches
+from .models import UserLocations, UserModel, UserRoleChoice, UserStatusChoice
 from .serializers import (
-    UserModelSerializer, LoginSerializer, ProductModelSerializer,
+    UserModelSerializer, LoginSerializer,
     UpdatePasswordSerializer, LoginWithUsernameSerializer
 )
 
@@ -162,16 +166,6 @@ class LogoutView(APIView):
             return Response(response, status=status.HTTP_400_BAD_REQUEST)
 
 
-class GetAllProductsView(APIView):
-    serializer_class = ProductModelSerializer
-    queryset = ProductsModel.objects.all()
-
-    def get(self, request, *args, **kwargs):
-        products = ProductsModel.objects.all()
-        serializer = ProductModelSerializer(products, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
-
-
 class UpdateUserView(APIView):
     serializer_class = UserModelSerializer
     queryset = UserModel.objects.all()
@@ -216,3 +210,38 @@ class UpdatePasswordView(APIView):
             'data': serializer.data
         }
         return Response(response, status=status.HTTP_200_OK)
+
+
+class ServiceableBranchesView(APIView):
+    """
+    List the branches that deliver to one of the user's saved locations, nearest first.
+
+    The location is matched against the branches' delivery zones in memory (see
+    app_deliveries.proximity), so only the matching branches are read from the database.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = ServiceableBranchSerializer
+    queryset = UserLocations.objects.all()
+
+    def get(self, request, pk, *args, **kwargs):
+        location = get_object_or_404(self.queryset, pk=pk, user=request.user, is_deleted=False)
+        if location.latitude is None or location.longitude is None:
+            return Response({
+                'success': False,
+                'message': 'Location has no coordinates'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        distances = {
+            branch_id: distance
+            for distance, branch_id in serviceable_branches(location.latitude, location.longitude)
+        }
+        branches = BranchModel.objects.select_related('restaurant').in_bulk(list(distances))
+        serializer = self.serializer_class(
+            [branches[branch_id] for branch_id in distances if branch_id in branches],
+            many=True,
+            context={'distances': distances},
+        )
+        return Response({
+            'success': True,
+            'data': serializer.data
+        }, status=status.HTTP_200_OK)
@@ -2,6 +2,7 @@
 ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Server-Sent Events streams are served next to Django by app_common.sse.path_router.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -13,4 +14,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up: the streams use models.
+from app_common.sse import path_router  # noqa: E402
+from app_courier.streams import courier_offers  # noqa: E402
+from app_users.streams import order_tracking  # noqa: E402
+
+application = path_router({
+    r'/api/courier/offers/stream/': courier_offers,
+    r'/api/user/orders/(?P<order_id>[0-9]+)/stream/': order_tracking,
+}, default=django_application)